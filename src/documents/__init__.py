@@ -1 +1 @@
-from .checks import changed_password_check
+from .checks import changed_password_check, thumbnail_format_check
@@ -3,15 +3,17 @@ from datetime import datetime, timedelta
 from django.conf import settings
 from django.contrib import admin, messages
 from django.contrib.admin.templatetags.admin_urls import add_preserved_filters
+from django.contrib.admin.views.main import SEARCH_VAR
 from django.contrib.auth.models import Group, User
 from django.db import models
+from django.db.models import F
 from django.http import HttpResponseRedirect
 from django.templatetags.static import static
 from django.urls import reverse
 from django.utils.html import format_html, format_html_join
 from django.utils.http import urlquote
 from django.utils.safestring import mark_safe
-from djangoql.admin import DjangoQLSearchMixin
+from djangoql.admin import DJANGOQL_SEARCH_MARKER, DjangoQLSearchMixin
 
 from documents.actions import (
     add_tag_to_selected,
@@ -20,7 +22,8 @@ from documents.actions import (
     set_correspondent_on_selected
 )
 
-from .models import Correspondent, Document, Log, Tag
+from .models import ConsumptionJob, Correspondent, Document, Log, Tag
+from .search import get_index, is_ranked, search
 
 
 class FinancialYearFilter(admin.SimpleListFilter):
@@ -74,8 +77,8 @@ class FinancialYearFilter(admin.SimpleListFilter):
             return None
 
         r = []
-        for document in Document.objects.all():
-            r.append(self._determine_fy(document.created))
+        for created in Document.objects.values_list("created", flat=True):
+            r.append(self._determine_fy(created))
 
         return sorted(set(r), key=lambda x: x[0], reverse=True)
 
@@ -173,7 +176,7 @@ class DocumentAdmin(DjangoQLSearchMixin, CommonAdmin):
             "all": ("paperless.css",)
         }
 
-    search_fields = ("correspondent__name", "title", "content", "tags__name")
+    search_fields = ("correspondent__name", "title", "tags__name")
     readonly_fields = ("added", "file_type", "storage_type",)
     list_display = ("title", "created", "added", "thumbnail", "correspondent",
                     "tags_")
@@ -203,6 +206,35 @@ class DocumentAdmin(DjangoQLSearchMixin, CommonAdmin):
     def has_add_permission(self, request):
         return False
 
+    def get_search_results(self, request, queryset, search_term):
+        """
+        Search the content (and title) of documents with the full-text index,
+        unless it's a DjangoQL query.
+        """
+
+        if self._is_djangoql_search(request):
+            return super().get_search_results(request, queryset, search_term)
+
+        terms = search_term.split()
+        if not terms:
+            return queryset, False
+
+        return search(queryset, terms, self.search_fields), True
+
+    def get_ordering(self, request):
+        """
+        Put the best matches first when searching with the full-text index.
+        """
+        terms = request.GET.get(SEARCH_VAR, "").split()
+        if is_ranked(terms) and get_index() is not None and \
+                not self._is_djangoql_search(request):
+            return [F("search_rank").desc(nulls_last=True), "-created"]
+        return super().get_ordering(request)
+
+    def _is_djangoql_search(self, request):
+        return not self.search_mode_toggle_enabled() or \
+            request.GET.get(DJANGOQL_SEARCH_MARKER, "").lower() == "on"
+
     def created_(self, obj):
         return obj.created.date().strftime("%Y-%m-%d")
     created_.short_description = "Created"
@@ -345,10 +377,22 @@ class LogAdmin(CommonAdmin):
     list_filter = ("level", "created",)
 
 
+class ConsumptionJobAdmin(CommonAdmin):
+
+    list_display = (
+        "path", "state", "priority", "attempts", "worker", "modified")
+    list_filter = ("state", "created",)
+    readonly_fields = (
+        "path", "mtime", "attempts", "worker", "message", "created",
+        "modified"
+    )
+
+
 admin.site.register(Correspondent, CorrespondentAdmin)
 admin.site.register(Tag, TagAdmin)
 admin.site.register(Document, DocumentAdmin)
 admin.site.register(Log, LogAdmin)
+admin.site.register(ConsumptionJob, ConsumptionJobAdmin)
 
 
 # Unless we implement multi-user, these default registrations don't make sense.
@@ -1,5 +1,11 @@
 from django.apps import AppConfig
-from django.db.models.signals import post_delete
+from django.db.backends.signals import connection_created
+from django.db.models.signals import (
+    post_delete,
+    post_save,
+    pre_delete,
+    pre_save
+)
 
 
 class DocumentsConfig(AppConfig):
@@ -8,6 +14,7 @@ class DocumentsConfig(AppConfig):
 
     def ready(self):
 
+        from .models import Correspondent, Document, Tag
         from .signals import document_consumption_started
         from .signals import document_consumption_finished
         from .signals.handlers import (
@@ -16,6 +23,10 @@ class DocumentsConfig(AppConfig):
             run_pre_consume_script,
             run_post_consume_script,
             cleanup_document_deletion,
+            invalidate_matcher,
+            register_database_functions,
+            remove_from_search_index,
+            update_search_index,
             set_log_entry
         )
 
@@ -28,4 +39,14 @@ class DocumentsConfig(AppConfig):
 
         post_delete.connect(cleanup_document_deletion)
 
+        connection_created.connect(register_database_functions)
+
+        pre_save.connect(remove_from_search_index, sender=Document)
+        post_save.connect(update_search_index, sender=Document)
+        pre_delete.connect(remove_from_search_index, sender=Document)
+
+        for model in (Correspondent, Tag):
+            post_save.connect(invalidate_matcher, sender=model)
+            post_delete.connect(invalidate_matcher, sender=model)
+
         AppConfig.ready(self)
@@ -37,3 +37,32 @@ def changed_password_check(app_configs, **kwargs):
                 """))]
 
     return []
+
+
+@register()
+def thumbnail_format_check(app_configs, **kwargs):
+
+    from PIL import features
+    from documents.parsers import THUMBNAIL_FORMATS
+
+    if settings.THUMBNAIL_FORMAT not in THUMBNAIL_FORMATS:
+        return [Error(
+            "{} isn't a thumbnail format we know of.".format(
+                settings.THUMBNAIL_FORMAT),
+            hint="Set PAPERLESS_THUMBNAIL_FORMAT to one of {}.".format(
+                ", ".join(sorted(THUMBNAIL_FORMATS)))
+        )]
+
+    if settings.THUMBNAIL_FORMAT == "webp" and not features.check("webp"):
+        return [Error(
+            "Your installation of Pillow can't write WebP thumbnails.",
+            hint="Install libwebp and then Pillow again, or choose another "
+                 "PAPERLESS_THUMBNAIL_FORMAT."
+        )]
+
+    if not 1 <= settings.THUMBNAIL_QUALITY <= 100:
+        return [Error(
+            "PAPERLESS_THUMBNAIL_QUALITY has to be between 1 and 100."
+        )]
+
+    return []
@@ -1,9 +1,12 @@
-from django.db import transaction
+from django.db import connections, transaction
 import datetime
 import hashlib
 import logging
+import multiprocessing
 import os
+import queue
 import re
+import socket
 import time
 import uuid
 
@@ -12,7 +15,7 @@ from django.conf import settings
 from django.utils import timezone
 from paperless.db import GnuPG
 
-from .models import Document, FileInfo, Tag
+from .models import Classification, ConsumptionJob, Document, FileInfo
 from .parsers import ParseError
 from .signals import (
     document_consumer_declaration,
@@ -40,14 +43,18 @@ class Consumer:
     FILES_MIN_UNMODIFIED_DURATION = 0.5
 
     def __init__(self, consume=settings.CONSUMPTION_DIR,
-                 scratch=settings.SCRATCH_DIR):
+                 scratch=settings.SCRATCH_DIR, workers=1):
 
         self.logger = logging.getLogger(__name__)
         self.logging_group = None
 
-        self._ignore = []
         self.consume = consume
         self.scratch = scratch
+        self.worker_id = "{}:{}".format(socket.gethostname(), os.getpid())
+
+        self.pool = None
+        if workers > 1:
+            self.pool = ConsumerPool(workers, consume=consume, scratch=scratch)
 
         os.makedirs(self.scratch, exist_ok=True)
 
@@ -82,17 +89,19 @@ class Consumer:
 
     def consume_new_files(self):
         """
-        Find non-ignored files in consumption dir and consume them if they have
-        been unmodified for FILES_MIN_UNMODIFIED_DURATION.
+        Queue every file in the consumption dir that has been unmodified for
+        FILES_MIN_UNMODIFIED_DURATION and that we don't already know about,
+        then work through the queue.
         """
-        ignored_files = []
+
+        known = set(ConsumptionJob.objects.exclude(
+            state=ConsumptionJob.STATE_DONE).values_list("path", "mtime"))
+
         files = []
         for entry in os.scandir(self.consume):
             if entry.is_file():
                 file = (entry.path, entry.stat().st_mtime)
-                if file in self._ignore:
-                    ignored_files.append(file)
-                else:
+                if file not in known:
                     files.append(file)
             else:
                 self.logger.warning(
@@ -100,27 +109,86 @@ class Consumer:
                     entry.path
                 )
 
-        if not files:
+        if files:
+
+            files_old_to_new = sorted(files, key=itemgetter(1))
+
+            time.sleep(self.FILES_MIN_UNMODIFIED_DURATION)
+
+            for file, mtime in files_old_to_new:
+                if mtime == os.path.getmtime(file):
+                    # File has not been modified and can be consumed
+                    ConsumptionJob.objects.enqueue(file, mtime)
+
+        self.process_queue()
+
+    def consume_file(self, file, mtime=None, priority=None):
+        """
+        Queue a single file for consumption and work through the queue.
+        """
+        ConsumptionJob.objects.enqueue(file, mtime=mtime, priority=priority)
+        self.process_queue()
+
+    def process_queue(self, timeout=None):
+        """
+        Claim queued jobs and consume them, either right here or, if we have a
+        pool of workers, by handing them over to whichever workers are free.
+        With a pool, this also wraps up the jobs the workers have finished,
+        waiting up to `timeout` seconds for one if none are done yet.
+        """
+
+        if self.pool:
+            self._collect_results(timeout)
+
+        held_back = []
+        while not self.pool or self.pool.has_capacity:
+
+            job = ConsumptionJob.objects.claim(
+                self.worker_id, exclude=held_back)
+            if job is None:
+                return
+
+            if not self.pool:
+                self.consume_job(job)
+                continue
+
+            if not self.pool.is_running:
+                self.pool.start()
+
+            if not self.pool.submit(job):
+                job.requeue(count_attempt=False)
+                held_back.append(job.pk)
+
+    def consume_job(self, job):
+
+        if not os.path.isfile(job.path):
+            job.finish(False, "The file has disappeared")
             return
 
-        # Set _ignore to only include files that still exist.
-        # This keeps it from growing indefinitely.
-        self._ignore[:] = ignored_files
+        job.finish(self.try_consume_file(job.path))
+
+    def _collect_results(self, timeout=None):
 
-        files_old_to_new = sorted(files, key=itemgetter(1))
+        for job, consumed, message in self.pool.collect(timeout=timeout):
+            if consumed is None:
+                job.requeue(message=message)
+            else:
+                job.finish(consumed)
 
-        time.sleep(self.FILES_MIN_UNMODIFIED_DURATION)
+    @property
+    def busy(self):
+        return bool(self.pool and self.pool.in_flight)
 
-        for file, mtime in files_old_to_new:
-            if mtime == os.path.getmtime(file):
-                # File has not been modified and can be consumed
-                if not self.try_consume_file(file):
-                    self._ignore.append((file, mtime))
+    def stop(self):
+        if self.pool:
+            self.pool.stop()
 
-    @transaction.atomic
     def try_consume_file(self, file):
         """
-        Return True if file was consumed
+        Return True if file was consumed.  All the heavy lifting (OCR,
+        thumbnails, and so on) happens before we touch the database, so that
+        we only ever hold a transaction open for as long as it takes to store
+        the result.
         """
 
         if not re.match(FileInfo.REGEXES["title"], file):
@@ -128,7 +196,12 @@ class Consumer:
 
         doc = file
 
-        if self._is_duplicate(doc):
+        # The only time we read the whole file before storing it, so we
+        # collect everything we need to know about its content while we're
+        # at it.
+        digest = FileDigest(doc)
+
+        if self._is_duplicate(digest.checksum):
             self.log(
                 "info",
                 "Skipping {} as it appears to be a duplicate".format(doc)
@@ -154,33 +227,40 @@ class Consumer:
         parsed_document = parser_class(doc)
 
         try:
-            thumbnail = parsed_document.get_optimised_thumbnail()
+            # The text comes first, as parsers that rasterise the document
+            # for OCR can make the thumbnail from what they've already got.
+            text = parsed_document.get_text()
             date = parsed_document.get_date()
-            document = self._store(
-                parsed_document.get_text(),
-                doc,
-                thumbnail,
-                date
-            )
+            thumbnail = parsed_document.get_optimised_thumbnail()
         except ParseError as e:
             self.log("error", "PARSE FAILURE for {}: {}".format(doc, e))
             parsed_document.cleanup()
             return False
-        else:
+
+        # The one time we match the text against the rules of every tag and
+        # correspondent
+        classification = Classification.from_text(text)
+
+        try:
+            document = self._store(
+                text, doc, thumbnail, date, digest, classification)
+        finally:
             parsed_document.cleanup()
-            self._cleanup_doc(doc)
 
-            self.log(
-                "info",
-                "Document {} consumption finished".format(document)
-            )
+        self._cleanup_doc(doc)
 
-            document_consumption_finished.send(
-                sender=self.__class__,
-                document=document,
-                logging_group=self.logging_group
-            )
-            return True
+        self.log(
+            "info",
+            "Document {} consumption finished".format(document)
+        )
+
+        document_consumption_finished.send(
+            sender=self.__class__,
+            document=document,
+            logging_group=self.logging_group,
+            classification=classification
+        )
+        return True
 
     def _get_parser_class(self, doc):
         """
@@ -207,30 +287,52 @@ class Consumer:
         return sorted(
             options, key=lambda _: _["weight"], reverse=True)[0]["parser"]
 
-    def _store(self, text, doc, thumbnail, date):
+    def _store(self, text, doc, thumbnail, date, digest, classification):
+        """
+        Create the document, tag it, and move its files into place, all in one
+        short transaction.  If anything goes wrong, the transaction is rolled
+        back, and since the database can't take the files along with it, we
+        delete whatever we've written ourselves.
+        """
 
-        file_info = FileInfo.from_path(doc)
+        relevant_tags = set(classification.tags)
 
-        stats = os.stat(doc)
+        written = []
+        try:
+            with transaction.atomic():
+                document = self._create_document(
+                    text, doc, thumbnail, date, digest, relevant_tags, written)
+        except Exception:
+            self._remove_written(written)
+            raise
+
+        self.log("info", "Completed")
+
+        return document
+
+    def _create_document(self, text, doc, thumbnail, date, digest,
+                         relevant_tags, written):
+
+        file_info = FileInfo.from_path(doc)
 
         self.log("debug", "Saving record to database")
 
         created = file_info.created or date or timezone.make_aware(
-                    datetime.datetime.fromtimestamp(stats.st_mtime))
-
-        with open(doc, "rb") as f:
-            document = Document.objects.create(
-                correspondent=file_info.correspondent,
-                title=file_info.title,
-                content=text,
-                file_type=file_info.extension,
-                checksum=hashlib.md5(f.read()).hexdigest(),
-                created=created,
-                modified=created,
-                storage_type=self.storage_type
-            )
+                    datetime.datetime.fromtimestamp(digest.mtime))
+
+        document = Document.objects.create(
+            correspondent=file_info.correspondent,
+            title=file_info.title,
+            content=text,
+            file_type=file_info.extension,
+            checksum=digest.checksum,
+            created=created,
+            modified=created,
+            storage_type=self.storage_type,
+            thumbnail_type=self._get_thumbnail_type(thumbnail)
+        )
 
-        relevant_tags = set(list(Tag.match_all(text)) + list(file_info.tags))
+        relevant_tags.update(file_info.tags)
         if relevant_tags:
             tag_names = ", ".join([t.slug for t in relevant_tags])
             self.log("debug", "Tagging with {}".format(tag_names))
@@ -239,32 +341,356 @@ class Consumer:
         # Create directory to store document in
         document.create_source_directory()
 
-        # Safe document and thumbnail
-        self._write(document, doc, document.source_path)
-        self._write(document, thumbnail, document.thumbnail_path)
+        # Safe document and thumbnail.  We note down each target before we
+        # write to it, so that even a partial write gets cleaned up.
+        try:
+            written.append(document.source_path)
+            self._write(document, doc, document.source_path, digest)
+            written.append(document.thumbnail_path)
+            self._write(document, thumbnail, document.thumbnail_path)
+
+            document.set_filename(document.source_filename)
+            document.save()
+        finally:
+            # Saving may have moved the file somewhere else to match the
+            # filename format
+            written.append(document.source_path)
 
-        document.set_filename(document.source_filename)
-        document.save()
+        return document
 
-        self.log("info", "Completed")
+    def _remove_written(self, paths):
 
-        return document
+        for path in set(paths):
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                continue
+            self.log("debug", "Removed {}".format(path))
+
+        originals = Document.filename_to_path("")
+        for path in set(paths):
+            if path.startswith(originals):
+                Document.try_delete_empty_directories(os.path.dirname(path))
+
+    def _write(self, document, source, target, digest=None):
+        """
+        Copy source to target, a chunk at a time.  If we're given the digest
+        of the source, we check that what we copied still matches it, so we
+        never store a file that changed after we checked for duplicates.
+        """
 
-    def _write(self, document, source, target):
         with open(source, "rb") as read_file:
             with open(target, "wb") as write_file:
-                if document.storage_type == Document.STORAGE_TYPE_UNENCRYPTED:
-                    write_file.write(read_file.read())
+
+                if document.storage_type != Document.STORAGE_TYPE_UNENCRYPTED:
+                    self.log("debug", "Encrypting")
+                    write_file.write(GnuPG.encrypted(read_file))
                     return
-                self.log("debug", "Encrypting")
-                write_file.write(GnuPG.encrypted(read_file))
+
+                sha256 = bool(digest and digest.sha256)
+                copied = FileDigest.of_stream(
+                    read_file, output=write_file, sha256=sha256)
+
+        if digest and copied != digest:
+            raise ConsumerError(
+                "{} changed while it was being consumed".format(source))
 
     def _cleanup_doc(self, doc):
         self.log("debug", "Deleting document {}".format(doc))
         os.unlink(doc)
 
     @staticmethod
-    def _is_duplicate(doc):
-        with open(doc, "rb") as f:
-            checksum = hashlib.md5(f.read()).hexdigest()
+    def _get_thumbnail_type(thumbnail):
+        """
+        Parsers are free to hand us any kind of thumbnail we know how to
+        serve, and what kind it is, is down to its extension.
+        """
+        extension = os.path.splitext(thumbnail)[1][1:].lower()
+        extension = {"jpeg": Document.THUMBNAIL_TYPE_JPG}.get(
+            extension, extension)
+        if extension not in dict(Document.THUMBNAIL_TYPES):
+            raise ConsumerError(
+                "Unsupported thumbnail type: {}".format(thumbnail))
+        return extension
+
+    @staticmethod
+    def _is_duplicate(checksum):
         return Document.objects.filter(checksum=checksum).exists()
+
+
+class FileDigest:
+    """
+    The checksum and size of a file, along with its SHA-256 if asked for, all
+    worked out in a single pass over the file.  The file is read in chunks, so
+    no matter how big a scan is, we never hold more than CHUNK_SIZE bytes of
+    it in memory.
+    """
+
+    CHUNK_SIZE = 1024 * 1024
+
+    def __init__(self, path=None, sha256=False):
+
+        self.checksum = None
+        self.size = 0
+        self.sha256 = None
+        self.mtime = None
+
+        if path:
+            self.mtime = os.stat(path).st_mtime
+            with open(path, "rb") as f:
+                self._digest(f, sha256=sha256)
+
+    def __eq__(self, other):
+        return (self.checksum, self.size, self.sha256) == \
+            (other.checksum, other.size, other.sha256)
+
+    @classmethod
+    def of_stream(cls, stream, output=None, sha256=False):
+        """
+        Digest everything left in stream, copying it to output on the way if
+        we're given somewhere to put it.
+        """
+        r = cls()
+        r._digest(stream, output=output, sha256=sha256)
+        return r
+
+    def _digest(self, stream, output=None, sha256=False):
+
+        md5 = hashlib.md5()
+        sha = hashlib.sha256() if sha256 else None
+
+        for chunk in iter(lambda: stream.read(self.CHUNK_SIZE), b""):
+            md5.update(chunk)
+            if sha:
+                sha.update(chunk)
+            if output:
+                output.write(chunk)
+            self.size += len(chunk)
+
+        self.checksum = md5.hexdigest()
+        if sha:
+            self.sha256 = sha.hexdigest()
+
+
+class ConsumerPool:
+    """
+    Hand files over to a number of worker processes, each running a Consumer
+    of its own, so that a large document doesn't hold up everything queued
+    behind it.  The pool acts as the coordinator: it never has two workers
+    busy with the same file, or with two files that might have the same
+    content, and it reports back which files were consumed.  Each worker has
+    a task queue of its own, so we always know which file it's holding, and
+    if it dies on us, we can put that file back on the queue and start
+    another worker in its place.
+    """
+
+    # How often (in seconds) an idle worker checks whether we're still around
+    WORKER_POLL_INTERVAL = 1
+
+    def __init__(self, workers, consume=settings.CONSUMPTION_DIR,
+                 scratch=settings.SCRATCH_DIR):
+
+        self.logger = logging.getLogger(__name__)
+
+        self.workers = workers
+        self.consume = consume
+        self.scratch = scratch
+
+        self._results = multiprocessing.Queue()
+        self._workers = []
+
+        # path -> (job, size, worker) for every file handed out to a worker
+        self._in_flight = {}
+
+    @property
+    def is_running(self):
+        return bool(self._workers)
+
+    def start(self):
+
+        for __ in range(self.workers):
+            self._workers.append(self._start_worker())
+
+        self.logger.info(
+            "Started {} consumer workers".format(len(self._workers)))
+
+    def _start_worker(self):
+
+        # Forked workers mustn't share our database connection, so we close it
+        # here and let every process open its own when it needs one.
+        connections.close_all()
+
+        tasks = multiprocessing.Queue()
+        process = multiprocessing.Process(
+            target=_consume_in_worker,
+            args=(
+                tasks,
+                self._results,
+                self.consume,
+                self.scratch,
+                os.getpid()
+            )
+        )
+        process.start()
+
+        return ConsumerPoolWorker(process, tasks)
+
+    def stop(self):
+
+        for worker in self._workers:
+            worker.tasks.put(None)
+
+        for worker in self._workers:
+            worker.process.join()
+
+        self._workers = []
+
+    @property
+    def in_flight(self):
+        return len(self._in_flight)
+
+    @property
+    def has_capacity(self):
+        return len(self._in_flight) < self.workers
+
+    def is_in_flight(self, file):
+        return file in self._in_flight
+
+    def submit(self, job):
+        """
+        Hand a job to an idle worker.  Returns False if its file, or another
+        one that might have the same content, is already being worked on, in
+        which case it's up to the caller to try again later.
+
+        We go by size rather than checksum, as only the worker should have to
+        read the whole file.  Two files of the same size are rarely the same,
+        but all it costs us is that one waits for the other, after which the
+        worker finds out whether it's a duplicate from its own digest.
+
+        A job whose file has disappeared since it was queued is failed right
+        here, and counts as taken care of.
+        """
+
+        if job.path in self._in_flight:
+            return False
+
+        try:
+            size = os.stat(job.path).st_size
+        except OSError:
+            self.logger.warning(
+                "Not consuming {} as it has disappeared".format(job.path))
+            job.finish(False, "The file has disappeared")
+            return True
+
+        for other, (__, other_size, __) in self._in_flight.items():
+            if size == other_size:
+                self.logger.info(
+                    "Holding back {} as it has the same size as {}, which is "
+                    "currently being consumed".format(job.path, other)
+                )
+                return False
+
+        busy = [worker for __, __, worker in self._in_flight.values()]
+        worker = next(w for w in self._workers if w not in busy)
+
+        self._in_flight[job.path] = (job, size, worker)
+        worker.tasks.put(job.path)
+
+        return True
+
+    def collect(self, timeout=None):
+        """
+        Return a list of (job, consumed, message) tuples for every job the
+        workers finished since the last call, where `consumed` is None if the
+        worker blew up, or died.  If a timeout is given, wait up to that many
+        seconds for the first result, unless a worker has died already.
+        """
+
+        # Before we look at the results, so that we don't miss one a worker
+        # sent us just before it died.
+        dead = [w for w in self._workers if not w.process.is_alive()]
+        if dead:
+            timeout = None
+
+        r = []
+        while True:
+            try:
+                if timeout and not r:
+                    file, consumed, message = self._results.get(
+                        timeout=timeout)
+                else:
+                    file, consumed, message = self._results.get_nowait()
+            except queue.Empty:
+                break
+            job, __, __ = self._in_flight.pop(file)
+            r.append((job, consumed, message))
+
+        for worker in dead:
+            r.extend(self._replace(worker))
+
+        return r
+
+    def _replace(self, worker):
+        """
+        Start a new worker in place of one that died, and return a result for
+        the file it was holding, if any, so that it's put back on the queue.
+        """
+
+        message = "Consumer worker {} died with exit code {}".format(
+            worker.process.pid, worker.process.exitcode)
+        self.logger.error(message)
+
+        r = []
+        for file, (job, __, holder) in list(self._in_flight.items()):
+            if holder is worker:
+                del self._in_flight[file]
+                r.append((job, None, message))
+
+        self._workers[self._workers.index(worker)] = self._start_worker()
+
+        return r
+
+
+class ConsumerPoolWorker:
+    """
+    A worker process of a ConsumerPool, along with the queue it takes its
+    tasks from.
+    """
+
+    def __init__(self, process, tasks):
+        self.process = process
+        self.tasks = tasks
+
+
+def _consume_in_worker(tasks, results, consume, scratch, parent_pid):
+    """
+    The main loop of a ConsumerPool worker: take a file from the task queue,
+    consume it, and report back until told to stop or orphaned.  Jobs are
+    claimed and finished by the coordinator, never by the workers.
+    """
+
+    logger = logging.getLogger(__name__)
+
+    try:
+        consumer = Consumer(consume=consume, scratch=scratch)
+        while True:
+            try:
+                file = tasks.get(timeout=ConsumerPool.WORKER_POLL_INTERVAL)
+            except queue.Empty:
+                if os.getppid() != parent_pid:
+                    return
+                continue
+
+            if file is None:
+                return
+
+            try:
+                results.put((file, consumer.try_consume_file(file), ""))
+            except Exception as e:
+                logger.error(
+                    "Consumption of {} failed: {}".format(file, e),
+                    exc_info=True
+                )
+                results.put((file, None, str(e)))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,134 @@
+import datetime
+import re
+from functools import lru_cache
+
+from dateparser.date import DateDataParser
+from tzlocal import get_localzone
+
+# This regular expression will try to find dates in the document at
+# hand and will match the following formats:
+# - XX.YY.ZZZZ with XX + YY being 1 or 2 and ZZZZ being 2 or 4 digits
+# - XX/YY/ZZZZ with XX + YY being 1 or 2 and ZZZZ being 2 or 4 digits
+# - XX-YY-ZZZZ with XX + YY being 1 or 2 and ZZZZ being 2 or 4 digits
+# - ZZZZ.XX.YY with XX + YY being 1 or 2 and ZZZZ being 2 or 4 digits
+# - ZZZZ/XX/YY with XX + YY being 1 or 2 and ZZZZ being 2 or 4 digits
+# - ZZZZ-XX-YY with XX + YY being 1 or 2 and ZZZZ being 2 or 4 digits
+# - XX. MONTH ZZZZ with XX being 1 or 2 and ZZZZ being 2 or 4 digits
+# - MONTH ZZZZ, with ZZZZ being 4 digits
+# - MONTH XX, ZZZZ with XX being 1 or 2 and ZZZZ being 4 digits
+DATE_REGEX = re.compile(
+    r'(\b|(?!=([_-])))([0-9]{1,2})[\.\/-]([0-9]{1,2})[\.\/-]([0-9]{4}|[0-9]{2})(\b|(?=([_-])))|' +  # NOQA: E501
+    r'(\b|(?!=([_-])))([0-9]{4}|[0-9]{2})[\.\/-]([0-9]{1,2})[\.\/-]([0-9]{1,2})(\b|(?=([_-])))|' +  # NOQA: E501
+    r'(\b|(?!=([_-])))([0-9]{1,2}[\. ]+[^ ]{3,9} ([0-9]{4}|[0-9]{2}))(\b|(?=([_-])))|' +  # NOQA: E501
+    r'(\b|(?!=([_-])))([^\W\d_]{3,9} [0-9]{1,2}, ([0-9]{4}))(\b|(?=([_-])))|' +
+    r'(\b|(?!=([_-])))([^\W\d_]{3,9} [0-9]{4})(\b|(?=([_-])))'
+)
+
+# Purely numeric dates with a four digit year, which we can read without
+# dateparser's help, so long as they're unambiguous in the given date order.
+YEAR_LAST = re.compile(r"^([0-9]{1,2})[\./-]([0-9]{1,2})[\./-]([0-9]{4})$")
+YEAR_FIRST = re.compile(r"^([0-9]{4})[\./-]([0-9]{1,2})[\./-]([0-9]{1,2})$")
+
+# Any other purely numeric date
+NUMERIC = re.compile(r"^[0-9]+[\./-][0-9]+[\./-][0-9]+$")
+
+# dateparser reads a date with the year at the end day first or month first
+# depending on the date order, but not always the way you'd expect (YMD is
+# read day first).  These are the orders where it does what it says.
+YEAR_LAST_ORDERS = {"DMY": True, "MDY": False}
+
+# How many date strings we remember the meaning of.  Bank statements and the
+# like tend to have the same few dates over and over again.
+CACHE_SIZE = 4096
+
+
+def find_date(text, date_order, min_year=1900, max_year=None):
+    """
+    The first date in the text, as a timezone-aware datetime, that lies
+    after min_year and before max_year (5 years from now, by default), along
+    with the string it was read from.  Returns (None, None) if there isn't
+    one.
+
+    The text is searched from the start, one candidate at a time, so for the
+    usual case of a date near the top of the first page, we never look any
+    further than that.
+    """
+
+    if max_year is None:
+        max_year = datetime.date.today().year + 5
+
+    for m in DATE_REGEX.finditer(text):
+        date_string = m.group(0)
+        date = parse_date(date_string, date_order)
+        if date is not None and max_year > date.year > min_year:
+            return date, date_string
+
+    return None, None
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def parse_date(date_string, date_order):
+    """
+    Read a single date string the same way dateparser.parse() would with our
+    settings, only a lot faster: numeric dates are read directly where
+    that's safe, and for everything else, we reuse one dateparser
+    configuration per date order rather than setting one up every time.
+    Returns None for anything that isn't a date.
+    """
+
+    date = _parse_numeric(date_string, date_order)
+    if date is not None:
+        return date
+
+    # Numbers read the same in every language, and when there's nothing
+    # to read, trying every last one of them takes the better part of a
+    # second.
+    numeric = NUMERIC.match(date_string) is not None
+
+    try:
+        return _get_parser(date_order, numeric).get_date_data(
+            date_string)["date_obj"]
+    except (TypeError, ValueError):
+        return None
+
+
+def _parse_numeric(date_string, date_order):
+    """
+    The date of a numeric date string with a four digit year, or None if it
+    isn't one, or if we'd rather leave it to dateparser.
+    """
+
+    m = YEAR_FIRST.match(date_string)
+    if m:
+        year, first, second = (int(g) for g in m.groups())
+        day_first = date_order.index("D") < date_order.index("M")
+    else:
+        m = YEAR_LAST.match(date_string)
+        if not m or date_order not in YEAR_LAST_ORDERS:
+            return None
+        first, second, year = (int(g) for g in m.groups())
+        day_first = YEAR_LAST_ORDERS[date_order]
+
+    day, month = (first, second) if day_first else (second, first)
+
+    try:
+        date = datetime.datetime(year, month, day)
+    except ValueError:
+        # dateparser sometimes tries the other way around, so we let it
+        return None
+
+    return get_localzone().localize(date)
+
+
+@lru_cache()
+def _get_parser(date_order, numeric=False):
+    return DateDataParser(
+        languages=["en"] if numeric else None,
+        settings={
+            "DATE_ORDER": date_order,
+            "PREFER_DAY_OF_MONTH": "first",
+            "RETURN_AS_TIMEZONE_AWARE": True
+        },
+        # dateparser.parse() starts from scratch every time, and so do we
+        try_previous_locales=False
+    )
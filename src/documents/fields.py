@@ -0,0 +1,91 @@
+import zlib
+
+from django.db import models
+from django.db.models import lookups
+
+# zlib's best, as text is written once and read many times, and
+# decompressing is just as quick whatever the level.
+COMPRESSION_LEVEL = 9
+
+# The SQL function CompressedTextField lookups read the text through
+DECOMPRESS = "paperless_decompress"
+
+
+def compress(text):
+    return zlib.compress(text.encode("utf-8"), COMPRESSION_LEVEL)
+
+
+def decompress(value):
+    """
+    The text of a value stored by a CompressedTextField, which may well be
+    text already, if it was stored before we started compressing, or
+    elsewhere.
+    """
+    if isinstance(value, (bytes, memoryview)):
+        return zlib.decompress(value).decode("utf-8")
+    return value
+
+
+def register_functions(connection):
+    """
+    Let SQLite decompress values itself, for lookups.
+    """
+    if connection.vendor == "sqlite":
+        connection.connection.create_function(DECOMPRESS, 1, decompress)
+
+
+class CompressedTextField(models.TextField):
+    """
+    A TextField that's stored compressed with zlib on SQLite, where text is
+    stored as is, and read back as text.  Lookups like icontains look
+    through the decompressed text, if slowly, as there's no indexing it.
+
+    PostgreSQL compresses long text by itself, and has our full-text and
+    trigram indexes to keep, so it's left alone there, as is everything
+    else.
+    """
+
+    def db_type(self, connection):
+        if connection.vendor == "sqlite":
+            return "blob"
+        return super().db_type(connection)
+
+    def get_db_prep_value(self, value, connection, prepared=False):
+        value = super().get_db_prep_value(value, connection, prepared)
+        if value is not None and connection.vendor == "sqlite":
+            return compress(value)
+        return value
+
+    def from_db_value(self, value, expression, connection):
+        return decompress(value)
+
+
+class DecompressedLookupMixin:
+    """
+    Compares the text of a CompressedTextField with the plain text on the
+    right, rather than its compressed bytes.
+    """
+
+    def process_lhs(self, compiler, connection, lhs=None):
+        sql, params = super().process_lhs(compiler, connection, lhs)
+        if connection.vendor == "sqlite":
+            sql = "{}({})".format(DECOMPRESS, sql)
+        return sql, params
+
+    def get_db_prep_lookup(self, value, connection):
+        if getattr(self, "get_db_prep_lookup_value_is_iterable", False):
+            return "%s", list(value)
+        return "%s", [value]
+
+
+# Every lookup that compares values, as any we left out would compare the
+# compressed bytes instead, and quietly find the wrong documents.  isnull
+# needs no help, as None is never compressed.
+for lookup in (lookups.Exact, lookups.IExact, lookups.GreaterThan,
+               lookups.GreaterThanOrEqual, lookups.LessThan,
+               lookups.LessThanOrEqual, lookups.In, lookups.Range,
+               lookups.Contains, lookups.IContains, lookups.StartsWith,
+               lookups.IStartsWith, lookups.EndsWith, lookups.IEndsWith,
+               lookups.Regex, lookups.IRegex):
+    CompressedTextField.register_lookup(type(
+        lookup.__name__, (DecompressedLookupMixin, lookup), {}))
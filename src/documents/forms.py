@@ -7,7 +7,7 @@ from time import mktime
 from django import forms
 from django.conf import settings
 
-from .models import Document, Correspondent
+from .models import ConsumptionJob, Document, Correspondent
 
 
 class UploadForm(forms.Form):
@@ -81,8 +81,9 @@ class UploadForm(forms.Form):
     def save(self):
         """
         Since the consumer already does a lot of work, it's easier just to save
-        to-be-consumed files to the consumption directory rather than have the
-        form do that as well.  Think of it as a poor-man's queue server.
+        to-be-consumed files to the consumption directory and queue them up
+        rather than have the form do that as well.  Uploads jump the queue, as
+        there's someone waiting for them.
         """
 
         correspondent = self.cleaned_data.get("correspondent")
@@ -97,4 +98,7 @@ class UploadForm(forms.Form):
 
         with open(file_name, "wb") as f:
             f.write(document)
-            os.utime(file_name, times=(t, t))
+        os.utime(file_name, times=(t, t))
+
+        ConsumptionJob.objects.enqueue(
+            file_name, mtime=t, priority=ConsumptionJob.PRIORITY_HIGH)
@@ -13,7 +13,7 @@ from dateutil import parser
 
 from django.conf import settings
 
-from .models import Correspondent
+from .models import ConsumptionJob, Correspondent
 
 
 class MailFetcherError(Exception):
@@ -170,9 +170,9 @@ class MailFetcher(Loggable):
 
     def pull(self):
         """
-        Fetch all available mail at the target address and store it locally in
-        the consumption directory so that the file consumer can pick it up and
-        do its thing.
+        Fetch all available mail at the target address, store it locally in
+        the consumption directory and queue it up so that the file consumer can
+        pick it up and do its thing.
         """
 
         if self._enabled:
@@ -190,7 +190,9 @@ class MailFetcher(Loggable):
                 file_name = os.path.join(self.consume, message.file_name)
                 with open(file_name, "wb") as f:
                     f.write(message.attachment.data)
-                    os.utime(file_name, times=(t, t))
+                os.utime(file_name, times=(t, t))
+
+                ConsumptionJob.objects.enqueue(file_name, mtime=t)
 
         self.last_checked = time.time()
 
@@ -7,6 +7,7 @@ from django.core.management.base import BaseCommand, CommandError
 
 from ...consumer import Consumer, ConsumerError
 from ...mail import MailFetcher, MailFetcherError
+from ...models import ConsumptionJob
 
 try:
     from inotify_simple import INotify, flags
@@ -64,6 +65,13 @@ class Command(BaseCommand):
             help="Don't use inotify, even if it's available.",
             default=False
         )
+        parser.add_argument(
+            "--workers",
+            default=settings.CONSUMER_WORKERS,
+            type=int,
+            help="The number of documents to consume at the same time, each "
+                 "in a process of its own."
+        )
 
     def handle(self, *args, **options):
 
@@ -73,8 +81,12 @@ class Command(BaseCommand):
         mail_delta = options["mail_delta"] * 60
         use_inotify = INotify is not None and options["no_inotify"] is False
 
+        if options["workers"] < 1:
+            raise CommandError("You need at least one worker")
+
         try:
-            self.file_consumer = Consumer(consume=directory)
+            self.file_consumer = Consumer(
+                consume=directory, workers=options["workers"])
             self.mail_fetcher = MailFetcher(consume=directory)
         except (ConsumerError, MailFetcherError) as e:
             raise CommandError(e)
@@ -82,23 +94,33 @@ class Command(BaseCommand):
         for d in (self.ORIGINAL_DOCS, self.THUMB_DOCS):
             os.makedirs(d, exist_ok=True)
 
+        # Anything a previous run on this machine was still working on when it
+        # stopped goes back on the queue
+        host = self.file_consumer.worker_id.split(":")[0]
+        for job in ConsumptionJob.objects.requeue_abandoned(host):
+            self.logger.warning("Recovered abandoned job %s", job)
+
         logging.getLogger(__name__).info(
-            "Starting document consumer at {}{}".format(
+            "Starting document consumer at {}{}{}".format(
                 directory,
-                " with inotify" if use_inotify else ""
+                " with inotify" if use_inotify else "",
+                " and {} workers".format(options["workers"])
+                if options["workers"] > 1 else ""
             )
         )
 
-        if options["oneshot"]:
-            self.loop_step(mail_delta)
-        else:
-            try:
-                if use_inotify:
-                    self.loop_inotify(mail_delta)
-                else:
-                    self.loop(loop_time, mail_delta)
-            except KeyboardInterrupt:
-                print("Exiting")
+        try:
+            if options["oneshot"]:
+                self.loop_step(mail_delta)
+                self.wait_for_workers()
+            elif use_inotify:
+                self.loop_inotify(mail_delta)
+            else:
+                self.loop(loop_time, mail_delta)
+        except KeyboardInterrupt:
+            print("Exiting")
+        finally:
+            self.file_consumer.stop()
 
     def loop(self, loop_time, mail_delta):
         while True:
@@ -138,14 +160,23 @@ class Command(BaseCommand):
                     for event in inotify.read(timeout=delta):
                         file = os.path.join(directory, event.name)
                         if os.path.isfile(file):
-                            self.file_consumer.try_consume_file(file)
+                            self.file_consumer.consume_file(file)
                         else:
                             self.logger.warning(
                                 "Skipping %s as it is not a file",
                                 file
                             )
+                    self.file_consumer.process_queue()
                 else:
                     break
 
             self.mail_fetcher.pull()
             next_mail_time = self.mail_fetcher.last_checked + mail_delta
+
+    def wait_for_workers(self):
+        """
+        In oneshot mode, we have to stick around until the workers are done
+        with the queue.
+        """
+        while self.file_consumer.busy:
+            self.file_consumer.process_queue(timeout=1)
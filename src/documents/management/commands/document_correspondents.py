@@ -41,7 +41,10 @@ class Command(Renderable, BaseCommand):
 
         self.verbosity = options["verbosity"]
 
-        for document in Document.objects.filter(correspondent__isnull=True):
+        documents = Document.objects.with_content().filter(
+            correspondent__isnull=True)
+
+        for document in documents:
 
             potential_correspondents = list(
                 Correspondent.match_all(document.content))
@@ -0,0 +1,88 @@
+import time
+
+import dateparser
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from documents.dates import DATE_REGEX, find_date, parse_date
+from documents.models import Document
+
+from ...mixins import Renderable
+
+
+class Command(Renderable, BaseCommand):
+
+    help = """
+        Time how long it takes to find the date of each of your documents in
+        its (OCR'd) text, both the way we used to do it, with dateparser for
+        every candidate, and the way we do it now.  Any document for which
+        the two disagree is listed, which should never happen.
+    """.replace("    ", "")
+
+    def __init__(self, *args, **kwargs):
+        self.verbosity = 0
+        BaseCommand.__init__(self, *args, **kwargs)
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--limit",
+            type=int,
+            help="Only look at this many documents"
+        )
+
+    def handle(self, *args, **options):
+
+        self.verbosity = options["verbosity"]
+
+        documents = Document.objects.only("pk", "content").order_by("pk")
+        if options["limit"]:
+            documents = documents[:options["limit"]]
+
+        texts = [(d.pk, d.content) for d in documents]
+        next_year = timezone.now().year + 5
+
+        start = time.time()
+        expected = [self._reference(text, next_year) for _, text in texts]
+        reference_time = time.time() - start
+
+        parse_date.cache_clear()
+        start = time.time()
+        found = [
+            find_date(text, settings.DATE_ORDER, max_year=next_year)[0]
+            for _, text in texts
+        ]
+        fast_time = time.time() - start
+
+        for (pk, _), a, b in zip(texts, expected, found):
+            if a != b:
+                self._render(
+                    "Document {}: {} with dateparser, but {} now".format(
+                        pk, a, b), 0)
+
+        self._render("{} documents, {} characters of text".format(
+            len(texts), sum(len(text) for _, text in texts)), 1)
+        self._render("dateparser: {:.2f}s".format(reference_time), 1)
+        self._render("now:        {:.2f}s ({})".format(
+            fast_time, parse_date.cache_info()), 1)
+
+    @staticmethod
+    def _reference(text, next_year):
+        """
+        How DocumentParser.get_date() used to find the date in the text.
+        """
+
+        for m in DATE_REGEX.finditer(text):
+            try:
+                date = dateparser.parse(
+                    m.group(0),
+                    settings={
+                        "DATE_ORDER": settings.DATE_ORDER,
+                        "PREFER_DAY_OF_MONTH": "first",
+                        "RETURN_AS_TIMEZONE_AWARE": True
+                    }
+                )
+            except (TypeError, ValueError):
+                continue
+            if date is not None and next_year > date.year > 1900:
+                return date
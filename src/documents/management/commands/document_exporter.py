@@ -52,7 +52,7 @@ class Command(Renderable, BaseCommand):
 
     def dump(self):
 
-        documents = Document.objects.all()
+        documents = Document.objects.with_content()
         document_map = {d.pk: d for d in documents}
         manifest = json.loads(serializers.serialize("json", documents))
 
@@ -66,7 +66,8 @@ class Command(Renderable, BaseCommand):
 
             file_target = os.path.join(self.target, document.file_name)
 
-            thumbnail_name = document.file_name + "-thumbnail.png"
+            thumbnail_name = "{}-thumbnail.{}".format(
+                document.file_name, document.thumbnail_type)
             thumbnail_target = os.path.join(self.target, thumbnail_name)
 
             document_dict[EXPORTER_FILE_NAME] = document.file_name
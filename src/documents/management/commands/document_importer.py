@@ -5,8 +5,9 @@ import shutil
 from django.conf import settings
 from django.core.management.base import BaseCommand, CommandError
 from django.core.management import call_command
+from django.db.models import Max
 
-from documents.models import Document
+from documents.models import Document, Generation, Tag
 from paperless.db import GnuPG
 
 from ...mixins import Renderable
@@ -49,6 +50,7 @@ class Command(Renderable, BaseCommand):
 
         # Fill up the database with whatever is in the manifest
         call_command("loaddata", manifest_path)
+        self._advance_generations()
 
         self._import_files_from_manifest()
 
@@ -80,6 +82,23 @@ class Command(Renderable, BaseCommand):
                     'appear to be in the source directory.'.format(doc_file)
                 )
 
+    @staticmethod
+    def _advance_generations():
+        """
+        The documents and tags we've imported are stamped with generations of
+        the tagging rules from the database they were exported from, which
+        may well be ahead of the one here.  If we left it behind, the
+        retagger's --incremental mode would take the documents for up to date
+        with every rule saved from here on.
+        """
+
+        stamps = (
+            Tag.objects.aggregate(m=Max("rule_generation"))["m"],
+            Document.objects.aggregate(m=Max("tag_rules_generation"))["m"]
+        )
+        Generation.objects.advance(
+            Tag.get_generation_name(), max(s or 0 for s in stamps))
+
     def _import_files_from_manifest(self):
 
         for record in self.manifest:
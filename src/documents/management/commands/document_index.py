@@ -0,0 +1,108 @@
+import time
+from multiprocessing.pool import Pool
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+
+from documents.models import Document
+from documents.search import get_index
+
+from ...mixins import Renderable
+
+
+class Command(Renderable, BaseCommand):
+
+    help = """
+        Rebuild the full-text index that searching documents goes by, from
+        the title and content of every document, in batches.  There should
+        be no need for this unless the index has got out of step somehow,
+        like after changing documents directly in the database.
+    """.replace("    ", "")
+
+    def __init__(self, *args, **kwargs):
+        self.verbosity = 0
+        BaseCommand.__init__(self, *args, **kwargs)
+
+    def add_arguments(self, parser):
+        parser.add_argument("command", choices=("rebuild",))
+        parser.add_argument(
+            "--processes",
+            type=int,
+            default=1,
+            help="How many processes to index documents with.  Only "
+                 "PostgreSQL can make use of more than one, as SQLite only "
+                 "ever lets one of them write at a time."
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="How many documents to index at a time"
+        )
+
+    def handle(self, *args, **options):
+
+        self.verbosity = options["verbosity"]
+
+        index = get_index()
+        if index is None:
+            raise CommandError(
+                "There's no full-text index in this database.  Have you run "
+                "the migrations?  (SQLite needs to have been built with FTS5.)"
+            )
+
+        total = Document.objects.count()
+        batches = _get_batches(options["batch_size"])
+        processes = options["processes"]
+
+        # Done in one go, searching carries on with the old index until we're
+        # finished.  With more than one process, there's no such thing as one
+        # go, and documents turn up in searches again batch by batch.
+        with transaction.atomic():
+            index.clear()
+            if processes < 2:
+                self._report(map(_index_batch, batches), total)
+
+        if processes > 1:
+            # The workers are forked off with a copy of our database
+            # connection, which mustn't end up being used by two processes at
+            # once.
+            connections.close_all()
+            with Pool(processes) as pool:
+                self._report(pool.imap_unordered(_index_batch, batches), total)
+
+    def _report(self, counts, total):
+        """
+        Go through how many documents were indexed in each batch, as each of
+        them is done, and tell the user how far along we are.
+        """
+        done = 0
+        start = time.time()
+        for count in counts:
+            done += count
+            self._render("{}/{} documents, {:.0f} documents/s".format(
+                done, total, done / (time.time() - start or 1)), 1)
+
+
+def _get_batches(size):
+    """
+    The pks of every document, a batch at a time, in order.
+    """
+
+    last = 0
+    while True:
+        pks = list(Document.objects.filter(pk__gt=last).order_by(
+            "pk").values_list("pk", flat=True)[:size])
+        if not pks:
+            return
+        yield pks
+        last = pks[-1]
+
+
+def _index_batch(pks):
+    """
+    Index a batch of documents, in this process or a worker, and say how many
+    there were.
+    """
+    get_index().update(pks)
+    return len(pks)
@@ -1,9 +1,20 @@
+import os
+import time
+from collections import deque
+from multiprocessing.pool import Pool
+
 from django.core.management.base import BaseCommand
+from django.db import connections, transaction
+from django.db.models.signals import m2m_changed
 
-from documents.models import Document, Tag
+from documents.matching import Matcher
+from documents.models import Document, Generation, Tag
 
 from ...mixins import Renderable
 
+# The Matcher of a worker process, compiled once when it starts
+_matcher = None
+
 
 class Command(Renderable, BaseCommand):
 
@@ -16,17 +27,204 @@ class Command(Renderable, BaseCommand):
 
     def __init__(self, *args, **kwargs):
         self.verbosity = 0
+        self.tags = {}
+        self.generation = 0
+        self.start = None
+        self.done = 0
+        self.tagged = 0
         BaseCommand.__init__(self, *args, **kwargs)
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--incremental",
+            default=False,
+            action="store_true",
+            help="Only match the rules that changed since the last run "
+                 "against each document, and every rule against documents "
+                 "that have never been retagged."
+        )
+        parser.add_argument(
+            "--processes",
+            type=int,
+            default=os.cpu_count() or 1,
+            help="How many processes to match documents with.  Defaults to "
+                 "the number of CPUs."
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=500,
+            help="How many documents to read, match, and tag at a time"
+        )
+
     def handle(self, *args, **options):
 
         self.verbosity = options["verbosity"]
 
-        for document in Document.objects.all():
+        # Anything that changes from here on is left for the next run
+        self.generation = Generation.objects.current(
+            Tag.get_generation_name())
+
+        tags = list(Tag.objects.all())
+        self.tags = {tag.pk: tag for tag in tags}
+
+        documents = Document.objects.all()
+        if not options["incremental"]:
+            groups = [(documents, tags)]
+        else:
+            documents = documents.exclude(
+                tag_rules_generation__gte=self.generation)
+            groups = self._get_groups(documents, tags)
+
+        total = documents.count()
+        self.start = time.time()
+        self.done = self.tagged = 0
+        for documents, rules in groups:
+            if not rules:
+                self.done += documents.update(
+                    tag_rules_generation=self.generation)
+                continue
+            self._retag(documents, rules, total, options)
+
+    def _get_groups(self, documents, tags):
+        """
+        The documents, grouped by the generation of the rules they were last
+        matched against, each along with the rules that changed since.
+        """
+
+        generations = documents.order_by().values_list(
+            "tag_rules_generation", flat=True).distinct()
+
+        for generation in generations:
+            if generation is None:
+                yield documents.filter(tag_rules_generation__isnull=True), tags
+            else:
+                yield documents.filter(tag_rules_generation=generation), [
+                    tag for tag in tags if tag.rule_generation > generation]
+
+    def _retag(self, documents, rules, total, options):
+
+        chunks = _get_chunks(documents, options["chunk_size"])
+
+        for matches in self._match(chunks, rules, options["processes"]):
+            self.tagged += self._apply(matches)
+            self.done += len(matches)
+            self._render(
+                "{}/{} documents, {} tags applied, {:.0f} documents/s".format(
+                    self.done,
+                    total,
+                    self.tagged,
+                    self.done / (time.time() - self.start or 1)
+                ),
+                1
+            )
+
+    def _match(self, chunks, tags, processes):
+        """
+        Yields a list of (document pk, [tag pks]) for each chunk, in order.
+        The database is only ever used from this process: the workers get
+        the rules once, when they start, and then nothing but text.
+        """
+
+        if processes < 2:
+            _init_worker(tags)
+            for chunk in chunks:
+                yield _match_chunk(chunk)
+            return
+
+        # The workers are forked off with a copy of our database connection,
+        # which mustn't end up being used by two processes at once.
+        connections.close_all()
+
+        with Pool(processes, _init_worker, (tags,)) as pool:
+            pending = deque()
+            for chunk in chunks:
+                pending.append(pool.apply_async(_match_chunk, (chunk,)))
+                if len(pending) > processes:
+                    yield pending.popleft().get()
+            while pending:
+                yield pending.popleft().get()
+
+    def _apply(self, matches):
+        """
+        Add the tags to the documents they matched that don't have them yet,
+        with one insert into the through table, and then let everyone
+        interested, like the file renaming, know about it once per document.
+        Returns how many tags were applied.
+        """
+
+        pks = [pk for pk, _ in matches]
+
+        through = Document.tags.through
+
+        matches = {pk: set(tags) for pk, tags in matches if tags}
+        for document_pk, tag_pk in through.objects.filter(
+                document_id__in=matches).values_list("document_id", "tag_id"):
+            matches[document_pk].discard(tag_pk)
+        matches = {pk: tags for pk, tags in matches.items() if tags}
+
+        with transaction.atomic():
+            through.objects.bulk_create(
+                through(document_id=document_pk, tag_id=tag_pk)
+                for document_pk, tags in matches.items()
+                for tag_pk in tags
+            )
+
+            # Last of all, and along with the tags, so that --incremental
+            # never takes a document for retagged unless it's been tagged.
+            Document.objects.filter(pk__in=pks).update(
+                tag_rules_generation=self.generation)
+
+        if not matches:
+            return 0
+
+        documents = Document.objects.filter(
+            pk__in=matches).select_related("correspondent")
+        for document in documents:
+            for tag_pk in sorted(matches[document.pk]):
+                self._render('Tagging {} with "{}"'.format(
+                    document, self.tags[tag_pk]), 1)
+            m2m_changed.send(
+                sender=through,
+                instance=document,
+                action="post_add",
+                reverse=False,
+                model=Tag,
+                pk_set=matches[document.pk],
+                using=documents.db
+            )
+
+        return sum(len(tags) for tags in matches.values())
+
+
+def _get_chunks(documents, size):
+    """
+    The (pk, content) of the documents, a chunk at a time, in order of pk.
+    Each chunk is a query of its own, starting after the last one, so it
+    doesn't matter that we're changing the documents as we go.
+    """
+
+    last = 0
+    while True:
+        chunk = list(documents.filter(pk__gt=last).order_by(
+            "pk").values_list("pk", "content")[:size])
+        if not chunk:
+            return
+        yield chunk
+        last = chunk[-1][0]
+
+
+def _init_worker(tags):
+    global _matcher
+    _matcher = Matcher(tags)
 
-            tags = Tag.objects.exclude(
-                pk__in=document.tags.values_list("pk", flat=True))
 
-            for tag in Tag.match_all(document.content, tags):
-                print('Tagging {} with "{}"'.format(document, tag))
-                document.tags.add(tag)
+def _match_chunk(chunk):
+    """
+    The pks of the tags that match each of the (pk, content) in the chunk,
+    the same way Tag.match_all() would find them.
+    """
+    return [
+        (pk, [tag.pk for tag in _matcher.match(content.lower())])
+        for pk, content in chunk
+    ]
@@ -0,0 +1,136 @@
+import random
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from documents.models import Document
+
+from ...mixins import Renderable
+
+
+class Benchmarked(Exception):
+    """
+    Raised to roll back the documents we made up, once we're done with them.
+    """
+
+
+class Command(Renderable, BaseCommand):
+
+    help = """
+        Time how long it takes to store a batch of documents, the way the
+        consumer does once it has their text, and how much bigger they make
+        the database.  The documents are made up, by shuffling the words of
+        the ones you have (or a few thousand made up ones, if you haven't
+        got any), and thrown away at the end, so nothing's changed.  Run it
+        before and after a migration to see what difference it makes.
+    """.replace("    ", "")
+
+    def __init__(self, *args, **kwargs):
+        self.verbosity = 0
+        BaseCommand.__init__(self, *args, **kwargs)
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--count",
+            type=int,
+            default=1000,
+            help="How many documents to store"
+        )
+        parser.add_argument(
+            "--words",
+            type=int,
+            default=2500,
+            help="How many words of text each of them has"
+        )
+
+    def handle(self, *args, **options):
+
+        self.verbosity = options["verbosity"]
+
+        vocabulary = self._get_vocabulary()
+        texts = [
+            " ".join(random.choice(vocabulary)
+                     for _ in range(options["words"]))
+            for _ in range(options["count"])
+        ]
+
+        try:
+            with transaction.atomic():
+
+                before = self._get_size()
+                start = time.time()
+                for i, text in enumerate(texts):
+                    Document.objects.create(
+                        title="Benchmark {}".format(i),
+                        content=text,
+                        file_type="pdf",
+                        checksum=uuid.uuid4().hex
+                    )
+                elapsed = time.time() - start
+                after = self._get_size()
+
+                raise Benchmarked()
+
+        except Benchmarked:
+            pass
+
+        self._render("{} documents, {} characters of text".format(
+            len(texts), sum(len(text) for text in texts)), 1)
+        self._render("Storing them: {:.2f}s ({:.1f}ms each)".format(
+            elapsed, 1000 * elapsed / (len(texts) or 1)), 1)
+        self._render("Database size: {} -> {} ({:+.1f} KiB each)".format(
+            self._format(before), self._format(after),
+            (after - before) / 1024 / (len(texts) or 1)), 1)
+
+    @staticmethod
+    def _get_vocabulary():
+        """
+        The words of the documents we have, or some made up ones.
+        """
+
+        words = set()
+        for content in Document.objects.values_list(
+                "content", flat=True)[:1000]:
+            words.update(content.split())
+
+        if words:
+            return sorted(words)
+
+        letters = "abcdefghijklmnopqrstuvwxyz"
+        return [
+            "".join(random.choice(letters)
+                    for _ in range(random.randint(2, 12)))
+            for _ in range(5000)
+        ]
+
+    @staticmethod
+    def _get_size():
+        """
+        The size of the database, in bytes, as far as this connection can see
+        it: the whole file on SQLite, and everything to do with documents on
+        PostgreSQL.
+        """
+
+        with connection.cursor() as cursor:
+
+            if connection.vendor == "sqlite":
+                # Not counting pages that are free for reuse
+                cursor.execute("PRAGMA page_count")
+                pages = cursor.fetchone()[0]
+                cursor.execute("PRAGMA freelist_count")
+                pages -= cursor.fetchone()[0]
+                cursor.execute("PRAGMA page_size")
+                return pages * cursor.fetchone()[0]
+
+            if connection.vendor == "postgresql":
+                cursor.execute(
+                    "SELECT pg_total_relation_size('documents_document')")
+                return cursor.fetchone()[0]
+
+        return 0
+
+    @staticmethod
+    def _format(size):
+        return "{:.1f} MiB".format(size / 1024 / 1024)
@@ -0,0 +1,93 @@
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from documents.models import Document
+from documents.parsers import ParseError, optimise_png
+from paperless.db import GnuPG
+
+from ...mixins import Renderable
+
+
+class Command(Renderable, BaseCommand):
+
+    help = """
+        Squeeze the PNG thumbnails of your documents down as far as optipng
+        can take them.  This is slow, which is why the consumer doesn't do
+        it, so you may want to run it every night or so with --days.
+    """.replace("    ", "")
+
+    def __init__(self, *args, **kwargs):
+        self.verbosity = 0
+        BaseCommand.__init__(self, *args, **kwargs)
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            help="Only optimise the thumbnails of documents added in the "
+                 "last this many days"
+        )
+
+    def handle(self, *args, **options):
+
+        self.verbosity = options["verbosity"]
+
+        documents = Document.objects.filter(
+            thumbnail_type=Document.THUMBNAIL_TYPE_PNG)
+        if options["days"] is not None:
+            documents = documents.filter(
+                added__gte=timezone.now() - timedelta(days=options["days"]))
+
+        saved = 0
+        tempdir = tempfile.mkdtemp(
+            prefix="paperless-thumbnails-", dir=settings.SCRATCH_DIR)
+        try:
+            for document in documents.only(
+                    "pk", "storage_type", "thumbnail_type"):
+                try:
+                    saved += self._optimise(document, tempdir)
+                except (OSError, ParseError) as e:
+                    self._render(
+                        "Couldn't optimise the thumbnail of {}: {}".format(
+                            document.pk, e), 0)
+        finally:
+            shutil.rmtree(tempdir)
+
+        self._render("Saved {} bytes in total".format(saved), 1)
+
+    def _optimise(self, document, tempdir):
+        """
+        Optimise a copy of the thumbnail, and only if that turns out to be
+        smaller, replace the original with it.  Returns the bytes saved.
+        """
+
+        encrypted = document.storage_type == Document.STORAGE_TYPE_GPG
+        path = os.path.join(tempdir, "thumbnail.png")
+
+        with document.thumbnail_file as f:
+            original = GnuPG.decrypted(f) if encrypted else f.read()
+        with open(path, "wb") as f:
+            f.write(original)
+
+        optimise_png(path)
+
+        saved = len(original) - os.path.getsize(path)
+        if saved <= 0:
+            return 0
+
+        target = document.thumbnail_path + ".tmp"
+        with open(path, "rb") as unencrypted, open(target, "wb") as f:
+            f.write(GnuPG.encrypted(unencrypted) if encrypted
+                    else unencrypted.read())
+        os.replace(target, document.thumbnail_path)
+
+        self._render("Optimised the thumbnail of {}, saving {} bytes".format(
+            document.pk, saved), 2)
+
+        return saved
@@ -1,7 +1,11 @@
+import os
+
 from django.conf import settings
 
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.db.models import F
 from django.db.models.aggregates import Max
+from django.utils import timezone
 
 
 class GroupConcat(models.Aggregate):
@@ -68,3 +72,192 @@ class LogManager(models.Manager):
 
     def get_queryset(self):
         return LogQuerySet(self.model, using=self._db)
+
+
+class DocumentQuerySet(models.query.QuerySet):
+
+    def with_content(self):
+        """
+        Load the content of the documents along with everything else.
+        """
+        return self.defer(None)
+
+    def only(self, *fields):
+        """
+        Load the given fields and nothing else, content included if it's one
+        of them.  As it's deferred to begin with, only() would otherwise
+        leave it out no matter what, and so would loading it on first access,
+        which goes through here.
+        """
+        return super(DocumentQuerySet, self.defer(None)).only(*fields)
+
+
+class DocumentManager(models.Manager):
+    """
+    Leaves out the content of documents unless asked for it, as it's by far
+    the biggest thing about them, and most of the time, nobody's looking at
+    it.  Use with_content() (or only()) to have it loaded along with the
+    rest, as otherwise, it's loaded on first access, with a query of its own
+    for every document.
+    """
+
+    def get_queryset(self):
+        return DocumentQuerySet(
+            self.model, using=self._db).defer("content")
+
+    def with_content(self):
+        return self.get_queryset().with_content()
+
+
+class ConsumptionJobManager(models.Manager):
+
+    def enqueue(self, path, mtime=None, priority=None):
+        """
+        Queue a file for consumption, unless it's already queued or being
+        consumed, or we already failed to consume it and it hasn't changed
+        since.  Returns the job responsible for the file, or None.
+        """
+
+        if not os.path.isfile(path):
+            return None
+
+        if mtime is None:
+            mtime = os.path.getmtime(path)
+
+        if priority is None:
+            priority = self.model.PRIORITY_NORMAL
+
+        for job in self.filter(path=path).exclude(state=self.model.STATE_DONE):
+
+            if job.state == self.model.STATE_FAILED:
+                if job.mtime == mtime:
+                    return None
+                continue
+
+            if priority > job.priority:
+                self.filter(pk=job.pk).update(priority=priority)
+                job.priority = priority
+
+            return job
+
+        try:
+            with transaction.atomic():
+                return self.create(path=path, mtime=mtime, priority=priority)
+        except IntegrityError:
+            # Somebody else queued it in the meantime, and the unique index on
+            # the paths of active jobs (see migration 0024) wouldn't have it
+            # queued twice.
+            return self.filter(path=path, state__in=(
+                self.model.STATE_QUEUED, self.model.STATE_RUNNING)).first()
+
+    def claim(self, worker, exclude=()):
+        """
+        Atomically take the next queued job off the queue and mark it as
+        running.  The conditional update makes sure that no two consumers can
+        ever claim the same job, even across hosts.
+        """
+
+        while True:
+
+            job = self.filter(
+                state=self.model.STATE_QUEUED
+            ).exclude(
+                pk__in=exclude
+            ).order_by(
+                "-priority", "created", "pk"
+            ).first()
+
+            if job is None:
+                return None
+
+            claimed = self.filter(
+                pk=job.pk,
+                state=self.model.STATE_QUEUED
+            ).update(
+                state=self.model.STATE_RUNNING,
+                attempts=F("attempts") + 1,
+                worker=worker,
+                modified=timezone.now()
+            )
+
+            if claimed:
+                job.refresh_from_db()
+                return job
+
+    def requeue_abandoned(self, host):
+        """
+        Jobs marked as running by a consumer on this host that isn't running
+        anymore were abandoned when it stopped, so we put them back on the
+        queue, or give up on them if they've taken too many attempts already.
+        """
+
+        abandoned = []
+        for job in self.filter(state=self.model.STATE_RUNNING,
+                               worker__startswith="{}:".format(host)):
+            pid = int(job.worker.rsplit(":", 1)[1])
+            if pid != os.getpid() and _is_process_running(pid):
+                continue
+            job.requeue(message="Abandoned by {}".format(job.worker))
+            abandoned.append(job)
+
+        return abandoned
+
+    def queued(self):
+        return self.filter(state=self.model.STATE_QUEUED)
+
+
+class GenerationManager(models.Manager):
+
+    def current(self, name):
+        """
+        The current value of the named generation, which is 0 until it's
+        bumped for the first time.
+        """
+        values = self.filter(name=name).values_list("value", flat=True)
+        return values.first() or 0
+
+    def bump(self, name):
+        """
+        Move the named generation on by one, in a single query so that no
+        two bumps can ever cancel each other out, and return its new value
+        (or a later one, if somebody else bumped it in the meantime).
+        """
+
+        if self.filter(name=name).update(value=F("value") + 1):
+            return self.current(name)
+
+        try:
+            with transaction.atomic():
+                self.create(name=name, value=1)
+        except IntegrityError:
+            # Somebody else created it in the meantime
+            self.filter(name=name).update(value=F("value") + 1)
+
+        return self.current(name)
+
+    def advance(self, name, value):
+        """
+        Move the named generation on to value, unless it's there already.
+        """
+
+        if self.filter(name=name, value__lt=value).update(value=value):
+            return
+        if self.filter(name=name).exists():
+            return
+
+        try:
+            with transaction.atomic():
+                self.create(name=name, value=value)
+        except IntegrityError:
+            # Somebody else created it in the meantime
+            self.filter(name=name, value__lt=value).update(value=value)
+
+
+def _is_process_running(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
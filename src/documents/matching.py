@@ -0,0 +1,402 @@
+import re
+from collections import defaultdict
+
+from fuzzywuzzy import fuzz
+
+# The words of a rule are bits of regular expression rather than plain text,
+# but most of them are just that: a plain word, or a few of them in quotes.
+WORD = re.compile(r"^[0-9A-Za-z_]+$")
+PHRASE = re.compile(r"^[0-9A-Za-z_]+((\\s\+| )[0-9A-Za-z_]+)+$")
+PHRASE_SEPARATOR = re.compile(r"(\\s\+| )")
+
+# Every run of word characters in a text
+TOKENS = re.compile(r"\w+")
+
+# What fuzzy rules take out of both themselves and the text
+NON_WORD = re.compile(r"[^\w\s]")
+
+# The partial ratio a fuzzy rule needs to match, as in MatchingModel.matches()
+FUZZY_SCORE = 90
+
+# Roughly how many characters of term times text partial_ratio() gets through
+# in the time it takes us to look at one q-gram of the term in the text
+PARTIAL_RATIO_CELLS_PER_HIT = 2000
+
+# The only characters a case insensitive regular expression considers the
+# same as some ASCII letter, but which lower() doesn't turn into it
+ASCII_FOLD = str.maketrans({
+    "İ": "i",  # LATIN CAPITAL LETTER I WITH DOT ABOVE
+    "ı": "i",  # LATIN SMALL LETTER DOTLESS I
+    "ſ": "s",  # LATIN SMALL LETTER LONG S
+    "K": "k",  # KELVIN SIGN
+})
+
+# The Matcher for every kind of rule we've matched against in this process,
+# along with the generation of the rules it was compiled from.
+_matchers = {}
+
+
+def get_matcher(model, generation):
+    """
+    A Matcher for all the rules of the given MatchingModel.  The rules are
+    only read and compiled again if the generation has moved on since the
+    last time, which is to say, when somebody has changed them.
+    """
+
+    cached = _matchers.get(model)
+    if cached is None or cached[0] != generation:
+        cached = _matchers[model] = (generation, Matcher(model.objects.all()))
+
+    return cached[1]
+
+
+def forget_matcher(model):
+    """
+    Throw away the Matcher of the given MatchingModel, if we have one.
+    """
+    _matchers.pop(model, None)
+
+
+def get_required_words(rule):
+    """
+    What a text has to contain for the rule to stand a chance of matching
+    it, as a list of clauses, each a list of words of which at least one
+    has to be in the text somewhere (if not necessarily as a whole word).
+    An empty list means there's no telling, as for regular expressions and
+    fuzzy rules, which have to be tried on every text.
+    """
+
+    if rule.matching_algorithm == rule.MATCH_LITERAL:
+        terms = [rule.match]
+    elif rule.matching_algorithm in (rule.MATCH_ALL, rule.MATCH_ANY):
+        terms = rule._split_match()
+    else:
+        return []
+
+    words = [_get_words(term) for term in terms]
+
+    if rule.matching_algorithm == rule.MATCH_ANY:
+        if not words or not all(words):
+            return []
+        # One word of each term will do, and the longest is the rarest
+        return [[max(term, key=len) for term in words]]
+
+    return [[word] for term in words for word in term]
+
+
+def _get_words(term):
+    """
+    The words of a term that has to appear as a whole, or an empty list if
+    it's anything more complicated than plain words.
+    """
+
+    if WORD.match(term):
+        return [term]
+
+    if PHRASE.match(term):
+        return PHRASE_SEPARATOR.split(term)[::2]
+
+    return []
+
+
+class Matcher:
+    """
+    Matches a text against any number of tags or correspondents (or any
+    other MatchingModel) in one go, with the same results as asking each of
+    them in turn.
+
+    The words of "any", "all", and "literal" rules have to appear in the
+    text as whole words.  So rather than search the text for every one of
+    them, we go through it once, make a note of every word in it, and look
+    the words of the rules up in that.  Anything more complicated than a
+    plain word is compiled once, and kept alongside, as are the regular
+    expression rules.  Fuzzy rules share a normalised copy of the text, and
+    an index of the character n-grams in it, so that most of them never
+    have to look at the whole text (see FuzzyText).
+    """
+
+    def __init__(self, rules):
+
+        self.rules = list(rules)
+        self._patterns = {}
+        self._checks = [self._compile(rule) for rule in self.rules]
+
+    def match(self, text):
+        """
+        Returns every rule that matches the text, in the order they were
+        given to us.
+        """
+
+        words = Words(text)
+
+        return [
+            rule for rule, check in zip(self.rules, self._checks)
+            if check(text, words)
+        ]
+
+    def _compile(self, rule):
+        """
+        Work out how to tell whether the rule matches, given the text and the
+        words in it.
+        """
+
+        # Check that match is not empty
+        if rule.match.strip() == "":
+            return lambda text, words: False
+
+        flags = re.IGNORECASE if rule.is_insensitive else 0
+
+        if rule.matching_algorithm == rule.MATCH_REGEX:
+            try:
+                regex = re.compile(rule.match, flags)
+            except re.error:
+                # The rule can raise the error itself when it's used
+                return lambda text, words: rule.matches(text)
+            return lambda text, words: bool(regex.search(text))
+
+        if rule.matching_algorithm == rule.MATCH_FUZZY:
+            insensitive = rule.is_insensitive
+            term = normalise(rule.match, insensitive)
+            return lambda text, words: words.get_fuzzy(insensitive).contains(
+                term)
+
+        if rule.matching_algorithm == rule.MATCH_LITERAL:
+            terms = [rule.match]
+            combine = all
+        elif rule.matching_algorithm == rule.MATCH_ALL:
+            terms = rule._split_match()
+            combine = all
+        elif rule.matching_algorithm == rule.MATCH_ANY:
+            terms = rule._split_match()
+            combine = any
+        else:
+            return lambda text, words: rule.matches(text)
+
+        try:
+            terms = [self._compile_term(term, flags) for term in terms]
+        except re.error:
+            return lambda text, words: rule.matches(text)
+
+        return lambda text, words: combine(
+            term(text, words) for term in terms)
+
+    def _compile_term(self, term, flags):
+        r"""
+        Returns a function that tells whether the term appears in the text as
+        a whole word, which is to say, whether r"\bterm\b" matches it.
+        """
+
+        insensitive = bool(flags & re.IGNORECASE)
+
+        if WORD.match(term):
+            return lambda text, words: words.contains(term, insensitive)
+
+        if PHRASE.match(term):
+            parts = PHRASE_SEPARATOR.split(term)
+            return lambda text, words: words.contains_phrase(
+                parts[::2], parts[1::2], insensitive)
+
+        pattern = self._get_pattern(r"\b{}\b".format(term), flags)
+
+        return lambda text, words: bool(pattern.search(text))
+
+    def _get_pattern(self, pattern, flags):
+        key = (pattern, flags)
+        if key not in self._patterns:
+            self._patterns[key] = re.compile(pattern, flags)
+        return self._patterns[key]
+
+
+class Words:
+    """
+    The words in a text, in order, along with where to find each of them.
+    We only go through the text the first time we're asked about it.
+    """
+
+    def __init__(self, text):
+        self.text = text
+        self._spans = None
+        self._words = {}
+        self._index = {}
+        self._fuzzy = {}
+
+    def contains(self, word, insensitive=False):
+        r"""
+        Whether the text has the (ASCII) word in it, the way r"\bword\b"
+        would find it.
+        """
+        if insensitive:
+            word = word.lower()
+        return word in self._get_index(insensitive)
+
+    def contains_phrase(self, words, separators, insensitive=False):
+        r"""
+        Whether the text has the (ASCII) words in it, one after the other,
+        with each pair separated by either a single space (" ") or any
+        amount of whitespace (r"\s+"), the way r"\bword1 word2\b" would
+        find them.
+        """
+
+        if insensitive:
+            words = [word.lower() for word in words]
+
+        index = self._get_index(insensitive)
+        text = self.text
+        spans = self._spans
+        tokens = self._words[insensitive]
+        for i in index.get(words[0], ()):
+            for n, (word, separator) in enumerate(zip(words[1:], separators)):
+                j = i + n + 1
+                if j == len(spans) or tokens[j] != word:
+                    break
+                gap = text[spans[j - 1][1]:spans[j][0]]
+                if separator == " " and gap != " ":
+                    break
+                if separator != " " and not gap.isspace():
+                    break
+            else:
+                return True
+
+        return False
+
+    def get_fuzzy(self, insensitive=False):
+        """
+        The text the way fuzzy rules see it.
+        """
+        if insensitive not in self._fuzzy:
+            self._fuzzy[insensitive] = FuzzyText(self.text, insensitive)
+        return self._fuzzy[insensitive]
+
+    def _get_index(self, insensitive):
+
+        if insensitive in self._index:
+            return self._index[insensitive]
+
+        if self._spans is None:
+            self._spans = [m.span() for m in TOKENS.finditer(self.text)]
+
+        words = [self.text[start:end] for start, end in self._spans]
+        if insensitive:
+            words = [w.translate(ASCII_FOLD).lower() for w in words]
+
+        index = defaultdict(list)
+        for i, word in enumerate(words):
+            index[word].append(i)
+
+        self._words[insensitive] = words
+        self._index[insensitive] = index
+
+        return index
+
+
+class FuzzyText:
+    """
+    A text normalised the way fuzzy rules expect it, along with an index of
+    where each of its character n-grams (q-grams) is, which we fill in as
+    the rules ask for them.
+
+    fuzz.partial_ratio() lines the term up against the text in a few places
+    and scores each window of the text as long as the term.  It's slow on
+    long texts, but a window can only score FUZZY_SCORE or more if it has a
+    good number of the q-grams of the term in it, so we look those up in the
+    index, score only the windows that have enough of them, and ask
+    partial_ratio() itself only if one of them is good enough.  That way we
+    come to exactly the same decision, without it for most terms.  Terms
+    made of q-grams that are all over the text go straight to
+    partial_ratio(), as that's quicker for them.
+    """
+
+    def __init__(self, text, insensitive=False):
+        self.text = normalise(text, insensitive)
+        self._index = {}
+
+    def contains(self, term):
+        """
+        Whether fuzz.partial_ratio(term, text) >= FUZZY_SCORE, given a term
+        normalised the same way as the text.
+        """
+
+        text = self.text
+        if not term or not text:
+            return False
+
+        n = len(term)
+        q, threshold = get_qgram_threshold(n)
+        if q is None or n > len(text):
+            return fuzz.partial_ratio(term, text) >= FUZZY_SCORE
+
+        # Past a point, looking at the windows one by one takes longer than
+        # letting partial_ratio() go through the whole text.
+        budget = n * len(text) // PARTIAL_RATIO_CELLS_PER_HIT
+        hits = []
+        for gram in {term[i:i + q] for i in range(n - q + 1)}:
+            hits.extend(self._find(gram))
+            if len(hits) > budget:
+                return fuzz.partial_ratio(term, text) >= FUZZY_SCORE
+        hits.sort()
+
+        # Every window of the text starting at some position in (previous,
+        # hit], with hit the first position of one of our q-grams in it, and
+        # at least threshold of them in total.
+        span = n - q
+        scored = set()
+        previous = -1
+        for i in range(len(hits) - threshold + 1):
+            first = hits[i]
+            for start in range(
+                    max(previous + 1, hits[i + threshold - 1] - span),
+                    first + 1):
+                window = text[start:start + n]
+                if window in scored:
+                    continue
+                if fuzz.ratio(term, window) >= FUZZY_SCORE:
+                    return fuzz.partial_ratio(term, text) >= FUZZY_SCORE
+                scored.add(window)
+            previous = first
+
+        return False
+
+    def _find(self, gram):
+        """
+        Every position of the q-gram in the text.
+        """
+
+        if gram not in self._index:
+            positions = []
+            position = self.text.find(gram)
+            while position != -1:
+                positions.append(position)
+                position = self.text.find(gram, position + 1)
+            self._index[gram] = positions
+
+        return self._index[gram]
+
+
+def normalise(text, insensitive=False):
+    """
+    Strip the text of everything but letters, digits, and whitespace, like
+    fuzzy rules do.
+    """
+    text = NON_WORD.sub("", text)
+    return text.lower() if insensitive else text
+
+
+def get_qgram_threshold(n):
+    """
+    The size q of the q-grams to look for, and how many of the q-grams of a
+    term of length n a window of the text has to have in it, at the very
+    least, for the term to score FUZZY_SCORE against it.  (None, None) if
+    there's no telling for a term that short.
+
+    To score 90, term and window can't be more than about 2 * 10.5% of n
+    edits apart (we allow 11%, to stay clear of rounding), and every edit
+    breaks at most q of the n - q + 1 q-grams of the term.
+    """
+
+    edits = (22 * n) // 100
+    for q in (3, 2):
+        threshold = n - q + 1 - q * edits
+        if threshold > 0:
+            return q, threshold
+
+    return None, None
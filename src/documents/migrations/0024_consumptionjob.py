@@ -0,0 +1,53 @@
+# Generated by Django 2.0.10 on 2026-10-18 05:40
+
+from django.db import migrations, models
+
+
+def create_unique_index(apps, schema_editor):
+    """
+    No file may have more than one job queued or running at a time, so that
+    two consumers queueing it at once can't both succeed.  Django can't
+    express a partial unique index yet, but SQLite and PostgreSQL can.
+    """
+
+    if schema_editor.connection.vendor in ("sqlite", "postgresql"):
+        schema_editor.execute(
+            "CREATE UNIQUE INDEX documents_consumptionjob_active_path "
+            "ON documents_consumptionjob (path) "
+            "WHERE state IN ('queued', 'running')"
+        )
+
+
+def drop_unique_index(apps, schema_editor):
+    if schema_editor.connection.vendor in ("sqlite", "postgresql"):
+        schema_editor.execute(
+            "DROP INDEX IF EXISTS documents_consumptionjob_active_path")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0023_document_current_filename'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConsumptionJob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('path', models.CharField(db_index=True, help_text='The file to consume', max_length=1024)),
+                ('mtime', models.FloatField(help_text='The modification time of the file when it was queued')),
+                ('state', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], db_index=True, default='queued', max_length=7)),
+                ('priority', models.PositiveIntegerField(choices=[(0, 'Low'), (10, 'Normal'), (20, 'High')], default=10)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('worker', models.CharField(blank=True, help_text='The consumer (host:pid) that claimed this job', max_length=128)),
+                ('message', models.TextField(blank=True)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('modified', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ('-priority', 'created'),
+            },
+        ),
+        migrations.RunPython(create_unique_index, drop_unique_index),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 2.0.10 on 2026-10-18 05:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0024_consumptionjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='document',
+            name='thumbnail_type',
+            field=models.CharField(choices=[('png', 'PNG'), ('jpg', 'JPEG'), ('webp', 'WebP')], default='png', editable=False, max_length=4),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 2.0.10 on 2026-10-18 06:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0025_document_thumbnail_type'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Generation',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=128, unique=True)),
+                ('value', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+    ]
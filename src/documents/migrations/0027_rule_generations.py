@@ -0,0 +1,23 @@
+# Generated by Django 2.0.10 on 2026-10-18 06:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0026_generation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='document',
+            name='tag_rules_generation',
+            field=models.PositiveIntegerField(db_index=True, default=None, editable=False, help_text='The generation of the tagging rules the retagger last matched this document against', null=True),
+        ),
+        migrations.AddField(
+            model_name='tag',
+            name='rule_generation',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='The generation of the rules this one was last saved in'),
+        ),
+    ]
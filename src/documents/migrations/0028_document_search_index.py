@@ -0,0 +1,61 @@
+from django.db import migrations
+from django.db.utils import OperationalError
+
+
+def create_index(apps, schema_editor):
+    """
+    An FTS5 table on SQLite, or a tsvector column with a GIN index on
+    PostgreSQL, filled in with the title and content of every document we
+    have so far.  Other databases go without, as do SQLite builds without
+    FTS5, and search the way we always have.
+    """
+
+    vendor = schema_editor.connection.vendor
+
+    if vendor == "sqlite":
+        try:
+            schema_editor.execute(
+                "CREATE VIRTUAL TABLE documents_document_fts "
+                "USING fts5(title, content)"
+            )
+        except OperationalError:
+            return  # No FTS5
+        schema_editor.execute(
+            "INSERT INTO documents_document_fts (rowid, title, content) "
+            "SELECT id, title, content FROM documents_document"
+        )
+
+    elif vendor == "postgresql":
+        schema_editor.execute(
+            "ALTER TABLE documents_document ADD COLUMN search_vector tsvector")
+        schema_editor.execute(
+            "UPDATE documents_document SET search_vector = to_tsvector("
+            "'simple', coalesce(title, '') || ' ' || coalesce(content, ''))"
+        )
+        schema_editor.execute(
+            "CREATE INDEX documents_document_search_vector "
+            "ON documents_document USING GIN (search_vector)"
+        )
+
+
+def drop_index(apps, schema_editor):
+
+    vendor = schema_editor.connection.vendor
+
+    if vendor == "sqlite":
+        schema_editor.execute("DROP TABLE IF EXISTS documents_document_fts")
+
+    elif vendor == "postgresql":
+        schema_editor.execute(
+            "ALTER TABLE documents_document DROP COLUMN search_vector")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0027_rule_generations'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
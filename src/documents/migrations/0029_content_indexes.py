@@ -0,0 +1,50 @@
+# Generated by Django 2.0.10 on 2026-10-18 06:53
+
+from django.db import DatabaseError, migrations, models, transaction
+
+
+def create_trigram_index(apps, schema_editor):
+    """
+    On PostgreSQL, a trigram index for the icontains lookups (which compare
+    UPPER(content)) that the full-text index can't answer, like searching
+    for part of a word.  It needs the pg_trgm extension, which only a
+    superuser can create, so if we can't, we go without.  Searching works
+    just the same, if more slowly.
+    """
+
+    connection = schema_editor.connection
+    if connection.vendor != "postgresql":
+        return
+
+    try:
+        with transaction.atomic(using=connection.alias):
+            schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    except DatabaseError:
+        return
+
+    schema_editor.execute(
+        "CREATE INDEX documents_document_content_trgm ON documents_document "
+        "USING GIN (UPPER(content) gin_trgm_ops)"
+    )
+
+
+def drop_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(
+            "DROP INDEX IF EXISTS documents_document_content_trgm")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0028_document_search_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='document',
+            name='content',
+            field=models.TextField(blank=True, help_text='The raw, text-only data of the document.  This field is primarily used for searching.'),
+        ),
+        migrations.RunPython(create_trigram_index, drop_trigram_index),
+    ]
@@ -0,0 +1,130 @@
+# Generated by Django 2.0.10 on 2026-10-18 07:01
+
+from django.db import migrations
+from django.utils.termcolors import colorize as colourise
+
+import documents.fields
+
+BATCH_SIZE = 500
+
+
+def make_index_contentless(apps, schema_editor):
+    """
+    The full-text index on SQLite kept a copy of the title and content of
+    every document, which we'd rather not keep uncompressed.
+    """
+    _recreate_index(schema_editor, "content=''")
+
+
+def make_index_keep_content(apps, schema_editor):
+    _recreate_index(schema_editor)
+
+
+def _recreate_index(schema_editor, options=""):
+
+    connection = schema_editor.connection
+    if connection.vendor != "sqlite":
+        return
+    if "documents_document_fts" not in connection.introspection.table_names():
+        return  # No FTS5
+
+    schema_editor.execute("DROP TABLE documents_document_fts")
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE documents_document_fts "
+        "USING fts5(title, content{})".format(
+            ", " + options if options else "")
+    )
+    schema_editor.execute(
+        "INSERT INTO documents_document_fts (rowid, title, content) "
+        "SELECT id, title, {}(content) FROM documents_document".format(
+            documents.fields.DECOMPRESS)
+    )
+
+
+def compress_content(apps, schema_editor):
+    _convert(
+        schema_editor,
+        "text",
+        documents.fields.compress,
+        "compress",
+        "  Once it's done, the space it frees up is reused for new\n"
+        "  documents, but to shrink the database file itself, run VACUUM\n"
+        "  on it."
+    )
+
+
+def decompress_content(apps, schema_editor):
+    _convert(
+        schema_editor, "blob", documents.fields.decompress, "decompress")
+
+
+def _convert(schema_editor, from_type, convert, verb, note=""):
+    """
+    Convert the content of every document that's stored as from_type, a
+    batch at a time, so as not to have all of them in memory at once.
+    """
+
+    connection = schema_editor.connection
+    if connection.vendor != "sqlite":
+        return
+
+    with connection.cursor() as cursor:
+
+        cursor.execute(
+            "SELECT COUNT(*) FROM documents_document "
+            "WHERE typeof(content) = %s", (from_type,)
+        )
+        total = cursor.fetchone()[0]
+        if not total:
+            return
+
+        print(colourise(
+            "\n\n"
+            "  This is a one-time only migration to {} the text of all of\n"
+            "  your documents.  If you have a lot of documents, this may take\n"
+            "  a little while.\n"
+            "{}\n".format(verb, note), opts=("bold",)
+        ))
+
+        done = 0
+        last = 0
+        while True:
+
+            cursor.execute(
+                "SELECT id, content FROM documents_document "
+                "WHERE id > %s AND typeof(content) = %s "
+                "ORDER BY id LIMIT %s", (last, from_type, BATCH_SIZE)
+            )
+            batch = cursor.fetchall()
+            if not batch:
+                break
+
+            cursor.executemany(
+                "UPDATE documents_document SET content = %s WHERE id = %s",
+                [(convert(content), pk) for pk, content in batch]
+            )
+
+            done += len(batch)
+            last = batch[-1][0]
+            print("    {} {} {}".format(
+                colourise("*", fg="green"),
+                colourise(verb.capitalize() + "ed", fg="white"),
+                colourise("{}/{} documents".format(done, total), fg="cyan")
+            ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0029_content_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(make_index_contentless, make_index_keep_content),
+        migrations.AlterField(
+            model_name='document',
+            name='content',
+            field=documents.fields.CompressedTextField(blank=True, help_text='The raw, text-only data of the document.  This field is primarily used for searching.'),
+        ),
+        migrations.RunPython(compress_content, decompress_content),
+    ]
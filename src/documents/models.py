@@ -9,14 +9,21 @@ from collections import OrderedDict
 import dateutil.parser
 from django.dispatch import receiver
 from django.conf import settings
-from django.db import models
+from django.db import models, router, transaction
 from django.template.defaultfilters import slugify
 from django.utils import timezone
 from django.utils.text import slugify
 from fuzzywuzzy import fuzz
 from collections import defaultdict
 
-from .managers import LogManager
+from .fields import CompressedTextField
+from .managers import (
+    ConsumptionJobManager,
+    DocumentManager,
+    GenerationManager,
+    LogManager
+)
+from .matching import Matcher, get_matcher
 
 try:
     from django.core.urlresolvers import reverse
@@ -79,12 +86,21 @@ class MatchingModel(models.Model):
     def match_all(cls, text, tags=None):
 
         if tags is None:
-            tags = cls.objects.all()
+            matcher = get_matcher(cls, Generation.objects.current(
+                cls.get_generation_name()))
+        else:
+            matcher = Matcher(tags)
+
+        for tag in matcher.match(text.lower()):
+            yield tag
 
-        text = text.lower()
-        for tag in tags:
-            if tag.matches(text):
-                yield tag
+    @classmethod
+    def get_generation_name(cls):
+        """
+        The name of the Generation that goes up whenever any of the rules of
+        this kind change.
+        """
+        return cls._meta.label_lower
 
     def matches(self, text):
 
@@ -185,6 +201,33 @@ class Tag(MatchingModel):
 
     colour = models.PositiveIntegerField(choices=COLOURS, default=1)
 
+    # Only tags have one, as the retagger is the only one to ask
+    rule_generation = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        help_text="The generation of the rules this one was last saved in"
+    )
+
+
+class Classification:
+    """
+    The tags and correspondents whose rules match the text of a document.
+    The consumer works this out once per document, and hands it to the
+    document_consumption_finished handlers along with the document, so
+    none of them has to match it again.
+    """
+
+    def __init__(self, tags, correspondents):
+        self.tags = tags
+        self.correspondents = correspondents
+
+    @classmethod
+    def from_text(cls, text):
+        return cls(
+            list(Tag.match_all(text)),
+            list(Correspondent.match_all(text))
+        )
+
 
 class Document(models.Model):
 
@@ -199,6 +242,15 @@ class Document(models.Model):
     TYPES = (TYPE_PDF, TYPE_PNG, TYPE_JPG, TYPE_GIF, TYPE_TIF,
              TYPE_TXT, TYPE_CSV, TYPE_MD)
 
+    THUMBNAIL_TYPE_PNG = "png"
+    THUMBNAIL_TYPE_JPG = "jpg"
+    THUMBNAIL_TYPE_WEBP = "webp"
+    THUMBNAIL_TYPES = (
+        (THUMBNAIL_TYPE_PNG, "PNG"),
+        (THUMBNAIL_TYPE_JPG, "JPEG"),
+        (THUMBNAIL_TYPE_WEBP, "WebP")
+    )
+
     STORAGE_TYPE_UNENCRYPTED = "unencrypted"
     STORAGE_TYPE_GPG = "gpg"
     STORAGE_TYPES = (
@@ -216,8 +268,7 @@ class Document(models.Model):
 
     title = models.CharField(max_length=128, blank=True, db_index=True)
 
-    content = models.TextField(
-        db_index=True,
+    content = CompressedTextField(
         blank=True,
         help_text="The raw, text-only data of the document.  This field is "
                   "primarily used for searching."
@@ -264,6 +315,24 @@ class Document(models.Model):
         help_text="Current filename in storage"
     )
 
+    thumbnail_type = models.CharField(
+        max_length=4,
+        choices=THUMBNAIL_TYPES,
+        default=THUMBNAIL_TYPE_PNG,
+        editable=False
+    )
+
+    tag_rules_generation = models.PositiveIntegerField(
+        default=None,
+        null=True,
+        editable=False,
+        db_index=True,
+        help_text="The generation of the tagging rules the retagger last "
+                  "matched this document against"
+    )
+
+    objects = DocumentManager()
+
     class Meta:
         ordering = ("correspondent", "title")
 
@@ -276,6 +345,26 @@ class Document(models.Model):
             return "{}: {}".format(created, self.correspondent or self.title)
         return str(created)
 
+    def save(self, *args, **kwargs):
+        # Saving a document takes it out of the full-text index before the
+        # row changes, and puts it back afterwards (see the search index
+        # handlers), but Django only wraps the change itself in a
+        # transaction.  Without one around all three, a save that fails
+        # would leave the document out of searches.
+        using = kwargs.get("using") or router.db_for_write(
+            self.__class__, instance=self)
+        with transaction.atomic(using=using):
+            super().save(*args, **kwargs)
+
+    def refresh_from_db(self, using=None, fields=None):
+        # Our manager leaves the content out, so if we've got it, we have to
+        # ask for it to have it refreshed along with everything else.
+        deferred = self.get_deferred_fields()
+        if fields is None and "content" not in deferred:
+            fields = [f.attname for f in self._meta.concrete_fields
+                      if f.attname not in deferred]
+        super().refresh_from_db(using=using, fields=fields)
+
     def find_renamed_document(self, subdirectory=""):
         suffix = "%07i.%s" % (self.pk, self.file_type)
 
@@ -417,7 +506,7 @@ class Document(models.Model):
     @property
     def thumbnail_path(self):
 
-        file_name = "{:07}.png".format(self.pk)
+        file_name = "{:07}.{}".format(self.pk, self.thumbnail_type)
         if self.storage_type == self.STORAGE_TYPE_GPG:
             file_name += ".gpg"
 
@@ -594,6 +683,114 @@ class Log(models.Model):
         models.Model.save(self, *args, **kwargs)
 
 
+class ConsumptionJob(models.Model):
+    """
+    A file waiting to be, being, or having been consumed.  Everything that
+    drops a file into the consumption directory queues a job for it, and the
+    consumer works through the queue by priority.
+    """
+
+    STATE_QUEUED = "queued"
+    STATE_RUNNING = "running"
+    STATE_DONE = "done"
+    STATE_FAILED = "failed"
+    STATES = (
+        (STATE_QUEUED, "Queued"),
+        (STATE_RUNNING, "Running"),
+        (STATE_DONE, "Done"),
+        (STATE_FAILED, "Failed"),
+    )
+
+    PRIORITY_LOW = 0
+    PRIORITY_NORMAL = 10
+    PRIORITY_HIGH = 20
+    PRIORITIES = (
+        (PRIORITY_LOW, "Low"),
+        (PRIORITY_NORMAL, "Normal"),
+        (PRIORITY_HIGH, "High"),
+    )
+
+    # A job that keeps taking the consumer down with it is given up on after
+    # this many attempts.
+    MAX_ATTEMPTS = 3
+
+    # Unique among queued and running jobs, by way of a partial index that
+    # migration 0024 creates, as Django has no way to declare one.
+    path = models.CharField(
+        max_length=1024,
+        db_index=True,
+        help_text="The file to consume"
+    )
+    mtime = models.FloatField(
+        help_text="The modification time of the file when it was queued"
+    )
+    state = models.CharField(
+        max_length=7,
+        choices=STATES,
+        default=STATE_QUEUED,
+        db_index=True
+    )
+    priority = models.PositiveIntegerField(
+        choices=PRIORITIES, default=PRIORITY_NORMAL)
+    attempts = models.PositiveIntegerField(default=0)
+    worker = models.CharField(
+        max_length=128,
+        blank=True,
+        help_text="The consumer (host:pid) that claimed this job"
+    )
+    message = models.TextField(blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+    modified = models.DateTimeField(auto_now=True)
+
+    objects = ConsumptionJobManager()
+
+    class Meta:
+        ordering = ("-priority", "created")
+
+    def __str__(self):
+        return "{} ({})".format(os.path.basename(self.path), self.state)
+
+    def finish(self, consumed, message=""):
+        self.state = self.STATE_DONE if consumed else self.STATE_FAILED
+        self.message = message
+        self.save(update_fields=("state", "message", "modified"))
+
+    def requeue(self, message="", count_attempt=True):
+        """
+        Put a claimed job back on the queue, or give up on it if it has used
+        up all of its attempts.  Jobs we merely held back don't lose one.
+        """
+
+        if not count_attempt:
+            self.attempts = max(0, self.attempts - 1)
+        elif self.attempts >= self.MAX_ATTEMPTS:
+            self.finish(False, "Giving up after {} attempts: {}".format(
+                self.attempts, message))
+            return
+
+        self.state = self.STATE_QUEUED
+        self.worker = ""
+        self.message = message
+        self.save(update_fields=(
+            "state", "attempts", "worker", "message", "modified"))
+
+
+class Generation(models.Model):
+    """
+    A counter that goes up every time something changes that other processes
+    may be holding on to a copy of, like the matching rules of the tags and
+    correspondents, so they can tell when theirs has gone out of date.
+    """
+
+    name = models.CharField(max_length=128, unique=True)
+    value = models.PositiveIntegerField(default=0)
+
+    objects = GenerationManager()
+
+    def __str__(self):
+        return "{}: {}".format(self.name, self.value)
+
+
 class FileInfo:
 
     # This epic regex *almost* worked for our needs, so I'm keeping it here for
@@ -1,32 +1,23 @@
 import logging
 import os
-import re
 import shutil
 import subprocess
 import tempfile
 
-import dateparser
 from django.conf import settings
 from django.utils import timezone
+from PIL import Image
 
-# This regular expression will try to find dates in the document at
-# hand and will match the following formats:
-# - XX.YY.ZZZZ with XX + YY being 1 or 2 and ZZZZ being 2 or 4 digits
-# - XX/YY/ZZZZ with XX + YY being 1 or 2 and ZZZZ being 2 or 4 digits
-# - XX-YY-ZZZZ with XX + YY being 1 or 2 and ZZZZ being 2 or 4 digits
-# - ZZZZ.XX.YY with XX + YY being 1 or 2 and ZZZZ being 2 or 4 digits
-# - ZZZZ/XX/YY with XX + YY being 1 or 2 and ZZZZ being 2 or 4 digits
-# - ZZZZ-XX-YY with XX + YY being 1 or 2 and ZZZZ being 2 or 4 digits
-# - XX. MONTH ZZZZ with XX being 1 or 2 and ZZZZ being 2 or 4 digits
-# - MONTH ZZZZ, with ZZZZ being 4 digits
-# - MONTH XX, ZZZZ with XX being 1 or 2 and ZZZZ being 4 digits
-DATE_REGEX = re.compile(
-    r'(\b|(?!=([_-])))([0-9]{1,2})[\.\/-]([0-9]{1,2})[\.\/-]([0-9]{4}|[0-9]{2})(\b|(?=([_-])))|' +  # NOQA: E501
-    r'(\b|(?!=([_-])))([0-9]{4}|[0-9]{2})[\.\/-]([0-9]{1,2})[\.\/-]([0-9]{1,2})(\b|(?=([_-])))|' +  # NOQA: E501
-    r'(\b|(?!=([_-])))([0-9]{1,2}[\. ]+[^ ]{3,9} ([0-9]{4}|[0-9]{2}))(\b|(?=([_-])))|' +  # NOQA: E501
-    r'(\b|(?!=([_-])))([^\W\d_]{3,9} [0-9]{1,2}, ([0-9]{4}))(\b|(?=([_-])))|' +
-    r'(\b|(?!=([_-])))([^\W\d_]{3,9} [0-9]{4})(\b|(?=([_-])))'
-)
+from .dates import DATE_REGEX, find_date  # NOQA: F401
+
+# The Pillow format and file extension of every kind of thumbnail we can make,
+# by the name it goes by in PAPERLESS_THUMBNAIL_FORMAT
+THUMBNAIL_FORMATS = {
+    "png": ("PNG", "png"),
+    "jpeg": ("JPEG", "jpg"),
+    "jpg": ("JPEG", "jpg"),
+    "webp": ("WEBP", "webp"),
+}
 
 
 class ParseError(Exception):
@@ -53,14 +44,16 @@ class DocumentParser:
         raise NotImplementedError()
 
     def optimise_thumbnail(self, in_path):
+        """
+        Encodes the thumbnail in THUMBNAIL_FORMAT.  This happens right here
+        with Pillow, favouring speed over size: the heavy lifting of
+        optipng is left to the optimise_thumbnails command.
+        """
 
-        out_path = os.path.join(self.tempdir, "optipng.png")
-
-        args = (settings.OPTIPNG_BINARY, "-o5", in_path, "-out", out_path)
-        if not subprocess.Popen(args).wait() == 0:
-            raise ParseError("Optipng failed at {}".format(args))
-
-        return out_path
+        try:
+            return encode_thumbnail(in_path, self.tempdir)
+        except (OSError, ValueError) as e:
+            raise ParseError("Thumbnail encoding failed: {}".format(e))
 
     def get_optimised_thumbnail(self):
         return self.optimise_thumbnail(self.get_thumbnail())
@@ -76,46 +69,22 @@ class DocumentParser:
         Returns the date of the document.
         """
 
-        def __parser(ds, date_order):
-            """
-            Call dateparser.parse with a particular date ordering
-            """
-            return dateparser.parse(
-                ds,
-                settings={
-                    "DATE_ORDER": date_order,
-                    "PREFER_DAY_OF_MONTH": "first",
-                    "RETURN_AS_TIMEZONE_AWARE":
-                    True
-                }
-            )
-
-        date = None
-        date_string = None
-
         next_year = timezone.now().year + 5  # Arbitrary 5 year future limit
         title = os.path.basename(self.document_path)
 
         # if filename date parsing is enabled, search there first:
         if settings.FILENAME_DATE_ORDER:
             self.log("info", "Checking document title for date")
-            for m in re.finditer(DATE_REGEX, title):
-                date_string = m.group(0)
-
-                try:
-                    date = __parser(date_string, settings.FILENAME_DATE_ORDER)
-                except (TypeError, ValueError):
-                    # Skip all matches that do not parse to a proper date
-                    continue
-
-                if date is not None and next_year > date.year > 1900:
-                    self.log(
-                        "info",
-                        "Detected document date {} based on string {} "
-                        "from document title"
-                        "".format(date.isoformat(), date_string)
-                    )
-                    return date
+            date, date_string = find_date(
+                title, settings.FILENAME_DATE_ORDER, max_year=next_year)
+            if date is not None:
+                self.log(
+                    "info",
+                    "Detected document date {} based on string {} "
+                    "from document title"
+                    "".format(date.isoformat(), date_string)
+                )
+                return date
 
         try:
             # getting text after checking filename will save time if only
@@ -124,20 +93,8 @@ class DocumentParser:
         except ParseError:
             return None
 
-        # Iterate through all regex matches in text and try to parse the date
-        for m in re.finditer(DATE_REGEX, text):
-            date_string = m.group(0)
-
-            try:
-                date = __parser(date_string, settings.DATE_ORDER)
-            except (TypeError, ValueError):
-                # Skip all matches that do not parse to a proper date
-                continue
-
-            if date is not None and next_year > date.year > 1900:
-                break
-            else:
-                date = None
+        date, date_string = find_date(
+            text, settings.DATE_ORDER, max_year=next_year)
 
         if date is not None:
             self.log(
@@ -160,3 +117,45 @@ class DocumentParser:
     def cleanup(self):
         self.log("debug", "Deleting directory {}".format(self.tempdir))
         shutil.rmtree(self.tempdir)
+
+
+def encode_thumbnail(in_path, directory):
+    """
+    Save the image at in_path as a thumbnail in THUMBNAIL_FORMAT (with
+    THUMBNAIL_QUALITY, where that means something) in the given directory,
+    and return the path to it.
+    """
+
+    image_format, extension = THUMBNAIL_FORMATS[settings.THUMBNAIL_FORMAT]
+    out_path = os.path.join(directory, "thumbnail." + extension)
+
+    with Image.open(in_path) as image:
+
+        if image_format == "PNG":
+            image.save(out_path, image_format)
+            return out_path
+
+        # JPEG can't do transparency, and neither format handles palettes
+        # with it particularly well, so anything like that is flattened onto
+        # a white background.
+        if image.mode not in ("RGB", "L"):
+            image = image.convert("RGBA")
+            flattened = Image.new("RGB", image.size, "white")
+            flattened.paste(image, mask=image.split()[3])
+            image = flattened
+
+        image.save(
+            out_path, image_format, quality=settings.THUMBNAIL_QUALITY)
+
+    return out_path
+
+
+def optimise_png(path):
+    """
+    Have optipng squeeze every last byte out of the PNG at path, in place.
+    This takes a good while, so it's not something to do while consuming.
+    """
+
+    args = (settings.OPTIPNG_BINARY, "-o5", "-quiet", path)
+    if not subprocess.Popen(args).wait() == 0:
+        raise ParseError("Optipng failed at {}".format(args))
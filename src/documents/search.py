@@ -0,0 +1,313 @@
+"""
+A full-text index of the title and content of every document, so that
+searching them doesn't mean reading through all of their text.  On SQLite,
+that's an FTS5 table, and on PostgreSQL, a tsvector column with a GIN index.
+Both are created by a migration and kept up to date by signal handlers.
+Where neither is available, get_index() returns None, and we go back to
+icontains.
+"""
+
+import operator
+import re
+from functools import reduce
+
+from django.db import connections
+from django.db.models import F, Q
+from django.db.models.expressions import RawSQL
+
+# A search term is made of words, which is all the index knows about
+WORDS = re.compile(r"\w+")
+
+# Whether each database has a full-text index, by name, as that's all a
+# connection needs to know.
+_available = {}
+
+
+def get_index(using="default"):
+    """
+    The full-text index in the given database, or None if it hasn't got one.
+    """
+
+    connection = connections[using]
+    cls = INDEXES.get(connection.vendor)
+    if cls is None:
+        return None
+
+    key = (using, connection.settings_dict["NAME"])
+    if key not in _available:
+        _available[key] = cls.is_available(connection)
+
+    return cls(connection) if _available[key] else None
+
+
+def search(queryset, terms, fields=()):
+    """
+    Filter the documents down to those that have every one of the terms in
+    their title or content, or in any of the given fields, and rank them by
+    how well the former matches.  The rank is annotated as search_rank, and
+    it's up to you whether you order by it.
+    """
+
+    index = get_index(queryset.db)
+
+    for term in terms:
+        conditions = [
+            Q(**{"{}__icontains".format(field): term}) for field in fields]
+        if index is not None and WORDS.search(term):
+            conditions.append(Q(pk__in=index.match([term])))
+        else:
+            conditions.extend((
+                Q(title__icontains=term), Q(content__icontains=term)))
+        queryset = queryset.filter(reduce(operator.or_, conditions))
+
+    if index is not None and is_ranked(terms):
+        queryset = queryset.annotate(search_rank=index.rank(
+            [term for term in terms if WORDS.search(term)]))
+
+    return queryset
+
+
+def is_ranked(terms):
+    """
+    Whether search() ranks the documents it finds for these terms.
+    """
+    return any(WORDS.search(term) for term in terms)
+
+
+def order_by_rank(queryset):
+    return queryset.order_by(F("search_rank").desc(nulls_last=True), "-pk")
+
+
+class Subquery(RawSQL):
+    """
+    The raw SQL of a subquery for an __in lookup, which puts it in
+    parentheses itself.  With another pair of them, both SQLite and
+    PostgreSQL would take it for a single value.
+    """
+
+    def as_sql(self, compiler, connection):
+        return self.sql, self.params
+
+
+class Index:
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    @classmethod
+    def is_available(cls, connection):
+        raise NotImplementedError()
+
+    def match(self, terms, prefix=True):
+        """
+        A subquery for the ids of the documents with all of the terms in
+        them, with the last word of each one taken as a prefix, unless told
+        otherwise.
+        """
+        raise NotImplementedError()
+
+    def match_any(self, clauses):
+        """
+        A subquery for the ids of the documents that have at least one of the
+        words of every clause in them.
+        """
+        raise NotImplementedError()
+
+    def rank(self, terms):
+        """
+        How well each document matches the terms: the higher, the better,
+        and null where it doesn't match at all.
+        """
+        raise NotImplementedError()
+
+    def update(self, pks):
+        """
+        Index the documents with the given pks, as they are now.  If they've
+        been indexed before, they have to have been removed first.
+        """
+        raise NotImplementedError()
+
+    def remove(self, pks):
+        """
+        Take the documents with the given pks out of the index, which has to
+        be done before anything we index about them changes.
+        """
+        raise NotImplementedError()
+
+    def clear(self):
+        raise NotImplementedError()
+
+    def _execute(self, sql, params=()):
+        with self.connection.cursor() as cursor:
+            cursor.execute(sql, params)
+
+
+class SQLiteIndex(Index):
+    """
+    A contentless FTS5 table of the title and content of each document, by
+    pk, ranked with BM25.  It doesn't keep a copy of the text, which is why
+    taking a document out of it means telling it what it was indexed with.
+    """
+
+    TABLE = "documents_document_fts"
+
+    @classmethod
+    def is_available(cls, connection):
+        return cls.TABLE in connection.introspection.table_names()
+
+    def match(self, terms, prefix=True):
+        return Subquery(
+            "SELECT rowid FROM {0} WHERE {0} MATCH %s".format(self.TABLE),
+            (self._get_query(terms, prefix),)
+        )
+
+    def match_any(self, clauses):
+        query = " AND ".join(
+            "({})".format(" OR ".join(self._get_phrase(w) for w in clause))
+            for clause in clauses
+        )
+        return Subquery(
+            "SELECT rowid FROM {0} WHERE {0} MATCH %s".format(self.TABLE),
+            (query,)
+        )
+
+    def rank(self, terms):
+        # bm25() is lower for better matches
+        return RawSQL(
+            "SELECT -bm25({0}) FROM {0} WHERE {0} MATCH %s "
+            "AND rowid = documents_document.id".format(self.TABLE),
+            (self._get_query(terms, True),)
+        )
+
+    def update(self, pks):
+        indexed = self._get_indexed(pks)
+        self._executemany(
+            "INSERT INTO {0} (rowid, title, content) VALUES (%s, %s, %s)",
+            [d for d in self._get_documents(pks) if d[0] not in indexed]
+        )
+
+    def remove(self, pks):
+        indexed = self._get_indexed(pks)
+        self._executemany(
+            "INSERT INTO {0} ({0}, rowid, title, content) "
+            "VALUES ('delete', %s, %s, %s)",
+            [d for d in self._get_documents(pks) if d[0] in indexed]
+        )
+
+    def clear(self):
+        self._execute("INSERT INTO {0} ({0}) VALUES ('delete-all')".format(
+            self.TABLE))
+
+    def _get_indexed(self, pks):
+        """
+        Which of the pks the index has a document for.  A save can lead to
+        another one (see update_filename()), and we mustn't index or remove
+        a document twice.
+        """
+
+        pks = list(pks)
+        if not pks:
+            return set()
+
+        with self.connection.cursor() as cursor:
+            cursor.execute("SELECT rowid FROM {} WHERE rowid IN ({})".format(
+                self.TABLE, ", ".join(["%s"] * len(pks))), pks)
+            return {row[0] for row in cursor.fetchall()}
+
+    def _get_documents(self, pks):
+
+        from .models import Document
+
+        return list(Document.objects.using(self.connection.alias).filter(
+            pk__in=pks).values_list("pk", "title", "content"))
+
+    def _executemany(self, sql, params):
+        if params:
+            with self.connection.cursor() as cursor:
+                cursor.executemany(sql.format(self.TABLE), params)
+
+    def _get_query(self, terms, prefix):
+        return " AND ".join(
+            self._get_phrase(term) + ("*" if prefix else "")
+            for term in terms
+        )
+
+    @staticmethod
+    def _get_phrase(term):
+        return '"{}"'.format(" ".join(WORDS.findall(term)))
+
+
+class PostgreSQLIndex(Index):
+    """
+    A tsvector column of the title and content of each document, with a GIN
+    index, ranked with ts_rank().  We use the "simple" configuration, as
+    documents come in all sorts of languages.
+    """
+
+    COLUMN = "search_vector"
+    CONFIG = "simple"
+
+    @classmethod
+    def is_available(cls, connection):
+        with connection.cursor() as cursor:
+            columns = connection.introspection.get_table_description(
+                cursor, "documents_document")
+        return any(column.name == cls.COLUMN for column in columns)
+
+    def match(self, terms, prefix=True):
+        return Subquery(
+            "SELECT id FROM documents_document WHERE {} @@ "
+            "to_tsquery('{}', %s)".format(self.COLUMN, self.CONFIG),
+            (self._get_query(terms, prefix),)
+        )
+
+    def match_any(self, clauses):
+        query = " & ".join(
+            "({})".format(" | ".join(self._get_phrase(w) for w in clause))
+            for clause in clauses
+        )
+        return Subquery(
+            "SELECT id FROM documents_document WHERE {} @@ "
+            "to_tsquery('{}', %s)".format(self.COLUMN, self.CONFIG),
+            (query,)
+        )
+
+    def rank(self, terms):
+        return RawSQL(
+            "CASE WHEN documents_document.{0} @@ to_tsquery('{1}', %s) "
+            "THEN ts_rank(documents_document.{0}, to_tsquery('{1}', %s)) "
+            "END".format(self.COLUMN, self.CONFIG),
+            (self._get_query(terms, True),) * 2
+        )
+
+    def update(self, pks):
+        self._execute(
+            "UPDATE documents_document SET {} = to_tsvector('{}', "
+            "coalesce(title, '') || ' ' || coalesce(content, '')) "
+            "WHERE id = ANY(%s)".format(self.COLUMN, self.CONFIG),
+            (list(pks),)
+        )
+
+    def remove(self, pks):
+        # The vector goes with the row
+        pass
+
+    def clear(self):
+        self._execute("UPDATE documents_document SET {} = NULL".format(
+            self.COLUMN))
+
+    def _get_query(self, terms, prefix):
+        return " & ".join(
+            "({})".format(self._get_phrase(term) + (":*" if prefix else ""))
+            for term in terms
+        )
+
+    @staticmethod
+    def _get_phrase(term):
+        return " <-> ".join(WORDS.findall(term))
+
+
+INDEXES = {
+    "sqlite": SQLiteIndex,
+    "postgresql": PostgreSQLIndex,
+}
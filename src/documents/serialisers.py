@@ -1,6 +1,6 @@
 from rest_framework import serializers
 
-from .models import Correspondent, Tag, Document, Log
+from .models import Correspondent, Tag, Document, Log, MatchingModel
 
 
 class CorrespondentSerializer(serializers.HyperlinkedModelSerializer):
@@ -32,6 +32,19 @@ class TagSerializer(serializers.HyperlinkedModelSerializer):
         )
 
 
+class RuleSerializer(serializers.Serializer):
+    """
+    The rule of a tag or correspondent that hasn't been saved (yet).
+    """
+
+    match = serializers.CharField(max_length=256, allow_blank=True)
+    matching_algorithm = serializers.ChoiceField(
+        choices=MatchingModel.MATCHING_ALGORITHMS,
+        default=MatchingModel.MATCH_ANY
+    )
+    is_insensitive = serializers.BooleanField(default=True)
+
+
 class CorrespondentField(serializers.HyperlinkedRelatedField):
     def get_queryset(self):
         return Correspondent.objects.all()
@@ -66,6 +79,15 @@ class DocumentSerializer(serializers.ModelSerializer):
             "thumbnail_url",
         )
 
+    def __init__(self, *args, fields=None, **kwargs):
+        """
+        Leave out everything but the given fields, if any.
+        """
+        serializers.ModelSerializer.__init__(self, *args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
 
 class LogSerializer(serializers.ModelSerializer):
 
@@ -6,23 +6,32 @@ from django.conf import settings
 from django.contrib.admin.models import ADDITION, LogEntry
 from django.contrib.auth.models import User
 from django.contrib.contenttypes.models import ContentType
+from django.db.models.signals import post_save
 from django.utils import timezone
 
-from ..models import Correspondent, Document, Tag
+from ..matching import forget_matcher
+from ..models import Correspondent, Document, Generation, Tag
+from ..fields import register_functions
+from ..search import get_index
 
 
 def logger(message, group):
     logging.getLogger(__name__).debug(message, extra={"group": group})
 
 
-def set_correspondent(sender, document=None, logging_group=None, **kwargs):
+def set_correspondent(sender, document=None, logging_group=None,
+                      classification=None, **kwargs):
 
     # No sense in assigning a correspondent when one is already set.
     if document.correspondent:
         return
 
     # No matching correspondents, so no need to continue
-    potential_correspondents = list(Correspondent.match_all(document.content))
+    if classification is None:
+        potential_correspondents = list(
+            Correspondent.match_all(document.content))
+    else:
+        potential_correspondents = classification.correspondents
     if not potential_correspondents:
         return
 
@@ -44,7 +53,12 @@ def set_correspondent(sender, document=None, logging_group=None, **kwargs):
     document.save(update_fields=("correspondent",))
 
 
-def set_tags(sender, document=None, logging_group=None, **kwargs):
+def set_tags(sender, document=None, logging_group=None, classification=None,
+             **kwargs):
+
+    # The consumer tags the document with what it matched when it creates it
+    if classification is not None:
+        return
 
     current_tags = set(document.tags.all())
     relevant_tags = set(Tag.match_all(document.content)) - current_tags
@@ -99,6 +113,63 @@ def cleanup_document_deletion(sender, instance, using, **kwargs):
             pass  # The file's already gone, so we're cool with it.
 
 
+def invalidate_matcher(sender, instance, **kwargs):
+    """
+    The rules of a tag or correspondent have (or may have) changed, so every
+    consumer, on this host or any other, has to compile them again.  A saved
+    tag is stamped with the new generation, so the retagger can tell which
+    documents have yet to be matched against it.  A tag that's loaded as is,
+    like by the importer, keeps the stamp it came with.
+    """
+
+    generation = Generation.objects.bump(sender.get_generation_name())
+    forget_matcher(sender)
+
+    if kwargs["signal"] is post_save and sender is Tag and \
+            not kwargs.get("raw"):
+        sender.objects.filter(pk=instance.pk).update(
+            rule_generation=generation)
+        instance.rule_generation = generation
+
+
+def update_search_index(sender, instance, using, update_fields=None,
+                        **kwargs):
+
+    if not _is_indexed(update_fields):
+        return
+
+    index = get_index(using)
+    if index is not None:
+        index.update([instance.pk])
+
+
+def remove_from_search_index(sender, instance, using, update_fields=None,
+                             **kwargs):
+    """
+    Take a document out of the index before it's changed or deleted, while
+    the database still has what we indexed.  Document.save() and delete()
+    both run in a transaction, so if they fail, the document's left as it
+    was in the index too.
+    """
+
+    if instance.pk is None or not _is_indexed(update_fields):
+        return
+
+    index = get_index(using)
+    if index is not None:
+        index.remove([instance.pk])
+
+
+def _is_indexed(update_fields):
+    # Only the title and content are indexed
+    return not update_fields or bool(
+        {"title", "content"}.intersection(update_fields))
+
+
+def register_database_functions(sender, connection, **kwargs):
+    register_functions(connection)
+
+
 def set_log_entry(sender, document=None, logging_group=None, **kwargs):
 
     ct = ContentType.objects.get(model="document")
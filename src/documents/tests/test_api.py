@@ -0,0 +1,86 @@
+from django.contrib.auth.models import User
+from rest_framework.test import APITestCase
+
+from ..models import Correspondent, Document, Tag
+from ..serialisers import DocumentSerializer
+
+
+class TestDocumentFields(APITestCase):
+
+    def setUp(self):
+
+        self.client.force_authenticate(User.objects.create(username="test"))
+
+        correspondent = Correspondent.objects.create(name="Someone")
+        tag = Tag.objects.create(name="Something")
+        for i in range(3):
+            document = Document.objects.create(
+                checksum=str(i),
+                title="Document {}".format(i),
+                content="The content of document {}".format(i),
+                correspondent=correspondent,
+                file_type="pdf"
+            )
+            document.tags.add(tag)
+        self.document = document
+
+    def _get(self, url, **params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_list(self):
+
+        results = self._get("/api/documents/")["results"]
+        self.assertEqual(len(results), 3)
+        self.assertEqual(
+            set(results[0]),
+            set(DocumentSerializer.Meta.fields) - {"content"}
+        )
+
+        # One for the count, one for the documents, one for their tags
+        with self.assertNumQueries(3):
+            self._get("/api/documents/")
+
+    def test_detail(self):
+        document = self._get("/api/documents/{}/".format(self.document.pk))
+        self.assertEqual(set(document), set(DocumentSerializer.Meta.fields))
+        self.assertEqual(document["content"], self.document.content)
+
+    def test_fields(self):
+
+        results = self._get(
+            "/api/documents/", fields="id, content")["results"]
+        self.assertEqual(
+            sorted(results, key=lambda d: d["id"])[-1],
+            {"id": self.document.pk, "content": self.document.content}
+        )
+
+        document = self._get(
+            "/api/documents/{}/".format(self.document.pk), fields="title")
+        self.assertEqual(document, {"title": self.document.title})
+
+    def test_omit(self):
+
+        results = self._get("/api/documents/", omit="")["results"]
+        self.assertEqual(set(results[0]), set(DocumentSerializer.Meta.fields))
+
+        results = self._get(
+            "/api/documents/", fields="id,title,tags", omit="tags")["results"]
+        self.assertEqual(set(results[0]), {"id", "title"})
+
+    def test_unknown_fields(self):
+        response = self.client.get("/api/documents/", {"fields": "id,size"})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("size", response.data["fields"])
+
+    def test_update(self):
+
+        response = self.client.patch(
+            "/api/documents/{}/?fields=id".format(self.document.pk),
+            {"title": "Changed"}
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["title"], "Changed")
+        self.assertEqual(response.data["content"], self.document.content)
@@ -1,14 +1,21 @@
+import hashlib
+import io
+import queue
 import re
 import os
 import shutil
+import signal
 
 from django.conf import settings
+from django.db import IntegrityError, transaction
 from django.test import TestCase, override_settings
 from tempfile import TemporaryDirectory
 from unittest import mock
 
-from ..consumer import Consumer
-from ..models import FileInfo, Tag
+from ..consumer import (
+    Consumer, ConsumerError, ConsumerPool, ConsumerPoolWorker, FileDigest)
+from ..models import (
+    Classification, ConsumptionJob, Document, FileInfo, Tag)
 
 
 class TestConsumer(TestCase):
@@ -85,6 +92,35 @@ class TestConsumer(TestCase):
             settings.MEDIA_ROOT, "documents", "originals", "none",
             "dummy-0000002.pdf.gpg")), False)
 
+    @override_settings(PASSPHRASE="")
+    @mock.patch("documents.consumer.Document.set_filename")
+    def test_store_failure_removes_files(self, m):
+        m.side_effect = OSError("Boom")
+
+        doc = os.path.join(settings.CONSUMPTION_DIR, "letter.pdf")
+        shutil.copyfile(os.path.join(self.SAMPLE_FILES, "letter.pdf"), doc)
+        thumbnail = os.path.join(settings.SCRATCH_DIR, "thumbnail.png")
+        shutil.copyfile(doc, thumbnail)
+
+        with self.assertRaises(OSError):
+            self._get_consumer()._store(
+                "text", doc, thumbnail, None, FileDigest(doc),
+                Classification([], []))
+
+        self.assertFalse(Document.objects.exists())
+        for directory in ("originals", "thumbnails"):
+            self.assertEqual(os.listdir(os.path.join(
+                settings.MEDIA_ROOT, "documents", directory)), [])
+        self.assertTrue(os.path.isfile(doc))
+
+    def test_get_thumbnail_type(self):
+        self.assertEqual(
+            Consumer._get_thumbnail_type("/tmp/thumbnail.webp"), "webp")
+        self.assertEqual(
+            Consumer._get_thumbnail_type("/tmp/thumbnail.JPEG"), "jpg")
+        with self.assertRaises(ConsumerError):
+            Consumer._get_thumbnail_type("/tmp/thumbnail.bmp")
+
     class DummyParser(object):
         pass
 
@@ -136,6 +172,305 @@ class TestConsumer(TestCase):
             return Consumer(consume=tmpdir)
 
 
+class TestConsumerPool(TestCase):
+
+    SAMPLE_FILES = os.path.join(os.path.dirname(__file__), "samples")
+
+    def setUp(self):
+        self.consumptiondir = TemporaryDirectory()
+        self.pool = ConsumerPool(2, consume=self.consumptiondir.name)
+        self.pool._workers = [
+            ConsumerPoolWorker(mock.Mock(), mock.Mock()) for __ in range(2)]
+
+    def tearDown(self):
+        self.consumptiondir.cleanup()
+
+    def _copy_sample(self, name):
+        path = os.path.join(self.consumptiondir.name, name)
+        shutil.copyfile(os.path.join(self.SAMPLE_FILES, "letter.pdf"), path)
+        return path
+
+    def _job(self, name):
+        path = self._copy_sample(name)
+        return ConsumptionJob.objects.create(path=path, mtime=1)
+
+    def _tasks(self):
+        return [
+            call[0][0]
+            for worker in self.pool._workers
+            for call in worker.tasks.put.call_args_list
+        ]
+
+    def test_submit(self):
+        job = self._job("letter.pdf")
+        self.assertTrue(self.pool.submit(job))
+        self.assertTrue(self.pool.is_in_flight(job.path))
+        self.pool._workers[0].tasks.put.assert_called_once_with(job.path)
+
+    def test_submit_same_file_twice(self):
+        job = self._job("letter.pdf")
+        self.assertTrue(self.pool.submit(job))
+        self.assertFalse(self.pool.submit(job))
+        self.assertEqual(len(self._tasks()), 1)
+
+    @mock.patch("documents.consumer.FileDigest")
+    def test_submit_same_size(self, m):
+        self.assertTrue(self.pool.submit(self._job("letter.pdf")))
+        self.assertFalse(self.pool.submit(self._job("letter2.pdf")))
+        self.assertEqual(len(self._tasks()), 1)
+
+        # Reading the files is up to the workers
+        m.assert_not_called()
+
+    def test_submit_disappeared(self):
+        path = self._copy_sample("letter.pdf")
+        ConsumptionJob.objects.enqueue(path)
+        job = ConsumptionJob.objects.claim("host:1")
+        os.unlink(path)
+
+        self.assertTrue(self.pool.submit(job))
+        self.assertFalse(self.pool.is_in_flight(path))
+        self.assertEqual(self._tasks(), [])
+
+        job.refresh_from_db()
+        self.assertEqual(job.state, ConsumptionJob.STATE_FAILED)
+        self.assertEqual(job.message, "The file has disappeared")
+
+    def test_has_capacity(self):
+        self.pool.submit(self._job("letter.pdf"))
+        self.assertTrue(self.pool.has_capacity)
+        with open(self._copy_sample("other.pdf"), "ab") as f:
+            f.write(b"something else entirely")
+        self.pool.submit(ConsumptionJob.objects.create(
+            path=os.path.join(self.consumptiondir.name, "other.pdf"),
+            mtime=1
+        ))
+        self.assertFalse(self.pool.has_capacity)
+
+        # One file for each worker
+        self.pool._workers[0].tasks.put.assert_called_once()
+        self.pool._workers[1].tasks.put.assert_called_once()
+
+    def test_collect(self):
+        job = self._job("letter.pdf")
+        self.pool.submit(job)
+        self.pool._results = mock.Mock()
+        self.pool._results.get_nowait.side_effect = (
+            (job.path, False, ""), queue.Empty)
+        self.assertEqual(self.pool.collect(), [(job, False, "")])
+        self.assertFalse(self.pool.is_in_flight(job.path))
+
+
+class TestConsumerPoolWorkers(TestCase):
+    """
+    With real worker processes, as what we're after is how the pool copes
+    with one of them dying.  They never get as far as the database, and
+    closing our connection before forking them would end the test's
+    transaction, so we leave it open.
+    """
+
+    def setUp(self):
+        connections = mock.patch("documents.consumer.connections")
+        connections.start()
+        self.addCleanup(connections.stop)
+        self.consumptiondir = TemporaryDirectory()
+        self.scratchdir = TemporaryDirectory()
+        self.consumer = Consumer(
+            consume=self.consumptiondir.name,
+            scratch=self.scratchdir.name,
+            workers=2
+        )
+
+    def tearDown(self):
+        self.consumer.stop()
+        self.consumptiondir.cleanup()
+        self.scratchdir.cleanup()
+
+    def test_worker_dies(self):
+
+        # Nothing ever writes to the pipe, so the worker that gets it is stuck
+        # reading it until it's killed.
+        path = os.path.join(self.consumptiondir.name, "stuck.pdf")
+        os.mkfifo(path)
+        job = ConsumptionJob.objects.create(
+            path=path, mtime=1, attempts=ConsumptionJob.MAX_ATTEMPTS - 1)
+
+        self.consumer.process_queue()
+        self.assertTrue(self.consumer.busy)
+
+        pool = self.consumer.pool
+        worker = pool._in_flight[path][2]
+        os.kill(worker.process.pid, signal.SIGKILL)
+        worker.process.join()
+
+        self.consumer.process_queue(timeout=1)
+        self.assertFalse(self.consumer.busy)
+
+        job.refresh_from_db()
+        self.assertEqual(job.state, ConsumptionJob.STATE_FAILED)
+        self.assertIn("died with exit code -9", job.message)
+
+        # It's been replaced
+        self.assertNotIn(worker, pool._workers)
+        self.assertEqual(len(pool._workers), 2)
+        self.assertTrue(all(w.process.is_alive() for w in pool._workers))
+
+
+class TestFileDigest(TestCase):
+
+    SAMPLE = os.path.join(os.path.dirname(__file__), "samples", "letter.pdf")
+
+    def test_digest(self):
+        with open(self.SAMPLE, "rb") as f:
+            data = f.read()
+        digest = FileDigest(self.SAMPLE, sha256=True)
+        self.assertEqual(digest.checksum, hashlib.md5(data).hexdigest())
+        self.assertEqual(digest.sha256, hashlib.sha256(data).hexdigest())
+        self.assertEqual(digest.size, len(data))
+        self.assertEqual(digest.mtime, os.stat(self.SAMPLE).st_mtime)
+
+    @mock.patch("documents.consumer.FileDigest.CHUNK_SIZE", 7)
+    def test_of_stream(self):
+        output = io.BytesIO()
+        with open(self.SAMPLE, "rb") as f:
+            digest = FileDigest.of_stream(f, output=output)
+        self.assertEqual(digest, FileDigest(self.SAMPLE))
+        with open(self.SAMPLE, "rb") as f:
+            self.assertEqual(output.getvalue(), f.read())
+
+    @mock.patch("documents.consumer.os.makedirs")
+    @mock.patch("documents.consumer.os.path.exists", return_value=True)
+    @mock.patch("documents.consumer.document_consumer_declaration.send")
+    def test_write_changed_file(self, m, *args):
+        m.return_value = ((None, lambda _: None),)
+        digest = FileDigest(self.SAMPLE)
+        digest.checksum = "something else"
+        document = Document(storage_type=Document.STORAGE_TYPE_UNENCRYPTED)
+        with TemporaryDirectory() as tmpdir:
+            consumer = Consumer(consume=tmpdir)
+            with self.assertRaises(ConsumerError):
+                consumer._write(
+                    document, self.SAMPLE, os.path.join(tmpdir, "x"), digest)
+
+
+class TestConsumptionJob(TestCase):
+
+    def setUp(self):
+        self.consumptiondir = TemporaryDirectory()
+
+    def tearDown(self):
+        self.consumptiondir.cleanup()
+
+    def _touch(self, name, mtime=1):
+        path = os.path.join(self.consumptiondir.name, name)
+        with open(path, "wb") as f:
+            f.write(name.encode())
+        os.utime(path, times=(mtime, mtime))
+        return path
+
+    def test_enqueue(self):
+        path = self._touch("a.pdf")
+        job = ConsumptionJob.objects.enqueue(path)
+        self.assertEqual(job.state, ConsumptionJob.STATE_QUEUED)
+        self.assertEqual(job.mtime, 1)
+        self.assertEqual(job.priority, ConsumptionJob.PRIORITY_NORMAL)
+
+    def test_enqueue_missing_file(self):
+        self.assertIsNone(ConsumptionJob.objects.enqueue(
+            os.path.join(self.consumptiondir.name, "nope.pdf")))
+
+    def test_enqueue_twice(self):
+        path = self._touch("a.pdf")
+        job = ConsumptionJob.objects.enqueue(path)
+        again = ConsumptionJob.objects.enqueue(
+            path, priority=ConsumptionJob.PRIORITY_HIGH)
+        self.assertEqual(job.pk, again.pk)
+        self.assertEqual(again.priority, ConsumptionJob.PRIORITY_HIGH)
+        self.assertEqual(ConsumptionJob.objects.count(), 1)
+
+    def test_enqueue_unique(self):
+        path = self._touch("a.pdf")
+        ConsumptionJob.objects.enqueue(path)
+        with self.assertRaises(IntegrityError):
+            with transaction.atomic():
+                ConsumptionJob.objects.create(path=path, mtime=1)
+
+        # Unless the other one's done with
+        ConsumptionJob.objects.update(state=ConsumptionJob.STATE_DONE)
+        ConsumptionJob.objects.create(path=path, mtime=1)
+
+    def test_enqueue_failed(self):
+        path = self._touch("a.pdf")
+        ConsumptionJob.objects.enqueue(path).finish(False)
+        self.assertIsNone(ConsumptionJob.objects.enqueue(path))
+
+        # Once the file changes, it's worth another try
+        self._touch("a.pdf", mtime=2)
+        self.assertIsNotNone(ConsumptionJob.objects.enqueue(path))
+
+    def test_claim_by_priority(self):
+        low = ConsumptionJob.objects.enqueue(
+            self._touch("a.pdf"), priority=ConsumptionJob.PRIORITY_LOW)
+        high = ConsumptionJob.objects.enqueue(
+            self._touch("b.pdf"), priority=ConsumptionJob.PRIORITY_HIGH)
+
+        job = ConsumptionJob.objects.claim("host:1")
+        self.assertEqual(job.pk, high.pk)
+        self.assertEqual(job.state, ConsumptionJob.STATE_RUNNING)
+        self.assertEqual(job.attempts, 1)
+        self.assertEqual(job.worker, "host:1")
+
+        self.assertEqual(ConsumptionJob.objects.claim("host:1").pk, low.pk)
+        self.assertIsNone(ConsumptionJob.objects.claim("host:1"))
+
+    def test_claim_exclude(self):
+        job = ConsumptionJob.objects.enqueue(self._touch("a.pdf"))
+        self.assertIsNone(
+            ConsumptionJob.objects.claim("host:1", exclude=[job.pk]))
+
+    def test_requeue(self):
+        ConsumptionJob.objects.enqueue(self._touch("a.pdf"))
+        for __ in range(ConsumptionJob.MAX_ATTEMPTS - 1):
+            job = ConsumptionJob.objects.claim("host:1")
+            job.requeue(message="Boom")
+            self.assertEqual(job.state, ConsumptionJob.STATE_QUEUED)
+        job = ConsumptionJob.objects.claim("host:1")
+        job.requeue(message="Boom")
+        self.assertEqual(job.state, ConsumptionJob.STATE_FAILED)
+
+    def test_requeue_held_back(self):
+        ConsumptionJob.objects.enqueue(self._touch("a.pdf"))
+        job = ConsumptionJob.objects.claim("host:1")
+        job.requeue(count_attempt=False)
+        self.assertEqual(job.state, ConsumptionJob.STATE_QUEUED)
+        self.assertEqual(job.attempts, 0)
+
+    @mock.patch("documents.managers._is_process_running")
+    def test_requeue_abandoned(self, m):
+        m.side_effect = lambda pid: pid == 2
+        ConsumptionJob.objects.enqueue(self._touch("a.pdf"))
+        ConsumptionJob.objects.enqueue(self._touch("b.pdf"))
+        ConsumptionJob.objects.enqueue(self._touch("c.pdf"))
+        dead = ConsumptionJob.objects.claim("host:1")
+        ConsumptionJob.objects.claim("host:2")
+        ConsumptionJob.objects.claim("elsewhere:1")
+
+        abandoned = ConsumptionJob.objects.requeue_abandoned("host")
+        self.assertEqual([j.pk for j in abandoned], [dead.pk])
+        self.assertEqual(
+            ConsumptionJob.objects.queued().get().pk, dead.pk)
+
+    @mock.patch("documents.consumer.Consumer.try_consume_file")
+    def test_consume_file(self, m):
+        m.return_value = True
+        consumer = Consumer(consume=self.consumptiondir.name)
+        path = self._touch("a.pdf")
+        consumer.consume_file(path)
+        m.assert_called_once_with(path)
+        self.assertEqual(
+            ConsumptionJob.objects.get().state, ConsumptionJob.STATE_DONE)
+
+
 class TestAttributes(TestCase):
 
     TAGS = ("tag1", "tag2", "tag3")
@@ -0,0 +1,63 @@
+import dateparser
+from django.test import TestCase
+
+from ..dates import find_date, parse_date, _parse_numeric
+
+
+class TestDates(TestCase):
+
+    # dateparser takes its time over anything that isn't a date, so we only
+    # compare ourselves to it on a few of the trickier cases
+    SAMPLES = (
+        ("13.02.2018", "DMY"),
+        ("13.02.2018", "MDY"),
+        ("05.06.2018", "YMD"),
+        ("2018-05-06", "DMY"),
+        ("5/6-2018", "MDY"),
+        ("31.02.2018", "DMY"),
+        ("02.13.2018", "DMY"),
+        ("13.02.18", "YMD"),
+        ("05.06.69", "DMY"),
+        ("12. März 2018", "DMY"),
+        ("March 5, 2018", "MDY"),
+        ("13 foobar 2018", "DMY"),
+    )
+
+    def test_dates_agree_with_dateparser(self):
+        for date_string, date_order in self.SAMPLES:
+            try:
+                expected = dateparser.parse(date_string, settings={
+                    "DATE_ORDER": date_order,
+                    "PREFER_DAY_OF_MONTH": "first",
+                    "RETURN_AS_TIMEZONE_AWARE": True
+                })
+            except (TypeError, ValueError):
+                expected = None
+            self.assertEqual(
+                parse_date(date_string, date_order),
+                expected,
+                "{} in {} order".format(date_string, date_order)
+            )
+
+    def test_numeric_fast_path(self):
+        date = _parse_numeric("13.02.2018", "DMY")
+        self.assertEqual((date.year, date.month, date.day), (2018, 2, 13))
+        date = _parse_numeric("2018-02-13", "YMD")
+        self.assertEqual((date.year, date.month, date.day), (2018, 2, 13))
+        # Two digit years, the more unusual date orders, and impossible
+        # dates are left to dateparser
+        self.assertIsNone(_parse_numeric("13.02.18", "DMY"))
+        self.assertIsNone(_parse_numeric("13.02.2018", "YMD"))
+        self.assertIsNone(_parse_numeric("02.13.2018", "DMY"))
+
+    def test_find_date(self):
+        date, date_string = find_date(
+            "Invoice 99.99.2018, due 02.03.2018 or 04.05.2018", "DMY")
+        self.assertEqual(date_string, "02.03.2018")
+        self.assertEqual((date.year, date.month, date.day), (2018, 3, 2))
+
+    def test_find_date_out_of_range(self):
+        self.assertEqual(
+            find_date("01-07-0590 00:00:00 or 01-07-2350", "DMY"),
+            (None, None)
+        )
@@ -1,5 +1,6 @@
 from unittest import mock
 
+from django.db import connection
 from django.test import TestCase
 
 from ..models import Document, Correspondent
@@ -21,3 +22,105 @@ class TestDocument(TestCase):
             mock_unlink.assert_any_call(file_path)
             mock_unlink.assert_any_call(thumb_path)
             self.assertEqual(mock_unlink.call_count, 2)
+
+    def test_thumbnail_path(self):
+        document = Document.objects.create(checksum="checksum")
+        self.assertTrue(document.thumbnail_path.endswith(
+            "{:07}.png".format(document.pk)))
+
+        document.thumbnail_type = Document.THUMBNAIL_TYPE_WEBP
+        document.storage_type = Document.STORAGE_TYPE_GPG
+        self.assertTrue(document.thumbnail_path.endswith(
+            "{:07}.webp.gpg".format(document.pk)))
+
+    def test_content_is_deferred(self):
+
+        Document.objects.create(checksum="checksum", content="content")
+
+        document = Document.objects.get()
+        self.assertEqual(document.get_deferred_fields(), {"content"})
+        with self.assertNumQueries(1):
+            self.assertEqual(document.content, "content")
+
+        self.assertEqual(
+            Document.objects.with_content().get().get_deferred_fields(),
+            set()
+        )
+        self.assertEqual(
+            Document.objects.only("pk", "content").get().content, "content")
+
+    def test_refresh_content(self):
+
+        document = Document.objects.create(
+            checksum="checksum", content="content")
+        Document.objects.update(content="changed")
+
+        document.refresh_from_db()
+        self.assertEqual(document.content, "changed")
+
+    def test_content_is_compressed(self):
+
+        content = "Some content, over and over again.  " * 100
+        document = Document.objects.create(
+            checksum="checksum", content=content)
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT content FROM documents_document WHERE id = %s",
+                (document.pk,)
+            )
+            stored = cursor.fetchone()[0]
+        if connection.vendor == "sqlite":
+            self.assertLess(len(stored), len(content) / 10)
+
+        self.assertEqual(
+            Document.objects.with_content().get().content, content)
+        self.assertEqual(
+            Document.objects.values_list("content", flat=True).get(),
+            content
+        )
+
+        for lookup, value in (("exact", content),
+                              ("icontains", "OVER and"),
+                              ("startswith", "Some"),
+                              ("iendswith", "AGAIN.  "),
+                              ("regex", r"over\s+and")):
+            self.assertTrue(Document.objects.filter(
+                **{"content__" + lookup: value}).exists(), lookup)
+        self.assertFalse(
+            Document.objects.filter(content__icontains="under").exists())
+
+    def test_lookups_on_compressed_content(self):
+
+        for checksum, content in (("1", ""), ("2", "apple"), ("3", "pear")):
+            Document.objects.create(checksum=checksum, content=content)
+
+        def find(**kwargs):
+            return sorted(Document.objects.filter(
+                **kwargs).values_list("checksum", flat=True))
+
+        self.assertEqual(find(content__in=["", "pear", "plum"]), ["1", "3"])
+        self.assertEqual(find(content__gt="apple"), ["3"])
+        self.assertEqual(find(content__gte="apple"), ["2", "3"])
+        self.assertEqual(find(content__lt="apple"), ["1"])
+        self.assertEqual(find(content__lte="b"), ["1", "2"])
+        self.assertEqual(find(content__range=("a", "b")), ["2"])
+        self.assertEqual(find(content=""), ["1"])
+        self.assertEqual(find(content__isnull=True), [])
+
+    def test_uncompressed_content(self):
+        """
+        Content that was stored before we started compressing it reads the
+        same.
+        """
+
+        document = Document.objects.create(checksum="checksum")
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "UPDATE documents_document SET content = 'Plain' "
+                "WHERE id = %s", (document.pk,)
+            )
+
+        self.assertEqual(Document.objects.get().content, "Plain")
+        self.assertTrue(
+            Document.objects.filter(content__icontains="lai").exists())
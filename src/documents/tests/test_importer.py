@@ -1,7 +1,12 @@
+import os
+from tempfile import TemporaryDirectory
+
+from django.core.management import call_command
 from django.core.management.base import CommandError
-from django.test import TestCase
+from django.test import TestCase, override_settings
 
 from ..management.commands.document_importer import Command
+from ..models import Document, Generation, Tag
 
 from documents.settings import EXPORTER_FILE_NAME
 
@@ -36,3 +41,58 @@ class TestImporter(TestCase):
             cmd._check_manifest()
         self.assertTrue(
             'The manifest file refers to "noexist.pdf"' in str(cm.exception))
+
+
+class TestExportImport(TestCase):
+
+    def setUp(self):
+        self.storage = TemporaryDirectory()
+        for directory in ("originals", "thumbnails"):
+            os.makedirs(
+                os.path.join(self.storage.name, "documents", directory))
+        self.storage_override = override_settings(
+            MEDIA_ROOT=self.storage.name, PASSPHRASE=None)
+        self.storage_override.enable()
+        self.target = TemporaryDirectory()
+
+    def tearDown(self):
+        self.target.cleanup()
+        self.storage_override.disable()
+        self.storage.cleanup()
+
+    def _create_document(self, checksum, content):
+        document = Document.objects.create(
+            checksum=checksum, content=content, file_type="pdf")
+        for path in (document.source_path, document.thumbnail_path):
+            with open(path, "wb") as f:
+                f.write(checksum.encode())
+        return document
+
+    def test_incremental_retagging_after_import(self):
+
+        tag = Tag.objects.create(
+            name="a", match="alpha", matching_algorithm=Tag.MATCH_ANY)
+        for __ in range(5):
+            tag.save()
+        self._create_document("1", "alpha")
+        self._create_document("2", "beta")
+        call_command("document_retagger", processes=1, verbosity=0)
+
+        call_command("document_exporter", self.target.name)
+        Document.objects.all().delete()
+        Tag.objects.all().delete()
+        Generation.objects.all().delete()
+        call_command("document_importer", self.target.name)
+
+        # The documents were retagged with the rules as they were then, and
+        # a rule saved since is new to them.
+        Tag.objects.create(
+            name="b", match="beta", matching_algorithm=Tag.MATCH_ANY)
+        call_command(
+            "document_retagger", incremental=True, processes=1, verbosity=0)
+
+        self.assertEqual(
+            [[t.name for t in d.tags.all()]
+             for d in Document.objects.order_by("checksum")],
+            [["a"], ["b"]]
+        )
@@ -1,10 +1,13 @@
 from random import randint
+from unittest import mock
 
 from django.contrib.admin.models import LogEntry
 from django.contrib.auth.models import User
 from django.test import TestCase, override_settings
 
-from ..models import Correspondent, Document, Tag
+from ..matching import Matcher, get_matcher, get_required_words
+from ..models import (
+    Classification, Correspondent, Document, Generation, Tag)
 from ..signals import document_consumption_finished
 
 
@@ -22,11 +25,15 @@ class TestMatching(TestCase):
                     instance.matches(string),
                     '"%s" should match "%s" but it does not' % (text, string)
                 )
+                self.assertEqual(
+                    list(klass.match_all(string, [instance])), [instance])
             for string in false:
                 self.assertFalse(
                     instance.matches(string),
                     '"%s" should not match "%s" but it does' % (text, string)
                 )
+                self.assertEqual(
+                    list(klass.match_all(string, [instance])), [])
 
     def test_match_all(self):
 
@@ -201,6 +208,151 @@ class TestMatching(TestCase):
         )
 
 
+class TestMatcher(TestCase):
+
+    def _get_tags(self, *rules):
+        return [
+            Tag(name=str(i), match=match, matching_algorithm=algorithm,
+                is_insensitive=insensitive)
+            for i, (match, algorithm, insensitive) in enumerate(rules)
+        ]
+
+    def _assert_same_as_tags(self, tags, texts):
+        matcher = Matcher(tags)
+        for text in texts:
+            self.assertEqual(
+                matcher.match(text),
+                [tag for tag in tags if tag.matches(text)],
+                text
+            )
+
+    def test_words_and_phrases(self):
+        self._assert_same_as_tags(
+            self._get_tags(
+                ("new", Tag.MATCH_ANY, True),
+                ('"new york" boston', Tag.MATCH_ANY, True),
+                ("new york", Tag.MATCH_LITERAL, True),
+                ("york new", Tag.MATCH_ALL, False),
+                ("SIS", Tag.MATCH_ANY, True),
+                ("sis", Tag.MATCH_ANY, False),
+            ),
+            (
+                "new york",
+                "new  york",
+                "new\nyork",
+                "new, york",
+                "newyork",
+                "york and new",
+                "ſis",
+                "sis",
+            )
+        )
+
+    def test_everything_else(self):
+        self._assert_same_as_tags(
+            self._get_tags(
+                ("a.c", Tag.MATCH_ANY, True),
+                ("foo|bar", Tag.MATCH_ANY, True),
+                ("straße", Tag.MATCH_ALL, True),
+                (r"\d{3}", Tag.MATCH_REGEX, True),
+                ("springfield", Tag.MATCH_FUZZY, True),
+                ("", Tag.MATCH_ANY, True),
+            ),
+            (
+                "abc",
+                "a c",
+                "foobar",
+                "barfoo",
+                "straße 123",
+                "springfeld",
+            )
+        )
+
+    def test_required_words(self):
+        for match, algorithm, words in (
+                ("foo bar", Tag.MATCH_ANY, [["foo", "bar"]]),
+                ('"new york" la', Tag.MATCH_ANY, [["york", "la"]]),
+                ("foo|bar baz", Tag.MATCH_ANY, []),
+                ('"new york" la', Tag.MATCH_ALL, [["new"], ["york"], ["la"]]),
+                ("foo|bar baz", Tag.MATCH_ALL, [["baz"]]),
+                ("new york", Tag.MATCH_LITERAL, [["new"], ["york"]]),
+                ("new.york", Tag.MATCH_LITERAL, []),
+                ("new york", Tag.MATCH_REGEX, []),
+                ("new york", Tag.MATCH_FUZZY, [])):
+            self.assertEqual(
+                get_required_words(Tag(
+                    match=match, matching_algorithm=algorithm)),
+                words,
+                match
+            )
+
+    def test_fuzzy(self):
+        self._assert_same_as_tags(
+            self._get_tags(
+                ("springfield", Tag.MATCH_FUZZY, True),
+                ("City of Springfield", Tag.MATCH_FUZZY, False),
+                ("Springfield!", Tag.MATCH_FUZZY, True),
+                ("ab", Tag.MATCH_FUZZY, True),
+                ("a", Tag.MATCH_FUZZY, True),
+                ("!!!", Tag.MATCH_FUZZY, True),
+            ),
+            (
+                "",
+                "!",
+                "a",
+                "springfeld",
+                "the city of springfeld electricity company",
+                "City of Sprngfield",
+                "SPRING field",
+                "spring, summer and fall in the fields " * 100,
+                "b" * 1000 + " springfeild",
+            )
+        )
+
+
+class TestMatcherCache(TestCase):
+
+    def _get_matcher(self):
+        return get_matcher(Tag, Generation.objects.current("documents.tag"))
+
+    def test_reused_until_rules_change(self):
+
+        tag = Tag.objects.create(
+            name="test", match="keyword", matching_algorithm=Tag.MATCH_ANY)
+
+        matcher = self._get_matcher()
+        self.assertIs(self._get_matcher(), matcher)
+        self.assertEqual(list(Tag.match_all("a keyword")), [tag])
+
+        tag.match = "something else"
+        tag.save()
+        self.assertIsNot(self._get_matcher(), matcher)
+        self.assertEqual(list(Tag.match_all("a keyword")), [])
+
+        tag.delete()
+        self.assertEqual(list(Tag.match_all("something else")), [])
+
+    def test_changed_elsewhere(self):
+
+        Tag.objects.create(
+            name="test", match="keyword", matching_algorithm=Tag.MATCH_ANY)
+        matcher = self._get_matcher()
+
+        # Another consumer saved a tag, so we weren't told directly
+        Generation.objects.bump("documents.tag")
+        self.assertIsNot(self._get_matcher(), matcher)
+
+    def test_correspondents_separately(self):
+
+        Tag.objects.create(
+            name="test", match="keyword", matching_algorithm=Tag.MATCH_ANY)
+        matcher = self._get_matcher()
+
+        Correspondent.objects.create(
+            name="test", match="keyword", matching_algorithm=Tag.MATCH_ANY)
+        self.assertIs(self._get_matcher(), matcher)
+
+
 @override_settings(POST_CONSUME_SCRIPT=None)
 class TestDocumentConsumptionFinishedSignal(TestCase):
     """
@@ -248,6 +400,37 @@ class TestDocumentConsumptionFinishedSignal(TestCase):
             sender=self.__class__, document=self.doc_contains)
         self.assertEqual(self.doc_contains.correspondent, None)
 
+    def test_classification_is_reused(self):
+        Correspondent.objects.create(
+            name="test",
+            match="keyword",
+            matching_algorithm=Correspondent.MATCH_ANY
+        )
+        correspondent = Correspondent.objects.create(name="other")
+        tag = Tag.objects.create(name="test")
+        with mock.patch.object(Tag, "match_all") as tags, \
+                mock.patch.object(Correspondent, "match_all") as matched:
+            document_consumption_finished.send(
+                sender=self.__class__,
+                document=self.doc_contains,
+                classification=Classification([tag], [correspondent])
+            )
+        self.assertFalse(tags.called)
+        self.assertFalse(matched.called)
+        self.assertEqual(self.doc_contains.correspondent, correspondent)
+
+    def test_classification_from_text(self):
+        tag = Tag.objects.create(
+            name="test", match="keyword", matching_algorithm=Tag.MATCH_ANY)
+        correspondent = Correspondent.objects.create(
+            name="test",
+            match="keyword",
+            matching_algorithm=Correspondent.MATCH_ANY
+        )
+        classification = Classification.from_text(self.doc_contains.content)
+        self.assertEqual(classification.tags, [tag])
+        self.assertEqual(classification.correspondents, [correspondent])
+
     def test_logentry_created(self):
         document_consumption_finished.send(
             sender=self.__class__, document=self.doc_contains)
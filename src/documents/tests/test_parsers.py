@@ -0,0 +1,45 @@
+import os
+from tempfile import TemporaryDirectory
+
+from django.test import TestCase, override_settings
+from PIL import Image
+
+from ..parsers import encode_thumbnail
+
+
+class TestEncodeThumbnail(TestCase):
+
+    def setUp(self):
+        self.tempdir = TemporaryDirectory()
+        self.source = os.path.join(self.tempdir.name, "convert.png")
+        Image.new("RGBA", (50, 80), (255, 0, 0, 0)).save(self.source)
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    @override_settings(THUMBNAIL_FORMAT="png")
+    def test_png(self):
+        path = encode_thumbnail(self.source, self.tempdir.name)
+        self.assertTrue(path.endswith(".png"))
+        with Image.open(path) as image:
+            self.assertEqual(image.format, "PNG")
+            self.assertEqual(image.size, (50, 80))
+
+    @override_settings(THUMBNAIL_FORMAT="jpeg", THUMBNAIL_QUALITY=50)
+    def test_jpeg(self):
+        path = encode_thumbnail(self.source, self.tempdir.name)
+        self.assertTrue(path.endswith(".jpg"))
+        with Image.open(path) as image:
+            self.assertEqual(image.format, "JPEG")
+            self.assertEqual(image.mode, "RGB")
+            # Transparency ends up white rather than whatever colour was
+            # hiding underneath it
+            r, g, b = image.getpixel((25, 40))
+            self.assertTrue(min(r, g, b) > 240)
+
+    @override_settings(THUMBNAIL_FORMAT="webp")
+    def test_webp(self):
+        path = encode_thumbnail(self.source, self.tempdir.name)
+        self.assertTrue(path.endswith(".webp"))
+        with Image.open(path) as image:
+            self.assertEqual(image.format, "WEBP")
@@ -0,0 +1,75 @@
+from django.contrib.auth.models import User
+from rest_framework.test import APITestCase
+from unittest import mock
+
+from ..models import Document, Tag
+from ..views import TagViewSet
+
+
+class TestRulePreview(APITestCase):
+
+    def setUp(self):
+
+        self.client.force_authenticate(User.objects.create(username="test"))
+
+        self.documents = [
+            Document.objects.create(
+                checksum=str(i), content=content, file_type="pdf")
+            for i, content in enumerate((
+                "An invoice from the city of Springfield",
+                "Springfields",
+                "Another invoice",
+                "invoice 12345",
+            ))
+        ]
+
+    def test_saved_rule(self):
+
+        tag = Tag.objects.create(
+            name="test", match="invoice", matching_algorithm=Tag.MATCH_ANY)
+
+        response = self.client.get("/api/tags/{}/preview/".format(tag.pk))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {
+            "count": 3,
+            "documents": [d.pk for d in self.documents if "nvoice" in
+                          d.content],
+            "complete": True,
+            "after": None
+        })
+
+    def test_draft_rules(self):
+
+        for match, algorithm, expected in (
+                ("springfield", Tag.MATCH_ANY, [0]),
+                ("Invoice City", Tag.MATCH_ALL, [0]),
+                ('"the city" another', Tag.MATCH_ANY, [0, 2]),
+                (r"\d{5}", Tag.MATCH_REGEX, [3]),
+                ("springfeld", Tag.MATCH_FUZZY, [0, 1]),
+                ("", Tag.MATCH_ANY, [])):
+            response = self.client.post("/api/tags/preview/", {
+                "match": match, "matching_algorithm": algorithm})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(
+                response.data["documents"],
+                [self.documents[i].pk for i in expected],
+                match
+            )
+
+        response = self.client.post(
+            "/api/tags/preview/", {"match": "x", "matching_algorithm": 9})
+        self.assertEqual(response.status_code, 400)
+
+    @mock.patch.object(TagViewSet, "PREVIEW_BUDGET", -1)
+    def test_partial_results(self):
+
+        response = self.client.post("/api/tags/preview/", {"match": "invoice"})
+        self.assertEqual(response.data["count"], 1)
+        self.assertFalse(response.data["complete"])
+
+        response = self.client.post(
+            "/api/tags/preview/?after={}".format(response.data["after"]),
+            {"match": "invoice"}
+        )
+        self.assertEqual(response.data["documents"], [self.documents[2].pk])
@@ -0,0 +1,99 @@
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import DatabaseError
+from django.test import TestCase
+
+from ..models import Document, Tag
+
+
+class TestRetagger(TestCase):
+
+    def setUp(self):
+
+        self.tag_a = Tag.objects.create(
+            name="a", match="alpha", matching_algorithm=Tag.MATCH_ANY)
+        self.tag_b = Tag.objects.create(
+            name="b", match="beta", matching_algorithm=Tag.MATCH_ANY)
+
+        self.documents = [
+            Document.objects.create(
+                checksum=str(i), content=content, file_type="pdf")
+            for i, content in enumerate(
+                ("Alpha and beta", "just beta", "neither", "ALPHA"))
+        ]
+        self.documents[0].tags.add(self.tag_a)
+
+    def _assert_tagged(self):
+        self.assertEqual(
+            [set(d.tags.all()) for d in self.documents],
+            [{self.tag_a, self.tag_b}, {self.tag_b}, set(), {self.tag_a}]
+        )
+
+    def test_retagger(self):
+        call_command("document_retagger", processes=1, verbosity=0)
+        self._assert_tagged()
+
+    def test_retagger_in_small_chunks(self):
+        call_command(
+            "document_retagger", processes=1, chunk_size=3, verbosity=0)
+        self._assert_tagged()
+
+    def test_retagger_is_idempotent(self):
+        call_command("document_retagger", processes=1, verbosity=0)
+        call_command("document_retagger", processes=1, verbosity=0)
+        self._assert_tagged()
+
+    def test_retagger_with_workers(self):
+        call_command("document_retagger", processes=2, verbosity=0)
+        self._assert_tagged()
+
+    def test_rules_are_stamped(self):
+        self.assertLess(self.tag_a.rule_generation, self.tag_b.rule_generation)
+        self.tag_a.save()
+        self.tag_a.refresh_from_db()
+        self.assertGreater(
+            self.tag_a.rule_generation, self.tag_b.rule_generation)
+
+    def test_incremental(self):
+
+        call_command("document_retagger", processes=1, verbosity=0)
+
+        # Somebody took a tag off by hand, and since the rule hasn't changed,
+        # it's left that way
+        self.documents[1].tags.clear()
+        call_command(
+            "document_retagger", incremental=True, processes=1, verbosity=0)
+        self.assertEqual(list(self.documents[1].tags.all()), [])
+
+        # Changed rules are matched against every document, and every rule
+        # against new documents
+        self.tag_a.match = "neither"
+        self.tag_a.save()
+        document = Document.objects.create(
+            checksum="new", content="beta", file_type="pdf")
+        call_command(
+            "document_retagger", incremental=True, processes=1, verbosity=0)
+
+        self.assertEqual(
+            list(self.documents[2].tags.all()), [self.tag_a])
+        self.assertEqual(list(self.documents[1].tags.all()), [])
+        self.assertEqual(list(document.tags.all()), [self.tag_b])
+        self.assertFalse(Document.objects.exclude(
+            tag_rules_generation=self.tag_a.rule_generation).exists())
+
+    def test_failed_tagging_is_not_stamped(self):
+
+        with mock.patch.object(
+                Document.tags.through.objects, "bulk_create",
+                side_effect=DatabaseError("Boom")):
+            with self.assertRaises(DatabaseError):
+                call_command("document_retagger", processes=1, verbosity=0)
+
+        # Nothing's been tagged, so nothing's been done as far as
+        # --incremental is concerned
+        self.assertFalse(Document.objects.filter(
+            tag_rules_generation__isnull=False).exists())
+        call_command(
+            "document_retagger", incremental=True, processes=1, verbosity=0)
+        self._assert_tagged()
@@ -0,0 +1,150 @@
+from unittest import mock
+
+from django.contrib.admin.sites import site
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import DatabaseError
+from django.test import RequestFactory, TestCase
+from rest_framework.test import APITestCase
+
+from ..admin import DocumentAdmin
+from ..models import Correspondent, Document
+from ..search import get_index, search
+
+
+class TestSearch(TestCase):
+
+    def setUp(self):
+
+        if get_index() is None:
+            self.skipTest("No full-text index in this database")
+
+        self.documents = [
+            Document.objects.create(
+                checksum=str(i), title=title, content=content,
+                file_type="pdf")
+            for i, (title, content) in enumerate((
+                ("Gas bill", "Your gas bill for March"),
+                ("Letter", "About the bill, again. A bill is a bill."),
+                ("Receipt", "Thanks for your order"),
+            ))
+        ]
+
+    def _search(self, *terms):
+        return list(search(Document.objects.all(), terms).order_by("pk"))
+
+    def test_search(self):
+        self.assertEqual(self._search("bill"), self.documents[:2])
+        self.assertEqual(self._search("gas", "bill"), self.documents[:1])
+        self.assertEqual(self._search("BILL"), self.documents[:2])
+        self.assertEqual(self._search("ord"), self.documents[2:])
+        self.assertEqual(self._search("nothing"), [])
+
+    def test_search_without_words(self):
+        self.assertEqual(self._search("."), self.documents[1:2])
+
+    def test_search_fields(self):
+        self.documents[2].correspondent = Correspondent.objects.create(
+            name="Gasworks")
+        self.documents[2].save()
+        self.assertEqual(
+            list(search(
+                Document.objects.all(), ["gas"], ["correspondent__name"]
+            ).order_by("pk")),
+            [self.documents[0], self.documents[2]]
+        )
+
+    def test_rank(self):
+        ranked = search(Document.objects.all(), ["bill"])
+        self.assertEqual(
+            list(ranked.order_by("-search_rank")),
+            [self.documents[1], self.documents[0]]
+        )
+
+    def test_index_follows_changes(self):
+
+        self.documents[2].content = "Your bill"
+        self.documents[2].save()
+        self.assertEqual(self._search("order"), [])
+        self.assertEqual(self._search("bill"), self.documents)
+
+        self.documents[0].delete()
+        self.assertEqual(self._search("bill"), self.documents[1:])
+
+    def test_failed_save(self):
+
+        self.documents[0].content = "Something else"
+        with mock.patch("django.db.models.Model._save_table") as m:
+            m.side_effect = DatabaseError("Boom")
+            with self.assertRaises(DatabaseError):
+                self.documents[0].save()
+
+        self.assertEqual(self._search("march"), self.documents[:1])
+
+    def test_rebuild(self):
+
+        get_index().clear()
+        self.assertEqual(self._search("bill"), [])
+
+        call_command("document_index", "rebuild", batch_size=2, verbosity=0)
+        self.assertEqual(self._search("bill"), self.documents[:2])
+
+
+class TestSearchViews(APITestCase):
+
+    def setUp(self):
+
+        if get_index() is None:
+            self.skipTest("No full-text index in this database")
+
+        self.user = User.objects.create_superuser(
+            username="test", email="test@example.com", password="test")
+        self.client.force_login(self.user)
+
+        self.documents = [
+            Document.objects.create(
+                checksum=str(i), title=title, content=content,
+                file_type="pdf")
+            for i, (title, content) in enumerate((
+                ("Gas", "Your gas bill for March, and all the rest of it"),
+                ("Letter", "About the bill, again. A bill is a bill."),
+                ("Receipt", "Thanks for your order"),
+            ))
+        ]
+
+    def test_api(self):
+
+        response = self.client.get("/api/documents/", {"search": "bill"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [d["id"] for d in response.data["results"]],
+            [self.documents[1].pk, self.documents[0].pk]
+        )
+
+        response = self.client.get(
+            "/api/documents/", {"search": "bill", "ordering": "id"})
+        self.assertEqual(
+            [d["id"] for d in response.data["results"]],
+            [self.documents[0].pk, self.documents[1].pk]
+        )
+
+    def _get_changelist(self, **params):
+        request = RequestFactory().get("/admin/documents/document/", params)
+        request.user = self.user
+        return DocumentAdmin(Document, site).get_changelist_instance(request)
+
+    def test_admin(self):
+
+        self.assertEqual(
+            list(self._get_changelist(q="bill").result_list),
+            [self.documents[1], self.documents[0]]
+        )
+
+        # By title
+        self.assertEqual(
+            list(self._get_changelist(q="bill", o="1").result_list),
+            [self.documents[0], self.documents[1]]
+        )
+
+        self.assertEqual(
+            set(self._get_changelist(q="").result_list), set(self.documents))
@@ -1,3 +1,8 @@
+import operator
+import time
+from functools import reduce
+
+from django.db.models import Q
 from django.http import HttpResponse, HttpResponseBadRequest
 from django.views.generic import DetailView, FormView, TemplateView
 from django_filters.rest_framework import DjangoFilterBackend
@@ -7,6 +12,8 @@ from django.utils import cache
 from paperless.db import GnuPG
 from paperless.mixins import SessionOrBasicAuthMixin
 from paperless.views import StandardPagination
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.filters import OrderingFilter, SearchFilter
 from rest_framework.mixins import (
     DestroyModelMixin,
@@ -15,6 +22,7 @@ from rest_framework.mixins import (
     UpdateModelMixin
 )
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
 from rest_framework.viewsets import (
     GenericViewSet,
     ModelViewSet,
@@ -23,11 +31,14 @@ from rest_framework.viewsets import (
 
 from .filters import CorrespondentFilterSet, DocumentFilterSet, TagFilterSet
 from .forms import UploadForm
+from .matching import Matcher, get_required_words
+from .search import get_index, is_ranked, order_by_rank, search
 from .models import Correspondent, Document, Log, Tag
 from .serialisers import (
     CorrespondentSerializer,
     DocumentSerializer,
     LogSerializer,
+    RuleSerializer,
     TagSerializer
 )
 
@@ -56,10 +67,17 @@ class FetchView(SessionOrBasicAuthMixin, DetailView):
             Document.TYPE_TXT: "text/plain"
         }
 
+        thumbnail_content_types = {
+            Document.THUMBNAIL_TYPE_PNG: "image/png",
+            Document.THUMBNAIL_TYPE_JPG: "image/jpeg",
+            Document.THUMBNAIL_TYPE_WEBP: "image/webp"
+        }
+
         if self.kwargs["kind"] == "thumb":
             response = HttpResponse(
                 self._get_raw_data(self.object.thumbnail_file),
-                content_type=content_types[Document.TYPE_PNG]
+                content_type=thumbnail_content_types[
+                    self.object.thumbnail_type]
             )
             cache.patch_cache_control(response, max_age=31536000, private=True)
             return response
@@ -100,7 +118,80 @@ class PushView(SessionOrBasicAuthMixin, FormView):
         return HttpResponseBadRequest(str(form.errors))
 
 
-class CorrespondentViewSet(ModelViewSet):
+class RulePreviewMixin:
+    """
+    Shows which documents the rule of a tag or correspondent matches, at
+    <id>/preview/, or that of one that hasn't been saved yet, POSTed to
+    preview/.  Rather than keep you waiting for the whole archive, we stop
+    after PREVIEW_BUDGET seconds and say where we got to, so you can carry
+    on from there with ?after=<id>.
+
+    Only the documents that have all the words the rule needs in them (see
+    get_required_words()) are read, going by the full-text index if there
+    is one, and then matched the way the consumer would.  As the index
+    doesn't split text into words quite like a regular expression does, or
+    LIKE, which on SQLite only ignores the case of ASCII letters, if there
+    isn't, that may miss the odd document, like one where the word only
+    appears as part of an email address.
+    """
+
+    PREVIEW_BUDGET = 2  # Seconds
+    PREVIEW_SAMPLE_SIZE = 25
+
+    @action(detail=True, methods=["get"])
+    def preview(self, request, pk=None):
+        return self._preview(self.get_object(), request.query_params)
+
+    @action(detail=False, methods=["post"], url_path="preview")
+    def preview_rule(self, request):
+        serializer = RuleSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        rule = self.model(**serializer.validated_data)
+        rule.match = rule.match.lower()  # As it would be saved
+        return self._preview(rule, request.query_params)
+
+    def _preview(self, rule, params):
+
+        try:
+            after = int(params.get("after", 0))
+        except ValueError:
+            raise ValidationError({"after": "This must be a document id."})
+
+        documents = Document.objects.filter(pk__gt=after).order_by("pk")
+        clauses = get_required_words(rule)
+        index = get_index(documents.db)
+        if index is not None and clauses:
+            documents = documents.filter(pk__in=index.match_any(clauses))
+        elif clauses:
+            for words in clauses:
+                documents = documents.filter(reduce(operator.or_, (
+                    Q(content__icontains=word) for word in words)))
+        if not rule.match.strip():
+            documents = documents.none()
+
+        matcher = Matcher([rule])
+        deadline = time.time() + self.PREVIEW_BUDGET
+        count = 0
+        sample = []
+        last = None
+        for pk, content in documents.values_list("pk", "content").iterator():
+            if matcher.match(content.lower()):
+                count += 1
+                if len(sample) < self.PREVIEW_SAMPLE_SIZE:
+                    sample.append(pk)
+            if time.time() > deadline:
+                last = pk
+                break
+
+        return Response({
+            "count": count,
+            "documents": sample,
+            "complete": last is None,
+            "after": last
+        })
+
+
+class CorrespondentViewSet(RulePreviewMixin, ModelViewSet):
     model = Correspondent
     queryset = Correspondent.objects.all()
     serializer_class = CorrespondentSerializer
@@ -111,7 +202,7 @@ class CorrespondentViewSet(ModelViewSet):
     ordering_fields = ("name", "slug")
 
 
-class TagViewSet(ModelViewSet):
+class TagViewSet(RulePreviewMixin, ModelViewSet):
     model = Tag
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
@@ -122,22 +213,112 @@ class TagViewSet(ModelViewSet):
     ordering_fields = ("name", "slug")
 
 
+class DocumentSearchFilter(SearchFilter):
+    """
+    Searches the title and content of documents with the full-text index,
+    and the search_fields of the view the usual way, and puts the best
+    matches first, unless asked to order them some other way.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+
+        terms = self.get_search_terms(request)
+        if not terms:
+            return queryset
+
+        fields = getattr(view, "search_fields", ())
+        queryset = search(queryset, terms, fields)
+        if self.must_call_distinct(queryset, fields):
+            queryset = queryset.distinct()
+
+        if is_ranked(terms) and get_index(queryset.db) is not None:
+            queryset = order_by_rank(queryset)
+
+        return queryset
+
+
 class DocumentViewSet(RetrieveModelMixin,
                       UpdateModelMixin,
                       DestroyModelMixin,
                       ListModelMixin,
                       GenericViewSet):
+    """
+    Lists, shows, changes, and deletes documents.  The fields of each
+    document can be chosen with ?fields= and ?omit=, both comma separated
+    lists of field names, and lists leave out the content by default, as
+    it's the bulk of every document and the one thing you'd only ever look
+    at one at a time.
+    """
+
     model = Document
     queryset = Document.objects.all()
     serializer_class = DocumentSerializer
     pagination_class = StandardPagination
     permission_classes = (IsAuthenticated,)
-    filter_backends = (DjangoFilterBackend, SearchFilter, OrderingFilter)
+    filter_backends = (
+        DjangoFilterBackend, DocumentSearchFilter, OrderingFilter)
     filter_class = DocumentFilterSet
-    search_fields = ("title", "correspondent__name", "content")
+    search_fields = ("title", "correspondent__name")
     ordering_fields = (
         "id", "title", "correspondent__name", "created", "modified", "added")
 
+    # What lists of documents leave out, unless told otherwise
+    LIST_OMIT = ("content",)
+
+    def get_queryset(self):
+
+        fields = self.get_field_names()
+
+        queryset = Document.objects.all()
+        if "content" in fields:
+            queryset = queryset.with_content()
+        if "file_name" in fields:
+            queryset = queryset.select_related("correspondent")
+        if "tags" in fields:
+            queryset = queryset.prefetch_related("tags")
+
+        return queryset
+
+    def get_serializer(self, *args, **kwargs):
+        if self.action in ("list", "retrieve"):
+            kwargs.setdefault("fields", self.get_field_names())
+        return super().get_serializer(*args, **kwargs)
+
+    def get_field_names(self):
+        """
+        The names of the fields to show each document with, which is all of
+        them, unless it's a list, or we've been asked for some of them.
+        """
+
+        available = DocumentSerializer.Meta.fields
+        if self.action not in ("list", "retrieve"):
+            return available
+
+        params = self.request.query_params
+
+        fields = available
+        if "fields" in params:
+            fields = _split_field_names(params["fields"])
+
+        omit = ()
+        if "omit" in params:
+            omit = _split_field_names(params["omit"])
+        elif "fields" not in params and self.action == "list":
+            omit = self.LIST_OMIT
+
+        unknown = (set(fields) | set(omit)) - set(available)
+        if unknown:
+            raise ValidationError({
+                "fields": "Unknown fields: {}.  Documents have {}.".format(
+                    ", ".join(sorted(unknown)), ", ".join(available))
+            })
+
+        return tuple(f for f in available if f in fields and f not in omit)
+
+
+def _split_field_names(value):
+    return [name.strip() for name in value.split(",") if name.strip()]
+
 
 class LogViewSet(ReadOnlyModelViewSet):
     model = Log
@@ -253,6 +253,15 @@ OCR_LANGUAGE = os.getenv("PAPERLESS_OCR_LANGUAGE", "eng")
 # The amount of threads to use for OCR
 OCR_THREADS = os.getenv("PAPERLESS_OCR_THREADS")
 
+# OCR workers are kept around from one document to the next, but replaced
+# after this many pages to keep memory leaks in check.  0 keeps them forever.
+OCR_MAX_TASKS_PER_WORKER = int(
+    os.getenv("PAPERLESS_OCR_MAX_TASKS_PER_WORKER", 100))
+
+# How long (in seconds) OCR may take per page before we assume the worker it
+# was handed to has crashed and give up on the document.  0 waits forever.
+OCR_TIMEOUT = int(os.getenv("PAPERLESS_OCR_TIMEOUT", 300))
+
 # OCR all documents?
 OCR_ALWAYS = __get_boolean("PAPERLESS_OCR_ALWAYS")
 
@@ -270,12 +279,25 @@ CONVERT_TMPDIR = os.getenv("PAPERLESS_CONVERT_TMPDIR")
 CONVERT_MEMORY_LIMIT = os.getenv("PAPERLESS_CONVERT_MEMORY_LIMIT")
 CONVERT_DENSITY = os.getenv("PAPERLESS_CONVERT_DENSITY")
 
+# Documents are rasterised and OCR'd this many pages at a time, with the next
+# window of pages being rasterised while the one before it is OCR'd.
+OCR_PAGE_WINDOW = int(os.getenv("PAPERLESS_OCR_PAGE_WINDOW", 8))
+
+# How much memory (in megabytes) the rasterised pages of a window may take up
+# on their way to OCR before the rest are written to SCRATCH_DIR instead.
+RASTER_MEMORY_LIMIT = int(os.getenv("PAPERLESS_RASTER_MEMORY_LIMIT", 512))
+
 # Ghostscript
 GS_BINARY = os.getenv("PAPERLESS_GS_BINARY", "gs")
 
 # OptiPNG
 OPTIPNG_BINARY = os.getenv("PAPERLESS_OPTIPNG_BINARY", "optipng")
 
+# Thumbnails are stored as png, jpeg, or webp, and the latter two are saved
+# with this quality (1-100).
+THUMBNAIL_FORMAT = os.getenv("PAPERLESS_THUMBNAIL_FORMAT", "png").lower()
+THUMBNAIL_QUALITY = int(os.getenv("PAPERLESS_THUMBNAIL_QUALITY", 85))
+
 # Unpaper
 UNPAPER_BINARY = os.getenv("PAPERLESS_UNPAPER_BINARY", "unpaper")
 
@@ -292,6 +314,11 @@ CONSUMPTION_DIR = os.getenv("PAPERLESS_CONSUMPTION_DIR")
 # slowly, you may want to use a higher value than the default.
 CONSUMER_LOOP_TIME = int(os.getenv("PAPERLESS_CONSUMER_LOOP_TIME", 10))
 
+# The number of documents the consumer works on at the same time.  Each one is
+# consumed in a separate process, so a large scan doesn't hold up everything
+# that arrives after it.
+CONSUMER_WORKERS = int(os.getenv("PAPERLESS_CONSUMER_WORKERS", 1))
+
 # Pre-2.x versions of Paperless stored your documents locally with GPG
 # encryption, but that is no longer the default.  This behaviour is still
 # available, but it must be explicitly enabled by setting
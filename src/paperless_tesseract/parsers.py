@@ -1,13 +1,15 @@
+import io
 import itertools
+import multiprocessing
 import os
 import re
 import subprocess
-from multiprocessing.pool import Pool
+import tempfile
 
 import langdetect
 import pyocr
 from django.conf import settings
-from PIL import Image
+from PIL import Image, ImageChops
 from pyocr.libtesseract.tesseract_raw import \
     TesseractError as OtherTesseractError
 from pyocr.tesseract import TesseractError
@@ -16,6 +18,12 @@ import pdftotext
 from documents.parsers import DocumentParser, ParseError
 
 from .languages import ISO639
+from .workers import discard_pool, get_pool, get_worker
+
+
+# The number of samples per pixel in each kind of binary PNM, where bitmaps
+# (P4) are a special case
+PNM_CHANNELS = {b"P4": 1, b"P5": 1, b"P6": 3}
 
 
 class OCRError(Exception):
@@ -31,27 +39,67 @@ class RasterisedDocumentParser(DocumentParser):
     CONVERT = settings.CONVERT_BINARY
     GHOSTSCRIPT = settings.GS_BINARY
     DENSITY = settings.CONVERT_DENSITY if settings.CONVERT_DENSITY else 300
-    THREADS = int(settings.OCR_THREADS) if settings.OCR_THREADS else None
     UNPAPER = settings.UNPAPER_BINARY
     DEFAULT_OCR_LANGUAGE = settings.OCR_LANGUAGE
     OCR_ALWAYS = settings.OCR_ALWAYS
+    OCR_TIMEOUT = settings.OCR_TIMEOUT
+
+    # Thumbnails are 500px wide, and at 64dpi, an A4 or letter page is just
+    # over that, so there's little more to render than we need.
+    THUMBNAIL_WIDTH = 500
+    THUMBNAIL_DENSITY = 64
+
+    PAGE_WINDOW = max(1, settings.OCR_PAGE_WINDOW)
+    RASTER_MEMORY_LIMIT = settings.RASTER_MEMORY_LIMIT * 1024 * 1024
+
+    # We assume that a page with more than this many characters in its text
+    # layer doesn't need OCR
+    PAGE_TEXT_THRESHOLD = 50
+
+    # A text layer this long is plenty to guess the language from
+    LANGUAGE_SAMPLE_LENGTH = 50
+
+    # When there's no text layer, we guess the language from a page, shrunk to
+    # half its width and height first: that's still plenty to tell one
+    # language from another, and Tesseract gets through a quarter of the
+    # pixels a lot faster.
+    PROBE_SCALE = 0.5
 
     def __init__(self, path):
         super().__init__(path)
         self._text = None
 
+        # Whatever pdftotext can tell us about the document.  Nothing is read
+        # until it's needed, and nothing is read twice.
+        self.pdf = PdfInspection(path)
+
+        # Every image we've handed to Tesseract for this document
+        self.tesseract_invocations = 0
+
+        # A thumbnail-sized copy of the first page, if we've rasterised it
+        self._first_page = None
+
     def get_thumbnail(self):
         """
         The thumbnail of a PDF is just a 500px wide image of the first page.
+        If we've already rasterised the first page for OCR, it's made from
+        that, before it was turned grey.  Otherwise, we rasterise the first
+        page, and only the first page, at just about the resolution we need.
         """
 
         out_path = os.path.join(self.tempdir, "convert.png")
 
+        if self._first_page is not None:
+            self.log("debug", "Making the thumbnail from the OCR'd first page")
+            self._first_page.save(out_path)
+            return out_path
+
         # Run convert to get a decent thumbnail
         try:
             run_convert(
                 self.CONVERT,
-                "-scale", "500x5000",
+                "-density", str(self.THUMBNAIL_DENSITY),
+                "-scale", "{}x5000".format(self.THUMBNAIL_WIDTH),
                 "-alpha", "remove",
                 "-strip", "-trim",
                 "{}[0]".format(self.document_path),
@@ -69,6 +117,9 @@ class RasterisedDocumentParser(DocumentParser):
             cmd = [self.GHOSTSCRIPT,
                    "-q",
                    "-sDEVICE=pngalpha",
+                   "-dFirstPage=1",
+                   "-dLastPage=1",
+                   "-r{}".format(self.THUMBNAIL_DENSITY),
                    "-o", gs_out_path,
                    self.document_path]
             if not subprocess.Popen(cmd).wait() == 0:
@@ -76,7 +127,7 @@ class RasterisedDocumentParser(DocumentParser):
             # then run convert on the output from gs
             run_convert(
                 self.CONVERT,
-                "-scale", "500x5000",
+                "-scale", "{}x5000".format(self.THUMBNAIL_WIDTH),
                 "-alpha", "remove",
                 "-strip", "-trim",
                 gs_out_path,
@@ -85,65 +136,114 @@ class RasterisedDocumentParser(DocumentParser):
 
         return out_path
 
-    def _is_ocred(self):
-
-        # Extract text from PDF using pdftotext
-        text = get_text_from_pdf(self.document_path)
-
-        # We assume, that a PDF with at least 50 characters contains text
-        # (so no OCR required)
-        return len(text) > 50
-
     def get_text(self):
 
         if self._text is not None:
             return self._text
 
-        if not self.OCR_ALWAYS and self._is_ocred():
-            self.log("info", "Skipping OCR, using Text from PDF")
-            self._text = get_text_from_pdf(self.document_path)
-            return self._text
+        # Anything that isn't a PDF doesn't have any pages as far as pdftotext
+        # is concerned, so we can't split it up and OCR it in one go.
+        page_count = self.pdf.page_count
+        pages = list(range(page_count)) if page_count else None
+
+        # Unless we're to OCR everything anyway, we only OCR the pages that
+        # don't have a text layer.  That takes the text of every page, but
+        # it's the text we end up with for all of those that have one.
+        if not self.OCR_ALWAYS and page_count:
+
+            page_texts = list(self.pdf.pages())
+            pages = [
+                i for i, text in enumerate(page_texts)
+                if not self._has_text(text)
+            ]
 
-        images = self._get_greyscale()
+            if not pages:
+                self.log("info", "Skipping OCR, using Text from PDF")
+                self._text = self.pdf.text
+                return self._text
+
+            if len(pages) < page_count:
+                self.log(
+                    "info",
+                    "Only OCRing the {} of {} pages that have no text".format(
+                        len(pages), page_count)
+                )
 
         try:
-            self._text = self._get_ocr(images)
-            return self._text
+            ocred = self._get_ocr(pages)
         except OCRError as e:
             raise ParseError(e)
 
-    def _get_greyscale(self):
+        self.log(
+            "info",
+            "Ran Tesseract {} times for {} pages".format(
+                self.tesseract_invocations, len(ocred))
+        )
+
+        if pages is None or len(pages) == page_count:
+            self._text = strip_excess_whitespace(" ".join(ocred))
+            return self._text
+
+        # Slot the OCR'd pages in between the ones we already had the text of
+        for page, text in zip(pages, ocred):
+            page_texts[page] = text
+
+        self._text = strip_excess_whitespace("\n".join(page_texts).strip())
+
+        return self._text
+
+    def _has_text(self, page_text):
+        return len(page_text.strip()) > self.PAGE_TEXT_THRESHOLD
+
+    def _get_greyscale(self, pages=None):
         """
-        Greyscale images are easier for Tesseract to OCR
+        Greyscale images are easier for Tesseract to OCR.  If we're given a
+        list of (0-based) page numbers, we only convert those pages.
+
+        Returns one image per page, in order.  The images stay in memory, in
+        PNM format, all the way from convert to Tesseract, until they take up
+        more than RASTER_MEMORY_LIMIT.  From there on, they're kept in files
+        in our tempdir and we pass their paths around instead.
+
+        If the first page is among them, convert leaves them in colour and we
+        turn them grey ourselves, so that we can make the thumbnail from the
+        first page on the way.
         """
 
-        # Convert PDF to multiple PNMs
-        pnm = os.path.join(self.tempdir, "convert-%04d.pnm")
-        run_convert(
-            self.CONVERT,
-            "-density", str(self.DENSITY),
-            "-depth", "8",
-            "-type", "grayscale",
-            self.document_path, pnm,
-        )
+        source = self.document_path
+        if pages is not None:
+            source = "{}[{}]".format(source, get_page_selector(pages))
 
-        # Get a list of converted images
-        pnms = []
-        for f in os.listdir(self.tempdir):
-            if f.endswith(".pnm"):
-                pnms.append(os.path.join(self.tempdir, f))
+        with_first_page = pages is None or pages[:1] == [0]
+        colour = () if with_first_page else ("-type", "grayscale")
 
-        # Run unpaper in parallel on converted images
-        with Pool(processes=self.THREADS) as pool:
-            pool.map(run_unpaper, itertools.product([self.UNPAPER], pnms))
+        # Convert PDF to a stream of PNMs
+        images = []
+        in_memory = 0
+        for image in run_convert_to_images(
+                self.CONVERT,
+                "-density", str(self.DENSITY),
+                "-depth", "8",
+                *colour,
+                source, "pnm:-"):
 
-        # Return list of converted images, processed with unpaper
-        pnms = []
-        for f in os.listdir(self.tempdir):
-            if f.endswith(".unpaper.pnm"):
-                pnms.append(os.path.join(self.tempdir, f))
+            if with_first_page:
+                if not images:
+                    self._first_page = make_thumbnail(
+                        image, self.THUMBNAIL_WIDTH)
+                image = to_greyscale(image)
 
-        return sorted(filter(lambda __: os.path.isfile(__), pnms))
+            if in_memory + len(image) > self.RASTER_MEMORY_LIMIT:
+                fd, path = tempfile.mkstemp(suffix=".pnm", dir=self.tempdir)
+                with os.fdopen(fd, "wb") as f:
+                    f.write(image)
+                image = path
+            else:
+                in_memory += len(image)
+
+            images.append(image)
+
+        return images
 
     def _guess_language(self, text):
         try:
@@ -153,23 +253,34 @@ class RasterisedDocumentParser(DocumentParser):
         except Exception as e:
             self.log("warning", "Language detection error: {}".format(e))
 
-    def _get_ocr(self, imgs):
+    def _get_ocr(self, pages):
         """
-        Attempts to do the best job possible OCR'ing the document based on
-        simple language detection trial & error.
+        Attempts to do the best job possible OCR'ing the given pages (or the
+        whole document, if we don't know its pages) based on simple language
+        detection.  We settle on a language before OCR'ing anything properly,
+        so that every page is only OCR'd once.  Returns the text of every
+        page.
+
+        Pages are rasterised OCR_PAGE_WINDOW at a time, and the next window is
+        rasterised while the one before it is being OCR'd, so there are never
+        more than two windows' worth of images around.
         """
 
-        if not imgs:
+        windows = [None]
+        if pages is not None:
+            windows = [
+                pages[i:i + self.PAGE_WINDOW]
+                for i in range(0, len(pages), self.PAGE_WINDOW)
+            ]
+
+        images = self._get_greyscale(windows[0])
+        if not images:
             raise OCRError("No images found")
 
         self.log("info", "OCRing the document")
 
-        # Since the division gets rounded down by int, this calculation works
-        # for every edge-case, i.e. 1
-        middle = int(len(imgs) / 2)
-        raw_text = self._ocr([imgs[middle]], self.DEFAULT_OCR_LANGUAGE)
-
-        guessed_language = self._guess_language(raw_text)
+        guessed_language = self._guess_language(
+            self._get_language_sample(images))
 
         if not guessed_language or guessed_language not in ISO639:
             self.log("warning", "Language detection failed!")
@@ -179,80 +290,312 @@ class RasterisedDocumentParser(DocumentParser):
                     "As FORGIVING_OCR is enabled, we're going to make the "
                     "best with what we have."
                 )
-                raw_text = self._assemble_ocr_sections(imgs, middle, raw_text)
-                return raw_text
+                return self._ocr_windows(
+                    images, windows[1:], self.DEFAULT_OCR_LANGUAGE)
             error_msg = ("Language detection failed. Set "
                          "PAPERLESS_FORGIVING_OCR in config file to continue "
                          "anyway.")
             raise OCRError(error_msg)
 
-        if ISO639[guessed_language] == self.DEFAULT_OCR_LANGUAGE:
-            raw_text = self._assemble_ocr_sections(imgs, middle, raw_text)
-            return raw_text
-
         try:
-            return self._ocr(imgs, ISO639[guessed_language])
+            return self._ocr_windows(
+                images, windows[1:], ISO639[guessed_language])
         except pyocr.pyocr.tesseract.TesseractError:
             if settings.FORGIVING_OCR:
                 self.log(
                     "warning",
-                    "OCR for {} failed, but we're going to stick with what "
-                    "we've got since FORGIVING_OCR is enabled.".format(
-                        guessed_language
+                    "OCR for {} failed, but we're going to stick with {} "
+                    "since FORGIVING_OCR is enabled.".format(
+                        guessed_language,
+                        self.DEFAULT_OCR_LANGUAGE
                     )
                 )
-                raw_text = self._assemble_ocr_sections(imgs, middle, raw_text)
-                return raw_text
+                return self._ocr_windows(
+                    self._get_greyscale(windows[0]),
+                    windows[1:],
+                    self.DEFAULT_OCR_LANGUAGE
+                )
             raise OCRError(
                 "The guessed language ({}) is not available in this instance "
                 "of Tesseract.".format(guessed_language)
             )
 
-    def _ocr(self, imgs, lang):
+    def _get_language_sample(self, imgs):
+        """
+        Some text to guess the language of the document from, as cheaply as
+        we can get it: from the text layer of the PDF if it has one worth
+        speaking of (which we only OCR when OCR_ALWAYS is set), or else by
+        OCR'ing a shrunken copy of the middle page of the first window.
+        """
+
+        sample = self.pdf.sample(self.LANGUAGE_SAMPLE_LENGTH)
+        if sample:
+            self.log("debug", "Guessing the language from the text layer")
+            return sample
+
+        # Since the division gets rounded down by int, this calculation works
+        # for every edge-case, i.e. 1
+        middle = int(len(imgs) / 2)
+        self.log("debug", "Guessing the language from a probe of an image")
+
+        # The page is OCR'd again later on, so the probe gets a copy of its
+        # own in case it's in a file that's deleted once it has been used.
+        probe = imgs[middle]
+        if not isinstance(probe, bytes):
+            with open(probe, "rb") as f:
+                probe = f.read()
+
+        return " ".join(self._ocr(
+            [probe], self.DEFAULT_OCR_LANGUAGE, scale=self.PROBE_SCALE))
+
+    def _ocr_windows(self, images, windows, lang):
         """
-        Performs a single OCR attempt.
+        OCR the images we already have, and then the pages of every window,
+        rasterising each window while the one before it is being OCR'd.
         """
 
-        if not imgs:
-            return ""
+        texts = []
+        pending = self._ocr_async(images, lang)
+        for window in windows:
+            count = len(images)
+            images = self._get_greyscale(window)
+            texts += self._get_ocred(pending, count)
+            pending = self._ocr_async(images, lang)
+
+        return texts + self._get_ocred(pending, len(images))
 
-        self.log("info", "Parsing for {}".format(lang))
+    def _ocr(self, imgs, lang, scale=1):
+        """
+        Performs a single OCR attempt, returning the text of every image.
+        """
+        return self._get_ocred(
+            self._ocr_async(imgs, lang, scale=scale), len(imgs))
 
-        with Pool(processes=self.THREADS) as pool:
-            r = pool.map(image_to_string, itertools.product(imgs, [lang]))
-            r = " ".join(r)
+    def _get_ocred(self, pending, count):
+        """
+        Wait for the OCR workers to hand back the text of `count` images.  A
+        worker that crashes (as libtesseract may well do) is replaced by the
+        pool, but the page it was working on is never handed back, so rather
+        than wait for it forever, we give up after OCR_TIMEOUT seconds a page
+        and start over with a new pool for the next document.
+        """
 
-        # Strip out excess white space to allow matching to go smoother
-        return strip_excess_whitespace(r)
+        timeout = self.OCR_TIMEOUT * count if self.OCR_TIMEOUT else None
+        try:
+            return pending.get(timeout)
+        except multiprocessing.TimeoutError:
+            discard_pool()
+            raise OCRError(
+                "OCR of {} images took more than {}s, so an OCR worker has "
+                "probably crashed".format(count, timeout)
+            )
 
-    def _assemble_ocr_sections(self, imgs, middle, text):
+    def _ocr_async(self, imgs, lang, scale=1):
         """
-        Given a `middle` value and the text that middle page represents, we OCR
-        the remainder of the document and return the whole thing.
+        Hand the images over to the OCR workers, which run them through
+        unpaper and Tesseract.  Returns an AsyncResult for the text of every
+        image.
         """
-        text = self._ocr(imgs[:middle], self.DEFAULT_OCR_LANGUAGE) + text
-        text += self._ocr(imgs[middle + 1:], self.DEFAULT_OCR_LANGUAGE)
-        return text
+
+        self.log("info", "Parsing {} images for {}".format(len(imgs), lang))
+
+        self.tesseract_invocations += len(imgs)
+
+        return get_pool().map_async(
+            unpaper_and_ocr,
+            itertools.product(
+                [self.UNPAPER], imgs, [self.tempdir], [lang], [scale]),
+            chunksize=1
+        )
 
 
 def run_convert(*args):
+    if not subprocess.Popen(args, env=_get_convert_environment()).wait() == 0:
+        raise ParseError("Convert failed at {}".format(args))
 
+
+def run_convert_to_images(*args):
+    """
+    Run convert with its output going to stdout as a stream of PNM images, and
+    hand them out one at a time as they come along.
+    """
+
+    with subprocess.Popen(
+            args, env=_get_convert_environment(),
+            stdout=subprocess.PIPE) as process:
+        image = read_pnm(process.stdout)
+        while image is not None:
+            yield image
+            image = read_pnm(process.stdout)
+
+    if not process.returncode == 0:
+        raise ParseError("Convert failed at {}".format(args))
+
+
+def _get_convert_environment():
     environment = os.environ.copy()
     if settings.CONVERT_MEMORY_LIMIT:
         environment["MAGICK_MEMORY_LIMIT"] = settings.CONVERT_MEMORY_LIMIT
     if settings.CONVERT_TMPDIR:
         environment["MAGICK_TMPDIR"] = settings.CONVERT_TMPDIR
+    return environment
 
-    if not subprocess.Popen(args, env=environment).wait() == 0:
-        raise ParseError("Convert failed at {}".format(args))
+
+def read_pnm(stream):
+    """
+    Read a single binary PNM image off a stream of them, and return all of
+    it, header included, or None if the stream has run dry.
+    """
+
+    magic = stream.read(2)
+    if not magic:
+        return None
+    if magic not in PNM_CHANNELS:
+        raise ParseError("Unexpected image type {}".format(magic))
+
+    # The header is the magic number followed by the width, height, and
+    # (for anything but bitmaps) maximum value, separated by whitespace and
+    # possibly comments, with a single whitespace character before the data.
+    header = [magic]
+    fields = []
+    token = b""
+    while len(fields) < (2 if magic == b"P4" else 3):
+        c = stream.read(1)
+        header.append(c)
+        if not c:
+            raise ParseError("Truncated image header")
+        if c == b"#":
+            while c not in (b"\n", b""):
+                c = stream.read(1)
+                header.append(c)
+        if c.isspace():
+            if token:
+                fields.append(int(token))
+                token = b""
+        else:
+            token += c
+
+    width, height = fields[:2]
+    if magic == b"P4":
+        size = (width + 7) // 8 * height
+    else:
+        sample_size = 1 if fields[2] < 256 else 2
+        size = width * height * PNM_CHANNELS[magic] * sample_size
+
+    data = stream.read(size)
+    if not len(data) == size:
+        raise ParseError("Truncated image data")
+
+    return b"".join(header) + data
 
 
 def run_unpaper(args):
-    unpaper, pnm = args
-    command_args = (unpaper, "--overwrite", pnm,
-                    pnm.replace(".pnm", ".unpaper.pnm"))
-    if not subprocess.Popen(command_args).wait() == 0:
-        raise ParseError("Unpaper failed at {}".format(command_args))
+    """
+    unpaper can't be relied on to read from or write to a pipe, so we hand it
+    the image in a file of its own.  The result goes back the same way it
+    came: as the image itself if that's what we were given, or as a path.
+    """
+
+    unpaper, image, tempdir = args
+
+    in_memory = isinstance(image, bytes)
+    if in_memory:
+        fd, pnm = tempfile.mkstemp(suffix=".pnm", dir=tempdir)
+        with os.fdopen(fd, "wb") as f:
+            f.write(image)
+    else:
+        pnm = image
+
+    out = pnm[:-len(".pnm")] + ".unpaper.pnm"
+    command_args = (unpaper, "--overwrite", pnm, out)
+    try:
+        if not subprocess.Popen(command_args).wait() == 0:
+            raise ParseError("Unpaper failed at {}".format(command_args))
+    finally:
+        os.unlink(pnm)
+
+    if not in_memory:
+        return out
+
+    with open(out, "rb") as f:
+        image = f.read()
+    os.unlink(out)
+
+    return image
+
+
+def unpaper_and_ocr(args):
+    """
+    Run an image through unpaper and then Tesseract in one go, so that the
+    image that comes out of unpaper never has to leave the worker.
+    """
+
+    unpaper, image, tempdir, lang, scale = args
+
+    image = run_unpaper((unpaper, image, tempdir))
+    try:
+        return _image_to_string(image, lang, scale=scale)
+    finally:
+        if not isinstance(image, bytes):
+            os.unlink(image)
+
+
+def make_thumbnail(image, width):
+    """
+    Trim the borders off an image (PNM bytes or the path to a file) and
+    scale it down to the given width, much like convert does for the
+    thumbnails of PDFs.
+    """
+
+    if isinstance(image, bytes):
+        image = io.BytesIO(image)
+
+    with Image.open(image) as original:
+        thumbnail = original.copy()
+
+    background = Image.new(
+        thumbnail.mode, thumbnail.size, thumbnail.getpixel((0, 0)))
+    bbox = ImageChops.difference(thumbnail, background).getbbox()
+    if bbox:
+        thumbnail = thumbnail.crop(bbox)
+
+    thumbnail.thumbnail((width, 5000), Image.LANCZOS)
+
+    return thumbnail
+
+
+def to_greyscale(image):
+    """
+    A greyscale copy of a PNM image, as PNM bytes.
+    """
+
+    with Image.open(io.BytesIO(image)) as original:
+        if original.mode == "L":
+            return image
+        f = io.BytesIO()
+        original.convert("L").save(f, format="PPM")
+
+    return f.getvalue()
+
+
+def get_page_selector(pages):
+    """
+    The page selector convert understands for a list of (0-based) page
+    numbers, with runs of consecutive pages given as ranges: [0, 1, 2, 5]
+    becomes "0-2,5".
+    """
+
+    runs = []
+    for page in pages:
+        if runs and page == runs[-1][1] + 1:
+            runs[-1][1] = page
+        else:
+            runs.append([page, page])
+
+    return ",".join(
+        str(first) if first == last else "{}-{}".format(first, last)
+        for first, last in runs
+    )
 
 
 def strip_excess_whitespace(text):
@@ -265,9 +608,25 @@ def strip_excess_whitespace(text):
 
 
 def image_to_string(args):
-    img, lang = args
-    ocr = pyocr.get_available_tools()[0]
-    with Image.open(os.path.join(settings.SCRATCH_DIR, img)) as f:
+    """
+    OCR an image, optionally scaled down by `scale` first.  We take a tuple of
+    (img, lang[, scale]) so that we can be handed to Pool.map().
+    """
+    return _image_to_string(*args)
+
+
+def _image_to_string(img, lang, scale=1):
+    ocr = get_worker() or pyocr.get_available_tools()[0]
+    if isinstance(img, bytes):
+        img = io.BytesIO(img)
+    else:
+        img = os.path.join(settings.SCRATCH_DIR, img)
+    with Image.open(img) as f:
+        if scale != 1:
+            f = f.resize(
+                (max(1, int(f.width * scale)), max(1, int(f.height * scale))),
+                Image.BILINEAR
+            )
         if ocr.can_detect_orientation():
             try:
                 orientation = ocr.detect_orientation(f, lang=lang)
@@ -277,12 +636,64 @@ def image_to_string(args):
         return ocr.image_to_string(f, lang=lang)
 
 
-def get_text_from_pdf(pdf_file):
+class PdfInspection:
+    """
+    The text layer of a PDF, extracted by pdftotext one page at a time and
+    only as far as anyone has asked.  Every page is extracted at most once, so
+    deciding whether a document needs OCR and then using its text costs no
+    more than using its text.  For anything that isn't a PDF, there simply
+    aren't any pages.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._pdf = None
+        self._pages = {}
 
-    with open(pdf_file, "rb") as f:
-        try:
-            pdf = pdftotext.PDF(f)
-        except pdftotext.Error:
-            return ""
+    @property
+    def page_count(self):
+        return len(self._get_pdf())
+
+    def page(self, n):
+        if n not in self._pages:
+            self._pages[n] = self._get_pdf()[n]
+        return self._pages[n]
+
+    def pages(self):
+        for n in range(self.page_count):
+            yield self.page(n)
+
+    def sample(self, length):
+        """
+        The text of as few pages from the start as it takes to add up to more
+        than `length` characters, or "" if all of them together don't.  The
+        pages after those are left alone.
+        """
+        pages = []
+        total = 0
+        for page in self.pages():
+            pages.append(page)
+            total += len(page.strip())
+            if total > length:
+                return "\n".join(pages).strip()
+        return ""
+
+    @property
+    def text(self):
+        return "\n".join(self.pages()).strip()
+
+    def _get_pdf(self):
+        """
+        pdftotext reads the whole file up front, but doesn't extract the text
+        of a page until it's asked for it.
+        """
+
+        if self._pdf is None:
+            self._pdf = []
+            with open(self.path, "rb") as f:
+                try:
+                    self._pdf = pdftotext.PDF(f)
+                except pdftotext.Error:
+                    pass
 
-    return "\n".join(pdf).strip()
+        return self._pdf
@@ -1,13 +1,29 @@
+import io
 import os
 import pyocr
 
 from django.test import TestCase, override_settings
+from documents.parsers import ParseError
+from PIL import Image
+from pyocr import libtesseract
+from pyocr.libtesseract import tesseract_raw
 from pyocr.libtesseract.tesseract_raw import \
     TesseractError as OtherTesseractError
 from tempfile import TemporaryDirectory
 from unittest import mock, skipIf
 
-from ..parsers import image_to_string, strip_excess_whitespace
+from .. import workers
+from ..parsers import (
+    OCRError,
+    PdfInspection,
+    RasterisedDocumentParser,
+    get_page_selector,
+    image_to_string,
+    make_thumbnail,
+    read_pnm,
+    strip_excess_whitespace
+)
+from ..workers import OCRWorker
 
 
 class FakeTesseract(object):
@@ -32,6 +48,13 @@ class FakePyOcr(object):
         return [FakeTesseract]
 
 
+class FakeWorker(FakeTesseract):
+
+    @staticmethod
+    def image_to_string(file_handle, lang):
+        return "This is text from a worker"
+
+
 @override_settings(SCRATCH_DIR=os.path.join(
                                os.path.dirname(__file__), "samples"))
 class TestOCR(TestCase):
@@ -76,3 +99,401 @@ class TestOCR(TestCase):
         this weird exception.
         """
         image_to_string(["no-text.png", "en"])
+
+    @mock.patch("paperless_tesseract.parsers.get_worker", FakeWorker)
+    @mock.patch("paperless_tesseract.parsers.pyocr", FakePyOcr)
+    def test_image_to_string_in_worker(self):
+        self.assertEqual(
+            image_to_string(["no-text.png", "en"]),
+            "This is text from a worker"
+        )
+
+    @mock.patch("paperless_tesseract.workers.pyocr", FakePyOcr)
+    def test_worker_resolves_tool_once(self):
+        worker = OCRWorker()
+        self.assertIs(worker.tool, FakeTesseract)
+        with mock.patch.object(FakePyOcr, "get_available_tools") as m:
+            self.assertEqual(
+                worker.image_to_string(None, "eng"), "This is test text")
+            m.assert_not_called()
+
+    @mock.patch("paperless_tesseract.workers.pyocr", FakePyOcr)
+    def test_worker_uses_preferred_tool(self):
+        with mock.patch.object(FakePyOcr, "get_available_tools") as m:
+            m.return_value = [FakeTesseract, libtesseract]
+            self.assertIs(OCRWorker().tool, FakeTesseract)
+
+    @mock.patch.multiple(
+        "paperless_tesseract.workers.tesseract_raw",
+        init=mock.DEFAULT,
+        get_available_languages=mock.DEFAULT,
+        set_debug_file=mock.DEFAULT,
+        set_page_seg_mode=mock.DEFAULT,
+        set_image=mock.DEFAULT,
+        detect_os=mock.DEFAULT,
+        cleanup=mock.DEFAULT
+    )
+    def test_worker_detects_orientation_with_osd(self, **raw):
+        raw["get_available_languages"].return_value = ["osd", "deu"]
+        raw["detect_os"].return_value = {
+            "orientation": tesseract_raw.Orientation.PAGE_RIGHT,
+            "confidence": 5
+        }
+        worker = OCRWorker()
+        worker.tool = libtesseract
+
+        for __ in range(2):
+            self.assertEqual(
+                worker.detect_orientation(None, lang="deu"),
+                {"angle": 90, "confidence": 5}
+            )
+        raw["init"].assert_called_once_with(lang="osd")
+
+        # Without the osd traineddata, we only find out once
+        worker = OCRWorker()
+        worker.tool = libtesseract
+        raw["init"].reset_mock()
+        raw["get_available_languages"].return_value = ["deu"]
+        for __ in range(2):
+            with self.assertRaises(OtherTesseractError):
+                worker.detect_orientation(None, lang="deu")
+        raw["init"].assert_called_once_with(lang="osd")
+        raw["cleanup"].assert_called_once()
+
+    @mock.patch("pyocr.tesseract.get_version", lambda: (4, 0, 0))
+    def test_worker_text_as_from_pyocr(self):
+
+        # (word, first in its line, last in its line)
+        words = [
+            ("Sehr", True, False),
+            ("geehrte", False, True),
+            ("", True, False),
+            ("Damen", False, True),
+        ]
+        position = [0]
+
+        def next_word(iterator, level):
+            position[0] += 1
+            return position[0] < len(words)
+
+        raw = {
+            "init": mock.Mock(),
+            "cleanup": mock.Mock(),
+            "get_available_languages": mock.Mock(return_value=["deu"]),
+            "set_debug_file": mock.Mock(),
+            "set_page_seg_mode": mock.Mock(),
+            "set_image": mock.Mock(),
+            "recognize": mock.Mock(),
+            "get_iterator": mock.Mock(),
+            "result_iterator_get_page_iterator": mock.Mock(),
+            "page_iterator_is_at_beginning_of":
+                lambda i, level: words[position[0]][1],
+            "page_iterator_is_at_final_element":
+                lambda i, level, element: words[position[0]][2],
+            "result_iterator_get_utf8_text":
+                lambda i, level: words[position[0]][0],
+            "result_iterator_get_confidence": lambda i, level: 90.0,
+            "page_iterator_bounding_box":
+                lambda i, level: (True, (0, 0, 10, 10)),
+            "page_iterator_next": next_word,
+        }
+
+        with mock.patch.multiple(tesseract_raw, **raw):
+            expected = libtesseract.image_to_string(None, lang="deu")
+            position[0] = 0
+            worker = OCRWorker()
+            worker.tool = libtesseract
+            self.assertEqual(worker.image_to_string(None, "deu"), expected)
+
+        self.assertEqual(expected, "Sehr geehrte\nDamen")
+
+
+class FakePool(object):
+
+    class Result(object):
+
+        def __init__(self, result):
+            self.result = result
+
+        def get(self, timeout=None):
+            return self.result
+
+    @classmethod
+    def map_async(cls, func, iterable, chunksize=None):
+        return cls.Result(list(map(func, iterable)))
+
+
+def fake_greyscale(pages):
+    return ["page {}".format(page).encode() for page in pages]
+
+
+@mock.patch("paperless_tesseract.parsers.get_pool", FakePool)
+@mock.patch("paperless_tesseract.parsers.run_unpaper", lambda args: args[1])
+@mock.patch("paperless_tesseract.parsers.PdfInspection._get_pdf", lambda _: [])
+@mock.patch("paperless_tesseract.parsers.make_thumbnail", lambda i, w: i)
+class TestLanguageDetection(TestCase):
+
+    PAGES = list(range(10))
+
+    GERMAN = "Sehr geehrte Damen und Herren, anbei erhalten Sie die Rechnung."
+
+    def setUp(self):
+        self.scratchdir = TemporaryDirectory()
+        with override_settings(SCRATCH_DIR=self.scratchdir.name):
+            self.parser = RasterisedDocumentParser(
+                os.path.join(self.scratchdir.name, "doc.pdf"))
+        self.parser.PAGE_WINDOW = 8
+
+    def tearDown(self):
+        self.scratchdir.cleanup()
+
+    @mock.patch("paperless_tesseract.parsers._image_to_string")
+    def test_every_page_is_ocred_once(self, m):
+        m.return_value = self.GERMAN
+
+        with mock.patch.object(self.parser, "_get_greyscale") as greyscale:
+            greyscale.side_effect = fake_greyscale
+            self.assertEqual(len(self.parser._get_ocr(self.PAGES)), 10)
+            self.assertEqual(
+                [c[0][0] for c in greyscale.call_args_list],
+                [self.PAGES[:8], self.PAGES[8:]]
+            )
+
+        probes = [c for c in m.call_args_list if c[1]["scale"] != 1]
+        pages = [c for c in m.call_args_list if c[1]["scale"] == 1]
+
+        self.assertEqual(len(probes), 1)
+        self.assertEqual(
+            [c[0][0] for c in pages], fake_greyscale(self.PAGES))
+        self.assertTrue(all(c[0][1] == "deu" for c in pages))
+        self.assertEqual(self.parser.tesseract_invocations, 11)
+
+    @mock.patch("paperless_tesseract.parsers._image_to_string")
+    def test_language_from_text_layer(self, m):
+        m.return_value = "whatever"
+        with mock.patch(
+                "paperless_tesseract.parsers.PdfInspection._get_pdf",
+                lambda _: [self.GERMAN]):
+            with mock.patch.object(self.parser, "_get_greyscale") as g:
+                g.side_effect = fake_greyscale
+                self.parser._get_ocr(self.PAGES)
+
+        self.assertEqual(m.call_count, len(self.PAGES))
+        self.assertTrue(all(c[0][1] == "deu" for c in m.call_args_list))
+
+    @mock.patch("paperless_tesseract.parsers._image_to_string")
+    def test_language_from_first_pages_only(self, m):
+        m.return_value = "whatever"
+        pdf = TestPdfInspection.FakePdf([self.GERMAN] * len(self.PAGES))
+        pdf.accessed = []
+        self.parser.OCR_ALWAYS = True
+        with mock.patch(
+                "paperless_tesseract.parsers.PdfInspection._get_pdf",
+                lambda _: pdf):
+            with mock.patch.object(self.parser, "_get_greyscale") as g:
+                g.side_effect = fake_greyscale
+                self.parser.get_text()
+
+        # Everything's OCR'd anyway, so the text layer of any page but the
+        # first, which is enough to go on, is of no use to us.
+        self.assertEqual(pdf.accessed, [0])
+        self.assertTrue(all(c[0][1] == "deu" for c in m.call_args_list))
+
+
+@mock.patch("paperless_tesseract.parsers.get_pool", FakePool)
+@mock.patch("paperless_tesseract.parsers.run_unpaper", lambda args: args[1])
+class TestMixedDocuments(TestCase):
+
+    TYPED = "This page was typed rather than scanned, so it has a text layer."
+
+    def setUp(self):
+        self.scratchdir = TemporaryDirectory()
+        with override_settings(SCRATCH_DIR=self.scratchdir.name):
+            self.parser = RasterisedDocumentParser(
+                os.path.join(self.scratchdir.name, "doc.pdf"))
+
+    def tearDown(self):
+        self.scratchdir.cleanup()
+
+    @mock.patch("paperless_tesseract.parsers._image_to_string")
+    @mock.patch("paperless_tesseract.parsers.PdfInspection._get_pdf")
+    def test_only_pages_without_text_are_ocred(self, pages, ocr):
+        pages.return_value = [self.TYPED, "", self.TYPED, " 4 "]
+        ocr.return_value = "This page was scanned"
+
+        with mock.patch.object(self.parser, "_get_greyscale") as greyscale:
+            greyscale.side_effect = fake_greyscale
+            text = self.parser.get_text()
+            greyscale.assert_called_once_with([1, 3])
+
+        # The text layer is plenty to guess the language from, so there's no
+        # need for a probe
+        self.assertEqual(ocr.call_count, 2)
+        self.assertEqual(text, "\n".join([
+            self.TYPED,
+            "This page was scanned",
+            self.TYPED,
+            "This page was scanned"
+        ]))
+
+    @mock.patch("paperless_tesseract.parsers.PdfInspection._get_pdf")
+    def test_all_pages_with_text(self, pages):
+        pages.return_value = [self.TYPED, self.TYPED]
+        with mock.patch.object(self.parser, "_get_greyscale") as greyscale:
+            self.assertEqual(
+                self.parser.get_text(), "\n".join([self.TYPED, self.TYPED]))
+            greyscale.assert_not_called()
+
+
+class TestThumbnail(TestCase):
+
+    def setUp(self):
+        self.scratchdir = TemporaryDirectory()
+        with override_settings(SCRATCH_DIR=self.scratchdir.name):
+            self.parser = RasterisedDocumentParser(
+                os.path.join(self.scratchdir.name, "doc.pdf"))
+
+    def tearDown(self):
+        self.scratchdir.cleanup()
+
+    def _get_page(self):
+        # A white page with a black square in the middle of it
+        page = Image.new("L", (2000, 3000), 255)
+        page.paste(0, (500, 500, 1500, 2500))
+        f = io.BytesIO()
+        page.save(f, format="PPM")
+        return f.getvalue()
+
+    def test_make_thumbnail(self):
+        thumbnail = make_thumbnail(self._get_page(), 500)
+        self.assertEqual(thumbnail.size, (500, 1000))
+        self.assertEqual(thumbnail.getextrema(), (0, 0))
+
+    @mock.patch("paperless_tesseract.parsers.run_convert")
+    def test_thumbnail_from_ocred_page(self, convert):
+        self.parser._first_page = make_thumbnail(self._get_page(), 500)
+        with Image.open(self.parser.get_thumbnail()) as thumbnail:
+            self.assertEqual(thumbnail.size, (500, 1000))
+        convert.assert_not_called()
+
+    @mock.patch("paperless_tesseract.parsers.run_convert_to_images")
+    def test_thumbnail_in_colour(self, convert):
+        page = Image.new("RGB", (2000, 3000), (255, 255, 255))
+        page.paste((255, 0, 0), (500, 500, 1500, 2500))
+        f = io.BytesIO()
+        page.save(f, format="PPM")
+        convert.return_value = [f.getvalue()]
+
+        images = self.parser._get_greyscale([0])
+        self.assertNotIn("grayscale", convert.call_args[0])
+        self.assertTrue(images[0].startswith(b"P5"))
+
+        self.assertEqual(self.parser._first_page.mode, "RGB")
+        self.assertEqual(
+            self.parser._first_page.getpixel((250, 500)), (255, 0, 0))
+
+    @mock.patch("paperless_tesseract.parsers.run_convert_to_images")
+    def test_no_thumbnail_from_later_pages(self, convert):
+        convert.return_value = [self._get_page()]
+        self.parser._get_greyscale([1])
+        self.assertIn("grayscale", convert.call_args[0])
+        self.assertIsNone(self.parser._first_page)
+
+    @mock.patch("paperless_tesseract.parsers.run_convert")
+    def test_thumbnail_of_first_page_only(self, convert):
+        self.parser.get_thumbnail()
+        args = convert.call_args[0]
+        self.assertIn("{}[0]".format(self.parser.document_path), args)
+        self.assertIn("-density", args)
+
+
+def crash(args):
+    os._exit(1)
+
+
+class TestOCRTimeout(TestCase):
+
+    def setUp(self):
+        self.scratchdir = TemporaryDirectory()
+        with override_settings(SCRATCH_DIR=self.scratchdir.name):
+            self.parser = RasterisedDocumentParser(
+                os.path.join(self.scratchdir.name, "doc.pdf"))
+        self.parser.OCR_TIMEOUT = 1
+
+    def tearDown(self):
+        workers.discard_pool()
+        self.scratchdir.cleanup()
+
+    @mock.patch("paperless_tesseract.parsers.unpaper_and_ocr", crash)
+    def test_worker_crashes(self):
+        pool = workers.get_pool()
+        with self.assertRaises(OCRError):
+            self.parser._ocr([b"page"], "eng")
+
+        # The next document gets a new pool
+        self.assertIsNot(workers.get_pool(), pool)
+
+
+class TestPageSelector(TestCase):
+
+    def test_page_selector(self):
+        self.assertEqual(get_page_selector([0]), "0")
+        self.assertEqual(get_page_selector([0, 1, 2, 3]), "0-3")
+        self.assertEqual(get_page_selector([0, 1, 2, 5, 7, 8]), "0-2,5,7-8")
+
+
+class TestPdfInspection(TestCase):
+
+    class FakePdf(list):
+
+        accessed = []
+
+        def __getitem__(self, n):
+            self.accessed.append(n)
+            return list.__getitem__(self, n)
+
+    def setUp(self):
+        self.FakePdf.accessed = []
+        self.inspection = PdfInspection("doc.pdf")
+        self.inspection._pdf = self.FakePdf(["A" * 30, "B" * 30, "C" * 30])
+
+    def test_pages_are_only_extracted_once(self):
+        self.inspection.sample(50)
+        self.assertEqual(self.inspection.page_count, 3)
+        self.assertEqual(
+            self.inspection.text, "\n".join(["A" * 30, "B" * 30, "C" * 30]))
+        self.assertEqual(self.FakePdf.accessed, [0, 1, 2])
+
+    def test_sample(self):
+        self.assertEqual(
+            self.inspection.sample(50), "\n".join(["A" * 30, "B" * 30]))
+        self.assertEqual(self.FakePdf.accessed, [0, 1])
+        self.assertEqual(self.inspection.sample(100), "")
+
+    def test_not_a_pdf(self):
+        inspection = PdfInspection(os.path.join(
+            os.path.dirname(__file__), "samples", "no-text.png"))
+        self.assertEqual(inspection.page_count, 0)
+        self.assertEqual(inspection.sample(0), "")
+        self.assertEqual(inspection.text, "")
+
+
+class TestReadPnm(TestCase):
+
+    GREY = b"P5\n# A comment\n3 2\n255\n" + bytes(range(6))
+    BITMAP = b"P4 9 2\n" + bytes(4)
+
+    def test_stream_of_images(self):
+        stream = io.BytesIO(self.GREY + self.BITMAP + self.GREY)
+        self.assertEqual(read_pnm(stream), self.GREY)
+        self.assertEqual(read_pnm(stream), self.BITMAP)
+        self.assertEqual(read_pnm(stream), self.GREY)
+        self.assertIsNone(read_pnm(stream))
+
+    def test_image_is_usable(self):
+        image = Image.open(io.BytesIO(self.GREY))
+        self.assertEqual(image.size, (3, 2))
+
+    def test_truncated(self):
+        with self.assertRaises(ParseError):
+            read_pnm(io.BytesIO(self.GREY[:-1]))
@@ -0,0 +1,194 @@
+import os
+from multiprocessing.pool import Pool
+
+import pyocr
+from django.conf import settings
+from pyocr import builders, libtesseract
+from pyocr.libtesseract import tesseract_raw
+from pyocr.tesseract import TesseractError
+
+
+_pool = None
+_pool_pid = None
+
+# Only ever set inside one of the pool's worker processes
+_worker = None
+
+
+class OCRWorker:
+    """
+    Everything an OCR worker process keeps around from one page to the next:
+    the OCR tool pyocr prefers, which we only look for once, and if that's
+    libtesseract, an initialised Tesseract handle for every language we've
+    come across, so we don't reload the traineddata for every page.
+    Orientation detection gets a handle of its own, initialised with the
+    "osd" traineddata it needs.
+    """
+
+    ORIENTATIONS = {
+        tesseract_raw.Orientation.PAGE_UP: 0,
+        tesseract_raw.Orientation.PAGE_RIGHT: 90,
+        tesseract_raw.Orientation.PAGE_DOWN: 180,
+        tesseract_raw.Orientation.PAGE_LEFT: 270,
+    }
+
+    def __init__(self):
+
+        self.tool = None
+        self._handles = {}
+
+        tools = pyocr.get_available_tools()
+        if tools:
+            self.tool = tools[0]
+
+    # The same interface as the pyocr tools, so image_to_string() can use
+    # either
+
+    def can_detect_orientation(self):
+        return self.tool.can_detect_orientation()
+
+    def detect_orientation(self, image, lang):
+
+        if self.tool is not libtesseract:
+            return self.tool.detect_orientation(image, lang=lang)
+
+        handle = self._get_handle("osd")
+        tesseract_raw.set_page_seg_mode(
+            handle, tesseract_raw.PageSegMode.OSD_ONLY)
+        tesseract_raw.set_image(handle, image)
+        os_result = tesseract_raw.detect_os(handle)
+        if os_result["confidence"] <= 0:
+            raise TesseractError("no script", "no script detected")
+
+        return {
+            "angle": self.ORIENTATIONS[os_result["orientation"]],
+            "confidence": os_result["confidence"]
+        }
+
+    def image_to_string(self, image, lang):
+        """
+        What libtesseract.image_to_string() does, down to putting the text
+        together word by word with pyocr's TextBuilder, except that we use the
+        handle we keep rather than initialise one for every page.
+        """
+
+        if self.tool is not libtesseract:
+            return self.tool.image_to_string(image, lang=lang)
+
+        builder = builders.TextBuilder()
+        line = tesseract_raw.PageIteratorLevel.TEXTLINE
+        word = tesseract_raw.PageIteratorLevel.WORD
+
+        handle = self._get_handle(lang)
+        tesseract_raw.set_page_seg_mode(handle, builder.tesseract_layout)
+        tesseract_raw.set_image(handle, image)
+        tesseract_raw.recognize(handle)
+
+        results = tesseract_raw.get_iterator(handle)
+        if results is None:
+            raise TesseractError("no script", "no script detected")
+        pages = tesseract_raw.result_iterator_get_page_iterator(results)
+
+        while True:
+
+            if tesseract_raw.page_iterator_is_at_beginning_of(pages, line):
+                builder.start_line(self._get_box(pages, line))
+
+            last_in_line = tesseract_raw.page_iterator_is_at_final_element(
+                pages, line, word)
+
+            text = tesseract_raw.result_iterator_get_utf8_text(results, word)
+            confidence = tesseract_raw.result_iterator_get_confidence(
+                results, word)
+            if text and confidence is not None:
+                builder.add_word(
+                    text, self._get_box(pages, word), confidence)
+                if last_in_line:
+                    builder.end_line()
+
+            if not tesseract_raw.page_iterator_next(pages, word):
+                break
+
+        return builder.get_output()
+
+    @staticmethod
+    def _get_box(pages, level):
+        __, box = tesseract_raw.page_iterator_bounding_box(pages, level)
+        return (box[0], box[1]), (box[2], box[3])
+
+    def _get_handle(self, lang):
+        """
+        The Tesseract handle for a language, which is None once we know we
+        don't have it, so that we don't try again for every page.
+        """
+
+        if lang not in self._handles:
+
+            handle = tesseract_raw.init(lang=lang)
+
+            # Tesseract is known to segfault rather than complain when it's
+            # asked to use a language it doesn't have, so we check for it
+            # ourselves.
+            available = tesseract_raw.get_available_languages(handle)
+            if all(item in available for item in lang.split("+")):
+                tesseract_raw.set_debug_file(handle, os.devnull)
+            else:
+                tesseract_raw.cleanup(handle)
+                handle = None
+
+            self._handles[lang] = handle
+
+        if self._handles[lang] is None:
+            raise TesseractError(
+                "no lang", "language {} is not available".format(lang))
+
+        return self._handles[lang]
+
+
+def get_pool():
+    """
+    The pool of OCR workers, which is started the first time it's needed and
+    then shared by every document this process parses.  Workers are replaced
+    after OCR_MAX_TASKS_PER_WORKER tasks (pages, if they're handed out one at
+    a time) to keep any leaks in check.
+    """
+
+    global _pool, _pool_pid
+
+    # A pool can't be shared with a forked process, so a consumer worker that
+    # inherited one from its parent gets a pool of its own.
+    if _pool is None or _pool_pid != os.getpid():
+        threads = int(settings.OCR_THREADS) if settings.OCR_THREADS else None
+        _pool = Pool(
+            processes=threads,
+            initializer=_init_worker,
+            maxtasksperchild=settings.OCR_MAX_TASKS_PER_WORKER or None
+        )
+        _pool_pid = os.getpid()
+
+    return _pool
+
+
+def discard_pool():
+    """
+    Stop the pool of OCR workers, whatever they're in the middle of, so that
+    the next call to get_pool() starts a new one.
+    """
+
+    global _pool
+
+    if _pool is not None and _pool_pid == os.getpid():
+        _pool.terminate()
+    _pool = None
+
+
+def get_worker():
+    """
+    The OCRWorker of the current process, or None if we're not in the pool.
+    """
+    return _worker
+
+
+def _init_worker():
+    global _worker
+    _worker = OCRWorker()